@@ -0,0 +1,222 @@
+"""Microbenchmarks for backend hot paths, compared against a stored baseline.
+
+Times parse_pdf, the ingest page scans (formula scoring, layout
+expression rebuild, visual checks), vision rendering, chunk retrieval,
+voice context building and the document store getters on synthetic
+lecture PDFs of 10, 100 and 500 pages. Each benchmark is compared by its
+fastest run, which shrugs off scheduler noise far better than the median.
+Results are written as JSON; any benchmark slower than the baseline by
+more than the tolerance and the absolute floor is reported as a
+regression and the run exits non-zero.
+
+Run from backend/:
+    python -m benchmarks.bench_hot_paths                    # compare to baseline
+    python -m benchmarks.bench_hot_paths --update-baseline  # record a new baseline
+    python -m benchmarks.bench_hot_paths --sizes 10 100 --output results.json
+
+Baselines are machine-specific: record one on the machine (or CI runner
+class) that runs the comparison.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable
+
+import fitz  # PyMuPDF
+
+from benchmarks.synthetic_pdf import PAGE_KINDS, build_lecture_pdf
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baselines" / "hot_paths.json"
+DEFAULT_SIZES = (10, 100, 500)
+# A benchmark regresses when its fastest run exceeds baseline * (1 + tolerance)
+# and the slowdown summed over the run's calls is also larger than MIN_REGRESSION_MS
+DEFAULT_TOLERANCE = 0.5
+MIN_REGRESSION_MS = 2.0
+DEFAULT_REPEAT = 9
+# Rendering is the slowest per-page path; cap the pages rendered per run
+RENDER_SAMPLE_PAGES = 12
+
+_QUESTIONS = [
+    "what is gradient descent",
+    "how does the learning rate affect convergence",
+    "explain softmax probability",
+    "why use regularization",
+    "what does the encoder do",
+    "how is validation accuracy measured",
+    "what is momentum in the optimizer",
+    "define the loss function",
+]
+
+
+def _time(fn: Callable[[], object], repeat: int) -> list[float]:
+    fn()  # warm-up: first-call costs (lazy imports, PyMuPDF caches) aren't the hot path
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def _record(results: dict, name: str, samples: list[float], calls: int) -> None:
+    """Store per-call timings (total time divided by calls per sample)."""
+    per_call = [s / calls for s in samples]
+    results[name] = {
+        "median_ms": round(statistics.median(per_call), 4),
+        "min_ms": round(min(per_call), 4),
+        "calls": calls,
+        "repeat": len(samples),
+    }
+
+
+def run_size(pages: int, repeat: int) -> dict:
+    from models import VoiceState
+    from routers.voice import _build_context
+    from services import demo_store
+    from services.formula_detector import score_formula_page
+    from services.formula_layout import extract_page_expressions
+    from services.module_extractor import _has_visual_indicators, _render_page_for_vision
+    from services.pdf_parser import parse_pdf
+    from services.qa_engine import retrieve_top_chunks
+
+    results: dict = {}
+    doc = build_lecture_pdf(pages)
+    # Round-trip through bytes so pages are parsed from a file, as on upload
+    doc = fitz.open("pdf", doc.tobytes())
+
+    parse_repeat = max(1, repeat // 2) if pages >= 500 else repeat
+    parsed = None
+
+    def parse() -> None:
+        nonlocal parsed
+        parsed = parse_pdf("synthetic.pdf", doc)
+
+    _record(results, "parse_pdf", _time(parse, parse_repeat), 1)
+
+    _record(results, "score_formula_page",
+            _time(lambda: [score_formula_page(page) for page in doc], repeat), len(doc))
+
+    formula_pages = [page for page in doc if score_formula_page(page).is_formula]
+    if formula_pages:
+        _record(results, "extract_page_expressions",
+                _time(lambda: [extract_page_expressions(page) for page in formula_pages], repeat),
+                len(formula_pages))
+
+    _record(results, "has_visual_indicators",
+            _time(lambda: [_has_visual_indicators(page) for page in doc], repeat), len(doc))
+
+    figure_pages = [
+        doc[i] for i in range(len(doc))
+        if PAGE_KINDS[i % len(PAGE_KINDS)] in ("line_graph", "flowchart", "image")
+    ][:RENDER_SAMPLE_PAGES]
+    _record(results, "render_page_for_vision",
+            _time(lambda: [_render_page_for_vision(page) for page in figure_pages], max(3, repeat // 2)),
+            len(figure_pages))
+
+    chunks = parsed.chunks
+    doc_id = parsed.manifest.docId
+    _record(results, "retrieve_top_chunks",
+            _time(lambda: [
+                retrieve_top_chunks(q, chunks, page_no=(i * 7) % pages + 1)
+                for i, q in enumerate(_QUESTIONS)
+            ], repeat), len(_QUESTIONS))
+
+    demo_store.store_uploaded(doc_id, parsed.manifest, chunks, parsed.formulas, parsed.visuals)
+    try:
+        states = [
+            VoiceState(docId=doc_id, pageNo=(i * 13) % pages + 1, chunkIndex=0, mode="READING")
+            for i in range(20)
+        ]
+        _record(results, "build_context",
+                _time(lambda: [_build_context(s) for s in states], repeat), len(states))
+
+        def getters() -> None:
+            for page_no in range(1, pages + 1):
+                demo_store.get_manifest(doc_id)
+                demo_store.get_chunks(doc_id)
+                demo_store.get_formulas(doc_id, page_no)
+                demo_store.get_visuals(doc_id, page_no)
+
+        _record(results, "demo_store_getters", _time(getters, repeat), pages)
+    finally:
+        demo_store._uploaded.pop(doc_id, None)
+
+    doc.close()
+    return results
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Regressions of current results against the baseline, as readable lines."""
+    regressions = []
+    for size, benches in current.items():
+        for name, result in benches.items():
+            base = baseline.get(size, {}).get(name)
+            if base is None:
+                continue
+            now, before = result["min_ms"], base["min_ms"]
+            if now > before * (1 + tolerance) and (now - before) * result["calls"] > MIN_REGRESSION_MS:
+                regressions.append(
+                    f"{name}@{size} pages: {now:.4f} ms/call vs baseline {before:.4f} "
+                    f"({now / before:.2f}x, tolerance {1 + tolerance:.2f}x)"
+                )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES), help="PDF page counts")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="timed repetitions per benchmark")
+    parser.add_argument("--output", type=Path, help="write results JSON here")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH, help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown (0.5 = 50%%)")
+    parser.add_argument("--update-baseline", action="store_true", help="write results as the new baseline")
+    args = parser.parse_args()
+
+    results: dict[str, dict] = {}
+    for size in args.sizes:
+        results[str(size)] = run_size(size, args.repeat)
+        for name, r in results[str(size)].items():
+            print(f"{size:>4} pages  {name:<24} {r['min_ms']:>10.4f} ms/call  (median {r['median_ms']:.4f}, {r['calls']} calls)")
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "pymupdf": fitz.VersionBind,
+            "machine": platform.machine(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+
+    if args.update_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(report, indent=2) + "\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return
+
+    if not args.baseline.exists():
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to record one.")
+        return
+    baseline = json.loads(args.baseline.read_text())["results"]
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("\nPERFORMANCE REGRESSIONS:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print("\nNo regressions against baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Precision/recall of the local formula detector on the labeled fixture pages.
+
+Compares the scored detector (page fonts and text only) against the legacy
+"two or more indicator substrings" rule, counting formula LLM calls each
+would dispatch.
+
+Run from backend/:  python -m benchmarks.eval_formula_detector [-v] [--threshold T]
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from benchmarks.fixture_pages import build_page, load_fixture
+from benchmarks.scoring import print_report
+from services import formula_detector
+from services.formula_detector import score_formula_page, score_formula_text
+
+# The substring rule module_extractor used before the scored detector
+_LEGACY_INDICATORS = [
+    "=", "\u2211", "\u222B", "\u2202", "\u221A", "\u03A3", "\u220F",
+    "sum_", "exp(", "log(", "sin(", "cos(", "tan(",
+    "argmax", "argmin", "softmax", "sigmoid",
+    "^2", "^n", "f(x)", "P(", "E[", "d/dx",
+    "\\frac", "\\sum", "\\int", "\\partial",
+]
+
+
+def _legacy_rule(text: str) -> bool:
+    text_lower = text.lower()
+    return sum(1 for ind in _LEGACY_INDICATORS if ind.lower() in text_lower) >= 2
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every case")
+    parser.add_argument("--threshold", type=float, help="override FORMULA_SCORE_THRESHOLD")
+    args = parser.parse_args()
+    if args.threshold is not None:
+        formula_detector.FORMULA_SCORE_THRESHOLD = args.threshold
+
+    cases = load_fixture("formula_pages.json")["cases"]
+    labels, legacy, text_only, page_scored = [], [], [], []
+
+    for case in cases:
+        doc, page = build_page(case)
+        text = page.get_text()
+        page_score = score_formula_page(page)
+        positive = case["label"] == "formula"
+
+        labels.append(positive)
+        legacy.append(_legacy_rule(text))
+        text_only.append(score_formula_text(text).is_formula)
+        page_scored.append(page_score.is_formula)
+
+        if args.verbose or page_score.is_formula != positive:
+            mark = " " if page_score.is_formula == positive else "✗"
+            best = max(page_score.lines, key=lambda l: l[1], default=("", 0.0))[0]
+            print(
+                f"{mark} {case['name']:<32} label={case['label']:<8} "
+                f"score={page_score.score:.2f}  best={best.strip()[:48]!r}"
+            )
+        doc.close()
+
+    print(f"\n{len(cases)} pages, {sum(labels)} with formulas, threshold={formula_detector.FORMULA_SCORE_THRESHOLD}")
+    print_report("legacy", legacy, labels, "formula calls")
+    print_report("text-only", text_only, labels, "formula calls")
+    print_report("detector", page_scored, labels, "formula calls")
+
+
+if __name__ == "__main__":
+    main()
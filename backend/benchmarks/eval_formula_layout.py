@@ -0,0 +1,59 @@
+"""Accuracy of local formula-expression rebuilding on fixture pages.
+
+Checks the expressions rebuilt from span layout against the expected ones,
+next to what flattened `get_text("text")` output keeps of the same lines,
+and counts expressions reported on the formula corpus pages labeled none.
+
+Run from backend/:  python -m benchmarks.eval_formula_layout [-v]
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from benchmarks.fixture_pages import build_page, load_fixture
+from services.formula_layout import extract_page_expressions, normalize_expression
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every case")
+    args = parser.parse_args()
+
+    cases = load_fixture("formula_layout_pages.json")["cases"]
+    expected_total = exact = flattened = spurious = 0
+
+    for case in cases:
+        doc, page = build_page(case)
+        got = [e.expression for e in extract_page_expressions(page)]
+        flat = {normalize_expression(line) for line in page.get_text().splitlines()}
+        doc.close()
+
+        expected = case["expected"]
+        expected_total += len(expected)
+        exact += sum(1 for e in expected if e in got)
+        flattened += sum(1 for e in expected if e in flat)
+        spurious += sum(1 for g in got if g not in expected)
+
+        ok = got == expected
+        if args.verbose or not ok:
+            print(f"{' ' if ok else '✗'} {case['name']:<28} got={got}")
+
+    negatives = [c for c in load_fixture("formula_pages.json")["cases"] if c["label"] == "none"]
+    negative_hits = 0
+    for case in negatives:
+        doc, page = build_page(case)
+        found = extract_page_expressions(page)
+        doc.close()
+        negative_hits += bool(found)
+        if found:
+            print(f"✗ {case['name']:<28} (label none) got={[e.expression for e in found]}")
+
+    print(f"\n{len(cases)} pages, {expected_total} expressions")
+    print(f"rebuilt exactly:          {exact}/{expected_total} (spurious: {spurious})")
+    print(f"exact in flattened text:  {flattened}/{expected_total}")
+    print(f"formula-free pages with expressions: {negative_hits}/{len(negatives)}")
+
+
+if __name__ == "__main__":
+    main()
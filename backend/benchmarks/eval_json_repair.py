@@ -0,0 +1,41 @@
+"""Recovery of malformed model replies by the lenient JSON parser.
+
+Checks each fixture reply against the value it should recover (or that it
+is rejected), and that replies cut off mid-item lose the whole item rather
+than keep it half-filled.
+
+Run from backend/:  python -m benchmarks.eval_json_repair [-v]
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from benchmarks.fixture_pages import load_fixture
+from services.json_repair import JSONRepairError, parse_json_lenient
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every case")
+    args = parser.parse_args()
+
+    cases = load_fixture("json_repair_replies.json")["cases"]
+    correct = 0
+
+    for case in cases:
+        try:
+            got, repaired = parse_json_lenient(case["reply"])
+        except JSONRepairError:
+            got, repaired = None, None
+        ok = got == case["expected"] and repaired == case.get("repaired")
+        correct += ok
+        if args.verbose or not ok:
+            outcome = "rejected" if got is None else f"{got} (repaired={repaired})"
+            print(f"{' ' if ok else '✗'} {case['name']:<22} got {outcome}")
+
+    print(f"\n{correct}/{len(cases)} replies recovered as expected")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Accuracy of local line-graph extraction on fixture charts with known series.
+
+For each chart, checks the recovered axis ranges and titles, the largest
+point error against the true series (as a share of the y range) and whether
+min/peak/inflection features land near the true x positions.
+
+Run from backend/:  python -m benchmarks.eval_vector_graph [-v]
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from benchmarks.fixture_pages import build_page, load_fixture
+from services.vector_graph import extract_line_graph
+from services.visual_detector import figure_regions
+
+# Features count as found within this share of the x range
+FEATURE_X_TOLERANCE = 0.03
+
+
+def _interpolate(series: list[list[float]], x: float) -> float:
+    for (x0, y0), (x1, y1) in zip(series, series[1:]):
+        if x0 <= x <= x1:
+            return y0 if x1 == x0 else y0 + (x - x0) / (x1 - x0) * (y1 - y0)
+    return series[0][1] if x < series[0][0] else series[-1][1]
+
+
+def _feature_match(found: list[dict], expected: list[float], tol: float) -> tuple[int, int]:
+    """(expected features found, extra features reported)."""
+    xs = [f["x"] for f in found]
+    hits = sum(1 for e in expected if any(abs(x - e) <= tol for x in xs))
+    extra = sum(1 for x in xs if not any(abs(x - e) <= tol for e in expected))
+    return hits, extra
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every case")
+    args = parser.parse_args()
+
+    cases = load_fixture("line_graph_pages.json")["cases"]
+    correct_defer = ranges_ok = titles_ok = 0
+    errors: list[float] = []
+    feature_hits = feature_total = feature_extra = 0
+
+    for case in cases:
+        doc, page = build_page(case)
+        regions = [r for r in figure_regions(page.get_drawings(), page.rect) if r.kind == "line_graph"]
+        data = extract_line_graph(page, regions[0]) if regions else None
+        expected = case["expected"]
+        doc.close()
+
+        if expected is None:
+            ok = data is None
+            correct_defer += ok
+            if args.verbose or not ok:
+                print(f"{' ' if ok else '✗'} {case['name']:<28} expected deferral, got {'none' if data is None else 'data'}")
+            continue
+        if data is None:
+            print(f"✗ {case['name']:<28} not extracted")
+            errors.append(1.0)
+            continue
+
+        x_span = expected["xMax"] - expected["xMin"]
+        y_span = expected["yMax"] - expected["yMin"]
+        ranges = all(
+            abs(data[k] - expected[k]) <= 0.01 * (x_span if k[0] == "x" else y_span)
+            for k in ("xMin", "xMax", "yMin", "yMax")
+        )
+        titles = data["xLabel"] == expected["xLabel"] and data["yLabel"] == expected["yLabel"]
+        error = max(abs(y - _interpolate(expected["series"], x)) for x, y in data["points"]) / y_span
+        ranges_ok += ranges
+        titles_ok += titles
+        errors.append(error)
+
+        misses = []
+        for name in ("min", "peak", "inflection"):
+            hits, extra = _feature_match(data["features"][name], expected[name], FEATURE_X_TOLERANCE * x_span)
+            feature_hits += hits
+            feature_total += len(expected[name])
+            feature_extra += extra
+            if hits < len(expected[name]) or extra:
+                misses.append(f"{name}={[f['x'] for f in data['features'][name]]}")
+
+        good = ranges and titles and error <= 0.01 and not misses
+        if args.verbose or not good:
+            print(
+                f"{' ' if good else '✗'} {case['name']:<28} points={len(data['points']):<4} "
+                f"max_err={error:.4f} ranges={'ok' if ranges else 'off'} "
+                f"titles={(data['xLabel'], data['yLabel'])} {' '.join(misses)}"
+            )
+
+    graphs = sum(1 for c in cases if c["expected"] is not None)
+    print(f"\n{len(cases)} charts, {graphs} extractable")
+    print(f"axis ranges correct: {ranges_ok}/{graphs}, axis titles correct: {titles_ok}/{graphs}")
+    print(f"max point error (share of y range): worst={max(errors):.4f} mean={sum(errors) / len(errors):.4f}")
+    print(f"features found: {feature_hits}/{feature_total}, spurious: {feature_extra}")
+    print(f"deferred to vision when unreadable: {correct_defer}/{len(cases) - graphs}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Precision/recall of the visual-candidate detector on the labeled fixture pages.
+
+Compares the geometric detector against the legacy "any image or more than
+five drawings" rule, counting vision calls each would dispatch.
+
+Run from backend/:  python -m benchmarks.eval_visual_detector [-v]
+"""
+
+from __future__ import annotations
+
+import argparse
+
+from benchmarks.fixture_pages import build_page, load_fixture
+from benchmarks.scoring import print_report
+from services.visual_detector import detect_visual_regions
+
+
+def _legacy_rule(page) -> bool:
+    return bool(page.get_images(full=True)) or len(page.get_drawings()) > 5
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-v", "--verbose", action="store_true", help="print every case")
+    args = parser.parse_args()
+
+    cases = load_fixture("visual_pages.json")["cases"]
+    labels, detector, legacy = [], [], []
+    kind_hits = 0
+
+    for case in cases:
+        doc, page = build_page(case)
+        regions = detect_visual_regions(page.get_drawings(), page.rect)
+        best = regions[0] if regions else None
+        kind = best.kind if best else None
+        positive = case["label"] != "none"
+
+        labels.append(positive)
+        detector.append(kind is not None)
+        legacy.append(_legacy_rule(page))
+        kind_hits += positive and kind == case["label"]
+
+        if args.verbose or (kind is not None) != positive:
+            scores = f"lg={best.line_graph_score:.2f} fc={best.flowchart_score:.2f}" if best else "no regions"
+            mark = " " if (kind is not None) == positive else "✗"
+            print(f"{mark} {case['name']:<32} label={case['label']:<10} got={kind or 'none':<10} {scores}")
+        doc.close()
+
+    print(f"\n{len(cases)} pages, {sum(labels)} with figures")
+    print_report("legacy", legacy, labels, "vision calls")
+    print_report("detector", detector, labels, "vision calls")
+    print(f"figure type accuracy on positives: {kind_hits}/{sum(labels)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Build PyMuPDF pages from the JSON fixture specs (shapes and text lines) in benchmarks/fixtures."""
+
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+
+
+def load_fixture(name: str) -> dict:
+    with open(FIXTURES_DIR / name, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _draw(page: fitz.Page, spec: dict) -> None:
+    if "text" in spec:
+        x, y, text = spec["text"]
+        page.insert_text((x, y), text, fontsize=spec.get("size", 11), rotate=spec.get("rotate", 0))
+        return
+
+    shape = page.new_shape()
+    if "line" in spec:
+        x0, y0, x1, y1 = spec["line"]
+        shape.draw_line((x0, y0), (x1, y1))
+    elif "polyline" in spec:
+        shape.draw_polyline(spec["polyline"])
+    elif "polygon" in spec:
+        pts = spec["polygon"]
+        shape.draw_polyline(pts + [pts[0]])
+    elif "rect" in spec:
+        shape.draw_rect(fitz.Rect(spec["rect"]))
+    elif "circle" in spec:
+        cx, cy, r = spec["circle"]
+        shape.draw_circle((cx, cy), r)
+    elif "bezier" in spec:
+        for p1, c1, c2, p2 in spec["bezier"]:
+            shape.draw_bezier(p1, c1, c2, p2)
+    else:
+        raise ValueError(f"Unknown fixture shape: {spec}")
+    shape.finish(
+        color=(0, 0, 0),
+        fill=spec.get("fill"),
+        width=spec.get("width", 1),
+        closePath="polygon" in spec,
+    )
+    shape.commit()
+
+
+def _write_lines(page: fitz.Page, lines: list) -> None:
+    """Write text lines; a line is a string or a list of [text, font] or
+    [text, font, "sub"|"sup"] segments (scripts are set smaller and shifted)."""
+    # Base-14 Helvetica has no Greek or math glyphs, so default to a Unicode font
+    unicode_font = fitz.Font("cjk")
+    page.insert_font(fontname="uni", fontbuffer=unicode_font.buffer)
+    y = 72
+    for line in lines:
+        segments = [[line, "uni"]] if isinstance(line, str) else line
+        x = 72
+        for text, font, *role in segments:
+            font = "uni" if font == "helv" else font
+            size, shift = {"sub": (8, 3), "sup": (8, -5)}.get(role[0] if role else "", (12, 0))
+            page.insert_text((x, y + shift), text, fontname=font, fontsize=size)
+            if font == "uni":
+                x += unicode_font.text_length(text, fontsize=size)
+            else:
+                x += fitz.get_text_length(text, fontname=font, fontsize=size)
+        y += 24
+
+
+def build_page(case: dict) -> tuple[fitz.Document, fitz.Page]:
+    """Return (document, page) for a fixture case. Keep the document open while using the page."""
+    if "pdf" in case:
+        doc = fitz.open(REPO_ROOT / case["pdf"])
+        return doc, doc[case["page"] - 1]
+    width, height = case.get("size", (612, 792))
+    doc = fitz.open()
+    page = doc.new_page(width=width, height=height)
+    if "lines" in case:
+        _write_lines(page, case["lines"])
+    for spec in case.get("shapes", []):
+        _draw(page, spec)
+    return doc, page
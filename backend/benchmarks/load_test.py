@@ -0,0 +1,287 @@
+"""End-to-end load test of upload, /api/voice, /api/qa and the module endpoints.
+
+Each simulated student runs a session script against the FastAPI app in
+process: upload a synthetic lecture PDF, read through it by voice, ask
+questions (typed and spoken), step through a formula and explore a graph.
+The AI provider, Deepgram and the orchestrator agent are replaced by the
+latency-configurable stubs in benchmarks.stubs, so only our own code runs.
+
+For each concurrency level the report gives p50/p95/p99 latency per
+endpoint and the event-loop stall time: a heartbeat task sleeps in short
+ticks and anything beyond the tick is time the loop spent blocked (the
+synchronous Deepgram call, PDF parsing on the loop, and so on).
+
+Run from backend/:
+    python -m benchmarks.load_test                          # levels 1 5 10 25
+    python -m benchmarks.load_test --levels 1 10 50 --llm-ms 800
+    python -m benchmarks.load_test --async-stt --output load.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+from benchmarks.stubs import StubLatency, install
+from benchmarks.synthetic_pdf import build_lecture_pdf
+
+DEFAULT_LEVELS = (1, 5, 10, 25)
+HEARTBEAT_TICK_MS = 10.0
+# Heartbeat overshoot above this counts as a stall (timer jitter stays below it)
+STALL_THRESHOLD_MS = 5.0
+# Rich demo document with formula and visual modules, used for those steps
+DEMO_DOC_ID = "demo-001"
+DEMO_FORMULA_ID = "f1"
+DEMO_FORMULA_PAGE = 2
+DEMO_VISUAL_ID = "v1"
+DEMO_VISUAL_PAGE = 3
+
+_QUESTIONS = [
+    "what is gradient descent",
+    "how does the learning rate affect convergence",
+    "why use regularization",
+    "explain the softmax probability",
+]
+
+
+def _percentile(samples: list[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+@dataclass
+class _Recorder:
+    latencies: dict[str, list[float]] = field(default_factory=lambda: defaultdict(list))
+    errors: dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+    async def call(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> dict | None:
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            ok = response.status_code < 400
+        except Exception:
+            response, ok = None, False
+        self.latencies[name].append((time.perf_counter() - start) * 1000)
+        if not ok:
+            self.errors[name] += 1
+            return None
+        return response.json()
+
+
+class _Heartbeat:
+    """Measures how late a short periodic sleep wakes up."""
+
+    def __init__(self) -> None:
+        self.stalls: list[float] = []
+        self.ticks = 0
+        self._task: asyncio.Task | None = None
+
+    async def _run(self) -> None:
+        tick = HEARTBEAT_TICK_MS / 1000
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(tick)
+            late = (time.perf_counter() - start - tick) * 1000
+            self.ticks += 1
+            if late > STALL_THRESHOLD_MS:
+                self.stalls.append(late)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+async def _voice(rec: _Recorder, client: httpx.AsyncClient, transcript: str, state: dict) -> dict | None:
+    return await rec.call(
+        client, "voice", "POST", "/api/voice",
+        files={"audio": ("speech.webm", transcript.encode(), "audio/webm")},
+        data={"state": json.dumps(state)},
+    )
+
+
+async def _session(rec: _Recorder, client: httpx.AsyncClient, pdf_bytes: bytes, rng: random.Random,
+                   think_ms: float) -> None:
+    """One student: upload, read, ask, step through a formula, explore a graph."""
+
+    async def think() -> None:
+        if think_ms:
+            await asyncio.sleep(rng.uniform(0.5, 1.5) * think_ms / 1000)
+
+    uploaded = await rec.call(client, "upload", "POST", "/api/documents/upload",
+                              files={"file": ("lecture.pdf", pdf_bytes, "application/pdf")})
+    if uploaded is None:
+        return
+    doc_id = uploaded["docId"]
+    await rec.call(client, "manifest", "GET", f"/api/documents/{doc_id}/manifest")
+    chunks = await rec.call(client, "chunks", "GET", f"/api/documents/{doc_id}/chunks")
+    first = chunks["chunks"][0] if chunks and chunks["chunks"] else {"pageNo": 1, "chunkId": ""}
+
+    state = {"docId": doc_id, "pageNo": first["pageNo"], "chunkIndex": 0, "mode": "READING"}
+    for command in ("next", "next", "repeat", "go back", "summarize"):
+        await think()
+        result = await _voice(rec, client, command, state)
+        if result and result.get("action") == "NEXT_CHUNK":
+            state["chunkIndex"] += 1
+
+    for question in rng.sample(_QUESTIONS, 2):
+        await think()
+        await rec.call(client, "qa", "POST", "/api/qa", json={
+            "docId": doc_id, "pageNo": first["pageNo"], "chunkId": first["chunkId"], "question": question,
+        })
+    await think()
+    await _voice(rec, client, rng.choice(_QUESTIONS), state)
+
+    await rec.call(client, "formulas", "GET", "/api/modules/formulas",
+                   params={"docId": DEMO_DOC_ID, "pageNo": DEMO_FORMULA_PAGE})
+    formula_state = {"docId": DEMO_DOC_ID, "pageNo": DEMO_FORMULA_PAGE, "chunkIndex": 0,
+                     "mode": "FORMULA", "modeId": DEMO_FORMULA_ID, "formulaStep": "purpose"}
+    for section in ("purpose", "symbols", "example", "intuition"):
+        await think()
+        await rec.call(client, "formula_explain", "POST", "/api/modules/formulas/explain",
+                       json={"docId": DEMO_DOC_ID, "formulaId": DEMO_FORMULA_ID, "section": section})
+    await _voice(rec, client, "symbols", formula_state)
+
+    await rec.call(client, "visuals", "GET", "/api/modules/visuals",
+                   params={"docId": DEMO_DOC_ID, "pageNo": DEMO_VISUAL_PAGE})
+    visual_state = {"docId": DEMO_DOC_ID, "pageNo": DEMO_VISUAL_PAGE, "chunkIndex": 0,
+                    "mode": "VISUAL", "modeId": DEMO_VISUAL_ID}
+    for command in ("describe the graph", "what is here", "I'm done"):
+        await think()
+        await _voice(rec, client, command, visual_state)
+    await rec.call(client, "reflect", "POST", "/api/explore/reflect", json={
+        "docId": DEMO_DOC_ID,
+        "visualId": DEMO_VISUAL_ID,
+        "trace": {
+            "visualId": DEMO_VISUAL_ID,
+            "startedAt": datetime.now(timezone.utc).isoformat(),
+            "durationSec": 42.0,
+            "events": [{"type": "enter_feature", "timestamp": 1.0, "data": {"feature": "minimum"}}],
+            "visited": ["minimum"],
+        },
+    })
+
+
+async def run_level(concurrency: int, pdf_bytes: bytes, think_ms: float, seed: int) -> dict:
+    from main import app
+
+    rec = _Recorder()
+    heartbeat = _Heartbeat()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=None) as client:
+        heartbeat.start()
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            _session(rec, client, pdf_bytes, random.Random(seed + i), think_ms)
+            for i in range(concurrency)
+        ))
+        wall = time.perf_counter() - start
+        await heartbeat.stop()
+
+    endpoints = {}
+    for name, samples in sorted(rec.latencies.items()):
+        endpoints[name] = {
+            "count": len(samples),
+            "errors": rec.errors.get(name, 0),
+            "p50_ms": round(_percentile(samples, 50), 1),
+            "p95_ms": round(_percentile(samples, 95), 1),
+            "p99_ms": round(_percentile(samples, 99), 1),
+        }
+    requests = sum(len(s) for s in rec.latencies.values())
+    return {
+        "concurrency": concurrency,
+        "wall_s": round(wall, 2),
+        "requests": requests,
+        "throughput_rps": round(requests / wall, 1) if wall else 0.0,
+        "loop_stall": {
+            "total_ms": round(sum(heartbeat.stalls), 1),
+            "max_ms": round(max(heartbeat.stalls, default=0.0), 1),
+            "share": round(sum(heartbeat.stalls) / 1000 / wall, 3) if wall else 0.0,
+            "events": len(heartbeat.stalls),
+        },
+        "endpoints": endpoints,
+    }
+
+
+def _print_level(result: dict) -> None:
+    stall = result["loop_stall"]
+    print(
+        f"\n== concurrency {result['concurrency']}: {result['requests']} requests in {result['wall_s']} s "
+        f"({result['throughput_rps']} req/s); loop stalled {stall['total_ms']:.0f} ms total, "
+        f"max {stall['max_ms']:.0f} ms, {stall['share']:.0%} of wall time"
+    )
+    print(f"   {'endpoint':<16} {'count':>6} {'errors':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for name, e in result["endpoints"].items():
+        print(f"   {name:<16} {e['count']:>6} {e['errors']:>6} {e['p50_ms']:>9.1f} {e['p95_ms']:>9.1f} {e['p99_ms']:>9.1f}")
+
+
+async def _main(args: argparse.Namespace) -> dict:
+    from services.demo_store import load_demo_data
+
+    load_demo_data()
+    latency = StubLatency(llm_ms=args.llm_ms, stt_ms=args.stt_ms, stt_blocking=not args.async_stt)
+    provider = install(latency)
+    doc = build_lecture_pdf(args.pages)
+    pdf_bytes = doc.tobytes()
+    doc.close()
+
+    levels = []
+    for concurrency in args.levels:
+        result = await run_level(concurrency, pdf_bytes, args.think_ms, args.seed)
+        _print_level(result)
+        levels.append(result)
+    print(f"\nStub AI calls: {dict(sorted(provider.calls.items()))}")
+
+    return {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "pages": args.pages,
+            "llm_ms": args.llm_ms,
+            "stt_ms": args.stt_ms,
+            "stt_blocking": latency.stt_blocking,
+            "think_ms": args.think_ms,
+        },
+        "levels": levels,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--levels", type=int, nargs="+", default=list(DEFAULT_LEVELS), help="concurrent sessions per level")
+    parser.add_argument("--pages", type=int, default=6, help="pages in the uploaded synthetic PDF")
+    parser.add_argument("--llm-ms", type=float, default=400.0, help="stub LLM latency per call")
+    parser.add_argument("--stt-ms", type=float, default=250.0, help="stub transcription latency")
+    parser.add_argument("--async-stt", action="store_true",
+                        help="await the stub transcription instead of blocking like the Deepgram SDK call")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="mean pause between a student's steps")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="write results JSON here")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    report = asyncio.run(_main(args))
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
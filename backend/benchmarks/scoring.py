@@ -0,0 +1,26 @@
+"""Precision/recall helpers shared by the detector evaluation scripts."""
+
+from __future__ import annotations
+
+
+def precision_recall(predictions: list[bool], labels: list[bool]) -> dict:
+    tp = sum(p and l for p, l in zip(predictions, labels))
+    fp = sum(p and not l for p, l in zip(predictions, labels))
+    fn = sum(l and not p for p, l in zip(predictions, labels))
+    return {
+        "calls": sum(predictions),
+        "tp": tp,
+        "fp": fp,
+        "fn": fn,
+        "precision": tp / (tp + fp) if tp + fp else 1.0,
+        "recall": tp / (tp + fn) if tp + fn else 1.0,
+    }
+
+
+def print_report(name: str, predictions: list[bool], labels: list[bool], calls_label: str) -> dict:
+    r = precision_recall(predictions, labels)
+    print(
+        f"{name:<12} {calls_label}={r['calls']:>3}  precision={r['precision']:.2f}  "
+        f"recall={r['recall']:.2f}  (tp={r['tp']} fp={r['fp']} fn={r['fn']})"
+    )
+    return r
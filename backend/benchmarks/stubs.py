@@ -0,0 +1,169 @@
+"""Latency-configurable local stand-ins for the AI provider, Deepgram and the
+orchestrator agent, so the load test exercises our code and not the network.
+
+Each stub waits for its configured latency and returns a well-formed canned
+result. The transcription stub reads the "audio" bytes as the transcript
+text. When `stt_blocking` is set it sleeps with `time.sleep`, as the current
+synchronous Deepgram call does, so the event loop stall shows up in the load
+report.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+
+@dataclass
+class StubLatency:
+    """Simulated latencies, in milliseconds."""
+
+    llm_ms: float = 400.0
+    stt_ms: float = 250.0
+    stt_blocking: bool = True
+
+
+class StubAIProvider:
+    """Drop-in for services.ai_provider.AIProvider with canned answers."""
+
+    def __init__(self, latency: StubLatency):
+        self.latency = latency
+        self.calls: dict[str, int] = {}
+
+    async def _wait(self, name: str) -> None:
+        self.calls[name] = self.calls.get(name, 0) + 1
+        await asyncio.sleep(self.latency.llm_ms / 1000)
+
+    async def generate_formula_explanation(self, formula: dict[str, Any], section: str) -> str:
+        await self._wait("generate_formula_explanation")
+        return f"The {section} of {formula.get('expression', 'this formula')}."
+
+    async def generate_grounded_qa(self, question: str, chunks: list[dict[str, Any]]) -> dict[str, Any]:
+        await self._wait("generate_grounded_qa")
+        cited = chunks[:1]
+        return {
+            "answer": f"According to the notes, {cited[0]['text'][:80] if cited else 'nothing matched'}.",
+            "citations": [{"pageNo": c["pageNo"], "chunkId": c["chunkId"]} for c in cited],
+        }
+
+    async def summarize_conversation(self, *args: Any, **kwargs: Any) -> str:
+        await self._wait("summarize_conversation")
+        return "The student asked about the current page."
+
+    async def summarize_text(self, text: str, scope: str = "page") -> str:
+        await self._wait("summarize_text")
+        return text[:120] or "Empty page."
+
+    async def generate_explore_reflection(self, visual: dict[str, Any], trace: dict[str, Any]) -> dict[str, str]:
+        await self._wait("generate_explore_reflection")
+        return {
+            "reflection": f"You explored {visual.get('title', 'the figure')}.",
+            "takeaway": "The curve falls quickly, then levels off.",
+            "nextSuggestion": "Try guiding to the minimum.",
+        }
+
+    async def extract_formulas_from_text(self, *args: Any, **kwargs: Any) -> list[dict[str, Any]]:
+        await self._wait("extract_formulas_from_text")
+        return []
+
+    async def explain_formulas(self, page_no: int, expressions: list[str], context: str = "") -> list[dict[str, Any]]:
+        await self._wait("explain_formulas")
+        return [
+            {"index": i + 1, "purpose": f"Defines {e}.", "symbols": [], "example": "Plug in small numbers."}
+            for i, e in enumerate(expressions)
+        ]
+
+    async def analyze_page_image(self, *args: Any, **kwargs: Any) -> list[dict[str, Any]]:
+        await self._wait("analyze_page_image")
+        return []
+
+    async def describe_line_graph(self, page_no: int, page_text: str, data: dict[str, Any]) -> dict[str, str]:
+        await self._wait("describe_line_graph")
+        return {"title": f"Graph on page {page_no}", "description": "A decreasing curve.", "xLabel": "", "yLabel": ""}
+
+    async def chat(self, message: str, context: str = "") -> str:
+        await self._wait("chat")
+        return "Say Help to hear your options."
+
+
+async def stub_transcribe(latency: StubLatency, audio_bytes: bytes) -> str:
+    """Transcript is the audio payload itself, after the configured STT delay."""
+    if latency.stt_blocking:
+        time.sleep(latency.stt_ms / 1000)
+    else:
+        await asyncio.sleep(latency.stt_ms / 1000)
+    return audio_bytes.decode("utf-8", errors="ignore")
+
+
+# Transcript keywords -> (tool name, tool args), checked in order, first match wins
+_ROUTES: list[tuple[tuple[str, ...], str, dict[str, str]]] = [
+    (("symbols",), "formula_control", {"command": "symbols"}),
+    (("example",), "formula_control", {"command": "example"}),
+    (("intuition",), "formula_control", {"command": "intuition"}),
+    (("describe",), "visual_control", {"command": "describe"}),
+    (("what is here",), "visual_control", {"command": "what_is_here"}),
+    (("next key point",), "visual_control", {"command": "next_key_point"}),
+    (("i'm done", "done"), "visual_control", {"command": "done"}),
+    (("what", "how", "why", "explain"), "ask_question", {}),
+    (("next", "continue"), "reading_control", {"command": "next"}),
+    (("back",), "reading_control", {"command": "back"}),
+    (("repeat",), "reading_control", {"command": "repeat"}),
+    (("where am i",), "reading_control", {"command": "where_am_i"}),
+    (("summar",), "reading_control", {"command": "summarize"}),
+]
+
+
+@dataclass
+class StubAgent:
+    """Stands in for the LangGraph ReAct agent: one simulated model turn to
+    pick a tool by keyword, the real tool call, and a second model turn."""
+
+    latency: StubLatency
+    tools: dict[str, Any] = field(default_factory=dict)
+
+    def _route(self, transcript: str) -> tuple[str, dict[str, str]] | None:
+        text = transcript.lower()
+        for keywords, name, args in _ROUTES:
+            if any(k in text for k in keywords):
+                return name, args or {"question": transcript}
+        return None
+
+    async def ainvoke(self, inputs: dict[str, Any], config: dict[str, Any] | None = None) -> dict[str, Any]:
+        transcript = str(inputs["messages"][-1].content)
+        await asyncio.sleep(self.latency.llm_ms / 1000)
+        route = self._route(transcript)
+        if route is None:
+            return {"messages": [AIMessage(content="Say Help to hear your options.")]}
+        name, args = route
+        # LangGraph runs sync tools in a worker thread
+        result = await asyncio.to_thread(self.tools[name].invoke, args)
+        await asyncio.sleep(self.latency.llm_ms / 1000)
+        return {"messages": [ToolMessage(content=result, tool_call_id=name), AIMessage(content="")]}
+
+
+def install(latency: StubLatency) -> StubAIProvider:
+    """Swap the stubs into the backend modules; returns the AI stub for call counts."""
+    from routers import voice
+    from services import ai_provider, orchestrator
+
+    provider = StubAIProvider(latency)
+    ai_provider._provider = provider
+    orchestrator._agent = StubAgent(latency, tools={
+        t.name: t for t in (
+            orchestrator.reading_control,
+            orchestrator.ask_question,
+            orchestrator.formula_control,
+            orchestrator.visual_control,
+        )
+    })
+
+    async def transcribe(audio_bytes: bytes, mimetype: str = "audio/webm") -> str:
+        return await stub_transcribe(latency, audio_bytes)
+
+    voice.transcribe_audio = transcribe
+    return provider
+
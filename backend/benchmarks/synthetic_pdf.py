@@ -0,0 +1,114 @@
+"""Deterministic synthetic lecture PDFs for benchmarks.
+
+Pages cycle through the kinds a real course pack mixes: prose, a formula
+slide, a vector line graph, a flowchart, a slide with a raster image and a
+two-column page.
+"""
+
+from __future__ import annotations
+
+import math
+import random
+
+import fitz  # PyMuPDF
+
+_WORDS = (
+    "gradient descent loss function parameter update learning rate model training "
+    "validation accuracy softmax probability vector encoder classifier token layer "
+    "weight bias batch epoch convergence regularization optimizer momentum curvature"
+).split()
+
+_FORMULAS = [
+    "softmax(z_i) = exp(z_i) / sum_j exp(z_j)",
+    "theta_{t+1} = theta_t - eta * grad L(theta_t)",
+    "L(w) = (1/n) sum_i (y_i - w x_i)^2",
+    "sigma(z) = 1 / (1 + exp(-z))",
+]
+
+PAGE_KINDS = ("prose", "formula", "line_graph", "flowchart", "image", "two_column")
+
+
+def _sentence(rng: random.Random, words: int = 14) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _paragraph(rng: random.Random, sentences: int = 4) -> str:
+    return " ".join(_sentence(rng) for _ in range(sentences))
+
+
+def _photo(rng: random.Random) -> fitz.Pixmap:
+    pix = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 160, 120), False)
+    for y in range(0, 120, 8):
+        for x in range(0, 160, 8):
+            pix.set_rect(fitz.IRect(x, y, x + 8, y + 8), tuple(rng.randrange(256) for _ in range(3)))
+    return pix
+
+
+def _line_graph(page: fitz.Page, rng: random.Random) -> None:
+    x0, x1, yb, yt = 100, 500, 450, 200
+    shape = page.new_shape()
+    shape.draw_line((x0, yb), (x1, yb))
+    shape.draw_line((x0, yb), (x0, yt))
+    for i in range(6):
+        x = x0 + i * (x1 - x0) / 5
+        shape.draw_line((x, yb), (x, yb + 4))
+    for i in range(3):
+        y = yb - i * (yb - yt) / 2
+        shape.draw_line((x0 - 4, y), (x0, y))
+    shape.finish(color=(0, 0, 0), width=1)
+    rate = rng.uniform(4, 12)
+    points = [
+        (x0 + i * (x1 - x0) / 59, yb - (yb - yt) * (0.3 + 0.7 * math.exp(-i / rate)))
+        for i in range(60)
+    ]
+    shape.draw_polyline(points)
+    shape.finish(color=(0.8, 0.1, 0.1), width=1.5)
+    shape.commit()
+    for i in range(6):
+        page.insert_text((x0 + i * 80 - 4, yb + 16), str(i * 10), fontsize=9)
+    for i, label in enumerate(("0", "0.5", "1.0")):
+        page.insert_text((x0 - 24, yb - i * 125 + 3), label, fontsize=9)
+    page.insert_text((280, yb + 34), "Epoch", fontsize=10)
+
+
+def _flowchart(page: fitz.Page) -> None:
+    shape = page.new_shape()
+    boxes = [fitz.Rect(90 + i * 120, 300, 180 + i * 120, 350) for i in range(4)]
+    for box in boxes:
+        shape.draw_rect(box)
+    for a, b in zip(boxes, boxes[1:]):
+        shape.draw_line((a.x1, 325), (b.x0, 325))
+    shape.finish(color=(0, 0, 0), width=1)
+    shape.commit()
+    for box, label in zip(boxes, ("Input", "Tokenize", "Encode", "Classify")):
+        page.insert_text((box.x0 + 8, box.y0 + 28), label, fontsize=11)
+
+
+def build_lecture_pdf(pages: int, seed: int = 0) -> fitz.Document:
+    """An in-memory lecture PDF of the given length."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for idx in range(pages):
+        kind = PAGE_KINDS[idx % len(PAGE_KINDS)]
+        page = doc.new_page(width=612, height=792)
+        page.insert_text((72, 70), f"Lecture {idx // 10 + 1}: {rng.choice(_WORDS).title()} {kind.replace('_', ' ').title()}", fontsize=22)
+
+        if kind == "prose":
+            page.insert_textbox(fitz.Rect(72, 100, 540, 740), "\n\n".join(_paragraph(rng) for _ in range(4)), fontsize=11)
+        elif kind == "formula":
+            page.insert_textbox(fitz.Rect(72, 100, 540, 180), _paragraph(rng, 2), fontsize=11)
+            page.insert_text((90, 220), rng.choice(_FORMULAS), fontsize=13)
+            page.insert_textbox(fitz.Rect(72, 250, 540, 400), _paragraph(rng, 3), fontsize=11)
+        elif kind == "line_graph":
+            page.insert_textbox(fitz.Rect(72, 100, 540, 180), _paragraph(rng, 2), fontsize=11)
+            _line_graph(page, rng)
+        elif kind == "flowchart":
+            page.insert_textbox(fitz.Rect(72, 100, 540, 260), _paragraph(rng, 3), fontsize=11)
+            _flowchart(page)
+        elif kind == "image":
+            page.insert_image(fitz.Rect(150, 200, 460, 430), pixmap=_photo(rng))
+            page.insert_text((150, 450), "Figure 1: Sample activations.", fontsize=9)
+        else:
+            page.insert_textbox(fitz.Rect(72, 100, 295, 740), "\n\n".join(_paragraph(rng) for _ in range(3)), fontsize=10)
+            page.insert_textbox(fitz.Rect(317, 100, 540, 740), "\n\n".join(_paragraph(rng) for _ in range(3)), fontsize=10)
+    return doc
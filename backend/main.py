@@ -4,9 +4,11 @@ from dotenv import load_dotenv
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from routers import documents, explore, modules, qa, voice
+from routers import documents, explore, health, metrics, modules, qa, usage, voice
 from services.demo_store import load_demo_data
 from services.ai_provider import init_ai_provider
+from services.tracing import close_trace_log, trace_request
+from services.usage import usage_scope_middleware
 
 load_dotenv()
 
@@ -16,6 +18,7 @@ async def lifespan(app: FastAPI):
     load_demo_data()
     init_ai_provider()
     yield
+    close_trace_log()
 
 
 app = FastAPI(title="GuidedNotes API", lifespan=lifespan)
@@ -25,10 +28,16 @@ app.add_middleware(
     allow_origins=["http://localhost:5173"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Request-ID"],
 )
+app.middleware("http")(usage_scope_middleware)
+app.middleware("http")(trace_request)
 
 app.include_router(documents.router)
 app.include_router(modules.router)
 app.include_router(qa.router)
 app.include_router(explore.router)
 app.include_router(voice.router)
+app.include_router(usage.router)
+app.include_router(metrics.router)
+app.include_router(health.router)
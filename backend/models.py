@@ -46,6 +46,27 @@ class Chunk(BaseModel):
 class ChunksResponse(BaseModel):
     docId: str
     chunks: list[Chunk]
+    # Set on windowed reads when more chunks remain in the requested range
+    nextCursor: str | None = None
+
+
+class PageSummary(BaseModel):
+    pageNo: int
+    summary: str
+
+
+class SectionSummary(BaseModel):
+    sectionId: str
+    title: str
+    startPage: int
+    endPage: int
+    summary: str
+
+
+class SummariesResponse(BaseModel):
+    docId: str
+    pages: list[PageSummary]
+    sections: list[SectionSummary] = []
 
 
 class Symbol(BaseModel):
@@ -60,6 +81,7 @@ class FormulaModule(BaseModel):
     purpose: str
     symbols: list[Symbol]
     example: str
+    bbox: list[float] | None = None  # [x0, y0, x1, y1] on the page, when located
 
 
 class FormulasResponse(BaseModel):
@@ -95,6 +117,20 @@ class VisualsResponse(BaseModel):
     visuals: list[VisualModule]
 
 
+class PageBundle(BaseModel):
+    """Everything needed to present one page."""
+    pageNo: int
+    summary: str | None = None
+    chunks: list[Chunk]
+    formulas: list[FormulaModule]
+    visuals: list[VisualModule]
+
+
+class PageBundlesResponse(BaseModel):
+    docId: str
+    pages: list[PageBundle]
+
+
 class QARequest(BaseModel):
     docId: str
     pageNo: int
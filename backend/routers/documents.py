@@ -1,39 +1,184 @@
-from fastapi import APIRouter, HTTPException, UploadFile
+import os
+import tempfile
 
-from models import DocumentManifest
-from services.demo_store import get_chunks, get_manifest, store_uploaded
+import fitz  # PyMuPDF
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from python_multipart import MultipartParser
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+from models import ChunksResponse, DocumentManifest, PageBundlesResponse, SummariesResponse
+from services.demo_store import (
+    get_chunk_window,
+    get_chunks,
+    get_manifest,
+    get_page_bundles,
+    get_summaries,
+    store_uploaded,
+)
+from services.response_cache import cached_json
 
 router = APIRouter(prefix="/api/documents", tags=["documents"])
 
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "50")) * 1024 * 1024
+# Parsed upload bytes are written to disk in blocks of at least this size
+UPLOAD_WRITE_BYTES = 1024 * 1024
+# Multipart framing (boundaries, part headers, other fields) allowed on top of MAX_UPLOAD_BYTES
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+# Most chunks a single windowed /chunks request returns
+MAX_CHUNK_WINDOW = int(os.getenv("MAX_CHUNK_WINDOW", "500"))
+# Most pages after the requested one a page bundle may prefetch
+MAX_PAGE_PREFETCH = int(os.getenv("MAX_PAGE_PREFETCH", "10"))
+
+
+class _UploadSpool:
+    """Multipart parser callbacks that collect the "file" part of an upload,
+    enforcing MAX_UPLOAD_BYTES on the part as it is parsed."""
+
+    def __init__(self) -> None:
+        self.filename: str | None = None
+        self.size = 0
+        self.pending = bytearray()  # file bytes parsed but not yet written to disk
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._in_file = False
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+        }
+
+    def on_part_begin(self) -> None:
+        self._disposition = b""
+        self._in_file = False
+
+    def on_header_field(self, data: bytes, start: int, end: int) -> None:
+        self._header_name += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int) -> None:
+        self._header_value += data[start:end]
 
-@router.post("/upload")
-async def upload_document(file: UploadFile):
-    if not file.filename or not file.filename.lower().endswith(".pdf"):
-        raise HTTPException(status_code=400, detail="Only PDF files are accepted.")
-
-    pdf_bytes = await file.read()
-    if len(pdf_bytes) == 0:
-        raise HTTPException(status_code=400, detail="Empty file.")
-
-    # If the uploaded PDF matches the demo content, use the rich demo data
-    # (which includes formulas and visual modules that plain parsing can't produce)
-    if _is_demo_pdf(pdf_bytes):
-        demo_manifest = get_manifest("demo-001")
-        if demo_manifest:
-            demo_chunks = get_chunks("demo-001")
-            return {
-                "docId": demo_manifest.docId,
-                "title": demo_manifest.title,
-                "pageCount": len(demo_manifest.pages),
-                "chunkCount": len(demo_chunks),
-            }
+    def on_header_end(self) -> None:
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = self._header_value = b""
 
+    def on_headers_finished(self) -> None:
+        _, options = parse_options_header(self._disposition)
+        if options.get(b"name") != b"file" or b"filename" not in options or self.filename is not None:
+            return
+        self.filename = options[b"filename"].decode("utf-8", "replace")
+        if not self.filename.lower().endswith(".pdf"):
+            raise HTTPException(status_code=400, detail="Only PDF files are accepted.")
+        self._in_file = True
+
+    def on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if not self._in_file:
+            return
+        self.size += end - start
+        if self.size > MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="File too large.")
+        self.pending += data[start:end]
+
+
+async def _spool_upload(request: Request) -> tuple[str, str]:
+    """Stream the PDF of a multipart upload from the request body straight to a
+    temp file. Oversized uploads are rejected by Content-Length before anything
+    is read, and by counted bytes while reading. Returns (filename, path)."""
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES:
+        raise HTTPException(status_code=413, detail="File too large.")
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload.")
+
+    spool = _UploadSpool()
+    parser = MultipartParser(params[b"boundary"], spool.callbacks())
+    tmp = tempfile.NamedTemporaryFile(suffix=".pdf", delete=False)
+    received = 0
     try:
-        from services.document_source import UploadSource
-        source = UploadSource(file.filename, pdf_bytes)
-        result = await source.ingest()
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"PDF parsing failed: {e}")
+        with tmp:
+            async for chunk in request.stream():
+                received += len(chunk)
+                # The file part is capped as it is parsed; this caps everything else
+                if received > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD_BYTES:
+                    raise HTTPException(status_code=413, detail="File too large.")
+                try:
+                    parser.write(chunk)
+                except MultipartParseError:
+                    raise HTTPException(status_code=400, detail="Malformed upload.")
+                if len(spool.pending) >= UPLOAD_WRITE_BYTES:
+                    await run_in_threadpool(tmp.write, bytes(spool.pending))
+                    spool.pending.clear()
+            parser.finalize()
+            if spool.pending:
+                await run_in_threadpool(tmp.write, bytes(spool.pending))
+        if spool.filename is None:
+            raise HTTPException(status_code=400, detail="No file uploaded.")
+        if spool.size == 0:
+            raise HTTPException(status_code=400, detail="Empty file.")
+    except BaseException:
+        os.unlink(tmp.name)
+        raise
+    return spool.filename, tmp.name
+
+
+# The body is parsed by _spool_upload rather than FastAPI, so document it here
+_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "properties": {"file": {"type": "string", "format": "binary"}},
+            "required": ["file"],
+        }}},
+    },
+}
+
+
+@router.post("/upload", openapi_extra=_UPLOAD_OPENAPI)
+async def upload_document(request: Request):
+    # Taking the raw request keeps Starlette from buffering the whole
+    # multipart body before the size limit can be checked
+    filename, pdf_path = await _spool_upload(request)
+    try:
+        # Opened once from disk and shared by every ingest stage
+        try:
+            doc = fitz.open(pdf_path)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Invalid PDF file.")
+
+        try:
+            # If the uploaded PDF matches the demo content, use the rich demo data
+            # (which includes formulas and visual modules that plain parsing can't produce)
+            if _is_demo_pdf(doc):
+                demo_manifest = get_manifest("demo-001")
+                if demo_manifest:
+                    demo_chunks = get_chunks("demo-001")
+                    return {
+                        "docId": demo_manifest.docId,
+                        "title": demo_manifest.title,
+                        "pageCount": len(demo_manifest.pages),
+                        "chunkCount": len(demo_chunks),
+                    }
+
+            try:
+                from services.document_source import UploadSource
+                source = UploadSource(filename, doc)
+                result = await source.ingest()
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"PDF parsing failed: {e}")
+        finally:
+            doc.close()
+    finally:
+        os.unlink(pdf_path)
 
     # Store in memory so subsequent GET calls work
     store_uploaded(
@@ -42,6 +187,7 @@ async def upload_document(file: UploadFile):
         result.chunks,
         result.formulas,
         result.visuals,
+        result.summaries,
     )
 
     return {
@@ -54,32 +200,88 @@ async def upload_document(file: UploadFile):
     }
 
 
-def _is_demo_pdf(pdf_bytes: bytes) -> bool:
+def _is_demo_pdf(doc: fitz.Document) -> bool:
     """Check if uploaded PDF matches demo content by inspecting page 1 text."""
     try:
-        import fitz
-        doc = fitz.open(stream=pdf_bytes, filetype="pdf")
         if len(doc) < 4:
-            doc.close()
             return False
         page1_text = doc[0].get_text().strip()
-        doc.close()
         return "Gradient Descent" in page1_text and "steepest increase" in page1_text
     except Exception:
         return False
 
 
-@router.get("/{doc_id}/manifest")
-async def read_manifest(doc_id: str) -> DocumentManifest:
+# Read endpoints serve bodies serialized once per document (see response_cache)
+
+@router.get("/{doc_id}/manifest", response_model=DocumentManifest)
+async def read_manifest(doc_id: str, request: Request) -> Response:
     manifest = get_manifest(doc_id)
     if not manifest:
         raise HTTPException(status_code=404, detail="Document not found")
-    return manifest
+    return cached_json(request, doc_id, "manifest", lambda: manifest)
 
 
-@router.get("/{doc_id}/chunks")
-async def read_chunks(doc_id: str):
-    chunks = get_chunks(doc_id)
-    if not chunks:
+@router.get("/{doc_id}/chunks", response_model=ChunksResponse)
+async def read_chunks(
+    doc_id: str,
+    request: Request,
+    fromPage: int | None = Query(None, ge=1),
+    toPage: int | None = Query(None, ge=1),
+    cursor: str | None = None,
+    limit: int | None = Query(None, ge=1),
+) -> Response:
+    """All chunks, or a window of them: pages fromPage..toPage, resumed at
+    `cursor` (the previous response's nextCursor), at most `limit` chunks."""
+    if fromPage is None and toPage is None and cursor is None and limit is None:
+        chunks = get_chunks(doc_id)
+        if not chunks:
+            raise HTTPException(status_code=404, detail="Document not found")
+        return cached_json(request, doc_id, "chunks", lambda: {"docId": doc_id, "chunks": chunks})
+
+    if fromPage is not None and toPage is not None and fromPage > toPage:
+        raise HTTPException(status_code=400, detail="fromPage is after toPage.")
+    try:
+        window = get_chunk_window(doc_id, fromPage, toPage, cursor, min(limit or MAX_CHUNK_WINDOW, MAX_CHUNK_WINDOW))
+    except KeyError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    if window is None:
+        raise HTTPException(status_code=404, detail="Document not found")
+    chunks, next_cursor = window
+    return ChunksResponse(docId=doc_id, chunks=chunks, nextCursor=next_cursor)
+
+
+@router.get("/{doc_id}/summary", response_model=SummariesResponse)
+async def read_summary(doc_id: str, request: Request, pageNo: int | None = None) -> Response:
+    summaries = get_summaries(doc_id)
+    if not summaries:
+        raise HTTPException(status_code=404, detail="Summary not found")
+    if pageNo is None:
+        return cached_json(request, doc_id, "summary", lambda: summaries)
+    if not any(p.pageNo == pageNo for p in summaries.pages):
+        return SummariesResponse(docId=doc_id, pages=[], sections=[])
+    return cached_json(request, doc_id, ("summary", pageNo), lambda: SummariesResponse(
+        docId=doc_id,
+        pages=[p for p in summaries.pages if p.pageNo == pageNo],
+        sections=[s for s in summaries.sections if s.startPage <= pageNo <= s.endPage],
+    ))
+
+
+@router.get("/{doc_id}/pages/{page_no}", response_model=PageBundlesResponse)
+async def read_page_bundle(
+    doc_id: str,
+    page_no: int,
+    request: Request,
+    prefetch: int = Query(0, ge=0),
+) -> Response:
+    """Chunks, formulas, visuals and summary of a page and the `prefetch`
+    pages after it, in one response."""
+    manifest = get_manifest(doc_id)
+    if not manifest:
         raise HTTPException(status_code=404, detail="Document not found")
-    return {"docId": doc_id, "chunks": chunks}
+    if not any(p.pageNo == page_no for p in manifest.pages):
+        raise HTTPException(status_code=404, detail="Page not found")
+    prefetch = min(prefetch, MAX_PAGE_PREFETCH)
+    return cached_json(request, doc_id, ("pages", page_no, prefetch), lambda: PageBundlesResponse(
+        docId=doc_id,
+        pages=get_page_bundles(doc_id, page_no, page_no + prefetch) or [],
+    ))
@@ -0,0 +1,16 @@
+"""
+GET /api/health — service status, with the state of each circuit breaker.
+"""
+
+from fastapi import APIRouter
+
+from services.circuit_breaker import CLOSED, breaker_report
+
+router = APIRouter(prefix="/api", tags=["health"])
+
+
+@router.get("/health")
+async def health() -> dict:
+    circuits = breaker_report()
+    degraded = any(c["state"] != CLOSED for c in circuits.values())
+    return {"status": "degraded" if degraded else "ok", "circuits": circuits}
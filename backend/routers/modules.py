@@ -1,25 +1,38 @@
 import logging
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 
 from models import FormulaExplainRequest, FormulaExplainResponse
-from services.demo_store import get_formulas, get_visuals
+from services.ai_provider import get_ai_provider
+from services.deadline import race_with_fallback
+from services.demo_store import get_formulas, get_manifest, get_visuals
+from services.response_cache import cached_json
+from services.usage import set_document
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/modules", tags=["modules"])
 
 
+def _cacheable(doc_id: str, page_no: int | None) -> bool:
+    """Only known documents and pages get cached bodies, so arbitrary
+    query values can't grow the cache."""
+    manifest = get_manifest(doc_id)
+    return manifest is not None and (page_no is None or any(p.pageNo == page_no for p in manifest.pages))
+
+
 @router.get("/formulas")
-async def read_formulas(docId: str, pageNo: int | None = None):
-    formulas = get_formulas(docId, pageNo)
-    return {"formulas": formulas}
+async def read_formulas(request: Request, docId: str, pageNo: int | None = None):
+    if not _cacheable(docId, pageNo):
+        return {"formulas": get_formulas(docId, pageNo)}
+    return cached_json(request, docId, ("formulas", pageNo), lambda: {"formulas": get_formulas(docId, pageNo)})
 
 
 @router.get("/visuals")
-async def read_visuals(docId: str, pageNo: int | None = None):
-    visuals = get_visuals(docId, pageNo)
-    return {"visuals": visuals}
+async def read_visuals(request: Request, docId: str, pageNo: int | None = None):
+    if not _cacheable(docId, pageNo):
+        return {"visuals": get_visuals(docId, pageNo)}
+    return cached_json(request, docId, ("visuals", pageNo), lambda: {"visuals": get_visuals(docId, pageNo)})
 
 
 def _deterministic_explain(formula: dict, section: str) -> str:
@@ -38,6 +51,7 @@ def _deterministic_explain(formula: dict, section: str) -> str:
 
 @router.post("/formulas/explain")
 async def explain_formula(req: FormulaExplainRequest) -> FormulaExplainResponse:
+    set_document(req.docId)
     formulas = get_formulas(req.docId)
     formula = next((f for f in formulas if f.formulaId == req.formulaId), None)
     if not formula:
@@ -46,16 +60,14 @@ async def explain_formula(req: FormulaExplainRequest) -> FormulaExplainResponse:
     # Convert to dict for AI provider and fallback
     formula_dict = formula.model_dump()
 
-    # Try AI provider if available
-    try:
-        from services.ai_provider import get_ai_provider
-        ai = get_ai_provider()
-        if ai is not None:
-            result = await ai.generate_formula_explanation(formula_dict, req.section)
-            return FormulaExplainResponse(text=result)
-    except ImportError:
-        pass
-    except Exception as e:
-        logger.warning("AI formula explain failed, using fallback: %s", e)
-
-    return FormulaExplainResponse(text=_deterministic_explain(formula_dict, req.section))
+    def fallback() -> FormulaExplainResponse:
+        return FormulaExplainResponse(text=_deterministic_explain(formula_dict, req.section))
+
+    ai = get_ai_provider()
+
+    async def ai_call() -> FormulaExplainResponse:
+        return FormulaExplainResponse(text=await ai.generate_formula_explanation(formula_dict, req.section))
+
+    # Race the AI explanation against the template one, bounded by the deadline
+    key = (req.docId, req.formulaId, req.section)
+    return await race_with_fallback("formula_explain", key, ai_call if ai else None, fallback)
@@ -0,0 +1,23 @@
+"""
+GET /api/usage — LLM token and cost totals per document, session and endpoint.
+GET /api/usage/prompts — per prompt template: renders, prompt tokens, cache
+hits and JSON parse outcomes; per AIProvider method: fallback rate.
+"""
+
+from fastapi import APIRouter
+
+from services.ai_provider import ai_call_report
+from services.prompts import prompt_report
+from services.usage import usage_report
+
+router = APIRouter(prefix="/api", tags=["usage"])
+
+
+@router.get("/usage")
+async def read_usage(docId: str | None = None) -> dict:
+    return usage_report(docId)
+
+
+@router.get("/usage/prompts")
+async def read_prompt_usage() -> dict:
+    return {"templates": prompt_report(), "methods": ai_call_report()}
@@ -11,8 +11,10 @@ from fastapi import APIRouter, File, Form, UploadFile
 
 from models import VoiceResponse, VoiceState
 from services.demo_store import get_chunks
+from services.metrics import VOICE_STAGE_SECONDS
 from services.orchestrator import process as orchestrator_process
 from services.transcriber import transcribe_audio
+from services.usage import set_document
 
 logger = logging.getLogger(__name__)
 
@@ -35,7 +37,7 @@ def _build_context(app_state: VoiceState) -> dict:
     # Nearby chunks for Q&A context (serialize to dicts)
     nearby = page_chunks if page_chunks else chunks[:5]
     nearby_dicts = [
-        {"chunkId": c.chunkId, "pageNo": c.pageNo, "text": c.text, "order": c.order}
+        {"chunkId": c.chunkId, "pageNo": c.pageNo, "text": c.text, "order": c.order, "type": c.type}
         for c in nearby
     ]
 
@@ -67,11 +69,20 @@ async def voice(
     """Process a voice command: transcribe audio, then run orchestrator."""
     # Parse app state from JSON string
     app_state = VoiceState(**json.loads(state))
+    set_document(app_state.docId)
 
     # Transcribe audio via Deepgram
     audio_bytes = await audio.read()
     content_type = audio.content_type or "audio/webm"
-    transcript = await transcribe_audio(audio_bytes, content_type)
+    try:
+        with VOICE_STAGE_SECONDS.time(span="transcribe", stage="transcribe"):
+            transcript = await transcribe_audio(audio_bytes, content_type)
+    except Exception as e:
+        logger.warning("Transcription failed: %s", e)
+        return VoiceResponse(
+            transcript="",
+            speech="Voice recognition is unavailable right now. Please use the buttons.",
+        )
 
     if not transcript.strip():
         return VoiceResponse(
@@ -80,8 +91,10 @@ async def voice(
         )
 
     # Build context and run orchestrator
-    context = _build_context(app_state)
-    result = await orchestrator_process(transcript, app_state, context)
+    with VOICE_STAGE_SECONDS.time(span="context", stage="context"):
+        context = _build_context(app_state)
+    with VOICE_STAGE_SECONDS.time(span="orchestrator", stage="orchestrator"):
+        result = await orchestrator_process(transcript, app_state, context)
 
     return VoiceResponse(
         transcript=transcript,
@@ -0,0 +1,180 @@
+"""
+Record/replay wrapper for the chat models behind the AI provider and the
+orchestrator agent.
+
+With AI_CASSETTE_MODE=record every model call goes to OpenAI as usual and
+the request key, response message and latency are appended to a JSONL
+cassette. With AI_CASSETTE_MODE=replay no key or network is needed: calls
+are answered from the cassette after the recorded latency, scaled by
+AI_CASSETTE_LATENCY_SCALE (0 replays instantly). A request that was never
+recorded raises CassetteMissError, which callers treat like any other AI
+failure and fall back to templates.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Any, Sequence
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CASSETTE_PATH = Path(__file__).resolve().parent.parent / "cassettes" / "ai.jsonl"
+
+# Loaded cassettes, keyed by path, shared by every wrapped model
+_cassettes: dict[str, "Cassette"] = {}
+
+
+class CassetteMissError(LookupError):
+    """Replay found no recorded response for a request."""
+
+
+def cassette_mode() -> str:
+    """"record", "replay" or "" (off), from AI_CASSETTE_MODE."""
+    mode = os.getenv("AI_CASSETTE_MODE", "").strip().lower()
+    if mode not in ("", "record", "replay"):
+        logger.warning("Unknown AI_CASSETTE_MODE %r, ignoring", mode)
+        return ""
+    return mode
+
+
+def _latency_scale() -> float:
+    return float(os.getenv("AI_CASSETTE_LATENCY_SCALE", "1.0"))
+
+
+def _request_key(model: str, messages: list[BaseMessage], stop: list[str] | None, kwargs: dict[str, Any]) -> str:
+    """Stable hash of what the model was asked (tool-call ids are left out:
+    they are random on record and come from the cassette on replay)."""
+    payload = {
+        "model": model,
+        "messages": [
+            {
+                "type": m.type,
+                "content": m.content,
+                "tool_calls": [(c["name"], c["args"]) for c in getattr(m, "tool_calls", None) or []],
+            }
+            for m in messages
+        ],
+        "tools": sorted(t.get("function", {}).get("name", "") for t in kwargs.get("tools", [])),
+        "stop": stop,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class Cassette:
+    """Recorded interactions in a JSONL file, one per line."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._entries: dict[str, list[dict[str, Any]]] = {}
+        self._cursor: dict[str, int] = {}
+        if path.exists():
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._entries.setdefault(entry["key"], []).append(entry)
+            logger.info("Loaded %d recorded AI calls from %s", sum(map(len, self._entries.values())), path)
+
+    def record(self, key: str, message: BaseMessage, latency_ms: float) -> None:
+        entry = {"key": key, "latency_ms": round(latency_ms, 1), "message": message_to_dict(message)}
+        self._entries.setdefault(key, []).append(entry)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def play(self, key: str) -> tuple[BaseMessage, float]:
+        """Next recorded response for a key; repeated requests cycle through
+        their recordings in order."""
+        entries = self._entries.get(key)
+        if not entries:
+            raise CassetteMissError(f"No recorded AI response for request {key[:12]} in {self.path}")
+        idx = self._cursor.get(key, 0)
+        self._cursor[key] = idx + 1
+        entry = entries[idx % len(entries)]
+        return messages_from_dict([entry["message"]])[0], entry["latency_ms"]
+
+
+def get_cassette(path: Path | str | None = None) -> Cassette:
+    path = Path(path or os.getenv("AI_CASSETTE_PATH") or DEFAULT_CASSETTE_PATH)
+    cassette = _cassettes.get(str(path))
+    if cassette is None:
+        cassette = _cassettes[str(path)] = Cassette(path)
+    return cassette
+
+
+class CassetteChatModel(BaseChatModel):
+    """Chat model that records a real model's calls or replays them."""
+
+    name: str
+    mode: str
+    inner: BaseChatModel | None = None
+    cassette_path: str = ""
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+    def bind_tools(self, tools: Sequence[Any], *, tool_choice: str | None = None, **kwargs: Any):
+        from langchain_core.utils.function_calling import convert_to_openai_tool
+
+        if tool_choice is not None:
+            kwargs["tool_choice"] = tool_choice
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _replay(self, key: str) -> tuple[ChatResult, float]:
+        message, latency_ms = get_cassette(self.cassette_path or None).play(key)
+        return ChatResult(generations=[ChatGeneration(message=message)]), latency_ms * _latency_scale() / 1000
+
+    def _save(self, key: str, result: ChatResult, started: float) -> None:
+        latency_ms = (time.perf_counter() - started) * 1000
+        get_cassette(self.cassette_path or None).record(key, result.generations[0].message, latency_ms)
+
+    def _generate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        key = _request_key(self.name, messages, stop, kwargs)
+        if self.mode == "replay":
+            result, delay = self._replay(key)
+            time.sleep(delay)
+            return result
+        started = time.perf_counter()
+        result = self.inner._generate(messages, stop=stop, **kwargs)
+        self._save(key, result, started)
+        return result
+
+    async def _agenerate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        key = _request_key(self.name, messages, stop, kwargs)
+        if self.mode == "replay":
+            result, delay = self._replay(key)
+            await asyncio.sleep(delay)
+            return result
+        started = time.perf_counter()
+        result = await self.inner._agenerate(messages, stop=stop, **kwargs)
+        self._save(key, result, started)
+        return result
+
+
+def wrap_chat_model(llm: BaseChatModel | None, name: str) -> BaseChatModel | None:
+    """Wrap a chat model for recording or replay when AI_CASSETTE_MODE is set.
+
+    `name` separates the callers sharing a cassette ("provider", "orchestrator").
+    In replay mode `llm` may be None, since no key is needed.
+    """
+    mode = cassette_mode()
+    if not mode:
+        return llm
+    if mode == "record" and llm is None:
+        logger.warning("AI_CASSETTE_MODE=record needs OPENAI_API_KEY; not recording")
+        return None
+    logger.info("AI cassette %s for %s at %s", mode, name, get_cassette().path)
+    return CassetteChatModel(name=name, mode=mode, inner=llm, cassette_path=str(get_cassette().path))
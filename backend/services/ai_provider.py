@@ -6,15 +6,33 @@ Falls back gracefully when API key is missing or calls fail.
 
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
 import logging
 import os
+import re
 from typing import Any
 
+from services import prompts
+from services.circuit_breaker import CircuitBreaker
+from services.json_repair import JSONRepairError, parse_json_lenient
+from services.metrics import AI_CALL_ERRORS, AI_CALL_SECONDS, AI_COALESCED, AI_PARSE_RESULTS
+from services.usage import BudgetExhaustedError, current_budget, record_coalesced, record_usage
+
 logger = logging.getLogger(__name__)
 
+# Calls slower than this count as failures toward opening the circuit
+AI_SLOW_CALL_MS = int(os.getenv("AI_SLOW_CALL_MS", "20000"))
+
 _provider: "AIProvider | None" = None
 
+# Shared by the provider and the orchestrator agent: both call OpenAI
+AI_BREAKER = CircuitBreaker("openai", slow_call_ms=AI_SLOW_CALL_MS)
+
+# Model calls in progress, keyed by prompt hash, for single-flight sharing
+_in_flight: dict[str, asyncio.Task] = {}
+
 
 def get_ai_provider() -> "AIProvider | None":
     return _provider
@@ -22,8 +40,11 @@ def get_ai_provider() -> "AIProvider | None":
 
 def init_ai_provider() -> None:
     global _provider
+    from services.ai_cassette import cassette_mode
+
     api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
+    # Replaying a recorded cassette needs no key
+    if not api_key and cassette_mode() != "replay":
         logger.warning("OPENAI_API_KEY not set — AI features will use template fallbacks")
         return
     try:
@@ -34,37 +55,123 @@ def init_ai_provider() -> None:
         _provider = None
 
 
-def _parse_json(text: str) -> dict[str, Any]:
-    """Extract JSON from LLM response, handling markdown code fences."""
-    cleaned = text.strip()
-    if cleaned.startswith("```"):
-        # Remove code fences
-        lines = cleaned.split("\n")
-        lines = [l for l in lines if not l.strip().startswith("```")]
-        cleaned = "\n".join(lines).strip()
-    return json.loads(cleaned)
+def _check_budget() -> None:
+    budget = current_budget()
+    if budget is not None and budget.exhausted():
+        raise BudgetExhaustedError("Ingest token budget spent")
+
+
+def _parse_json(template: prompts.PromptTemplate, text: str) -> dict[str, Any]:
+    """Parse a JSON reply, repairing it if needed, and count the outcome."""
+    return _parse_json_repaired(template, text)[0]
+
+
+def _parse_json_repaired(template: prompts.PromptTemplate, text: str) -> tuple[dict[str, Any], bool]:
+    """_parse_json, also returning whether the reply needed repair."""
+    try:
+        parsed, repaired = parse_json_lenient(text)
+        if not isinstance(parsed, dict):
+            raise JSONRepairError(f"Expected a JSON object, got {type(parsed).__name__}")
+    except JSONRepairError:
+        _count_parse(template, "failed")
+        raise
+    _count_parse(template, "repaired" if repaired else "ok")
+    if repaired:
+        logger.info("Repaired malformed JSON reply for %s", template.name)
+    return parsed, repaired
+
+
+def _count_parse(template: prompts.PromptTemplate, outcome: str) -> None:
+    template.record_parse(outcome)
+    AI_PARSE_RESULTS.inc(template=template.name, result=outcome)
+
+
+def ai_call_report() -> dict[str, dict[str, Any]]:
+    """Calls and failures per AIProvider method; every failure is a
+    template fallback in the caller."""
+    report = {}
+    for name in sorted(vars(AIProvider)):
+        if name.startswith("_"):
+            continue
+        calls = AI_CALL_SECONDS.count(method=name)
+        errors = int(AI_CALL_ERRORS.value(method=name))
+        report[name] = {
+            "calls": calls,
+            "fallbacks": errors,
+            "fallbackRate": round(errors / calls, 3) if calls else None,
+        }
+    return report
+
+
+def _flight_key(template: prompts.PromptTemplate, messages: list[Any], kwargs: dict[str, Any]) -> str:
+    """Hash of the prompt, with whitespace normalized."""
+    contents = [" ".join(m.content.split()) if isinstance(m.content, str) else m.content for m in messages]
+    payload = json.dumps([template.name, contents, kwargs], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _land(key: str, task: asyncio.Task) -> None:
+    _in_flight.pop(key, None)
+    if not task.cancelled():
+        task.exception()  # retrieved here, in case every caller went away
+
+
+def _format_kwargs(template: prompts.PromptTemplate) -> dict[str, Any]:
+    response_format = template.response_format()
+    return {"response_format": response_format} if response_format else {}
 
 
 class AIProvider:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str | None):
         from langchain_openai import ChatOpenAI
 
+        from services.ai_cassette import wrap_chat_model
+
         model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-        self.llm = ChatOpenAI(
+        llm = ChatOpenAI(
             model=model,
             api_key=api_key,
             temperature=0.3,
             max_retries=1,
-        )
+        ) if api_key else None
+        self.llm = wrap_chat_model(llm, "provider")
+        if self.llm is None:
+            raise RuntimeError("No chat model available")
         logger.info("Using model: %s", model)
 
-    async def _invoke(self, prompt: str) -> str:
-        """Invoke the LLM and return raw text."""
-        result = await self.llm.ainvoke(prompt)
-        return str(result.content)
+    async def _invoke(self, template: prompts.PromptTemplate, **values: Any) -> str:
+        """Invoke the LLM with a registered prompt template and return raw text."""
+        return await self._call(template, template.render(**values))
+
+    async def _call(self, template: prompts.PromptTemplate, messages: list[Any], vision: bool = False) -> str:
+        """One model call. Concurrent calls with the same prompt share a
+        single in-flight request, run as its own task so a cancelled caller
+        does not cancel it for the others. Each caller is checked against its
+        own ingest budget; the shared call's usage goes to the caller that
+        started it, and joiners record a coalesced call in their own scope."""
+        _check_budget()
+        kwargs = _format_kwargs(template)
+        key = _flight_key(template, messages, kwargs)
+        task = _in_flight.get(key)
+        if task is not None:
+            AI_COALESCED.inc(template=template.name)
+            record_coalesced()
+            return await asyncio.shield(task)
+
+        async def call() -> str:
+            with AI_BREAKER.guard():
+                result = await self.llm.ainvoke(messages, **kwargs)
+            record_usage(result, "provider", vision=vision)
+            template.record_response(result)
+            return str(result.content)
+
+        task = _in_flight[key] = asyncio.ensure_future(call())
+        task.add_done_callback(lambda t: _land(key, t))
+        return await asyncio.shield(task)
 
     # --- Formula Explanation ---
 
+    @AI_CALL_SECONDS.timed(AI_CALL_ERRORS, span="llm.generate_formula_explanation", method="generate_formula_explanation")
     async def generate_formula_explanation(
         self, formula: dict[str, Any], section: str
     ) -> str:
@@ -73,21 +180,15 @@ class AIProvider:
         symbols_str = ", ".join(
             f"{s['sym']} ({s['meaning']})" for s in formula.get("symbols", [])
         )
-        prompt = f"""You are an accessibility-first tutor. Be concise, grounded in provided context, and never invent document content. If context is insufficient, say what's missing and ask one clarifying question.
-
-The student is learning about this formula:
-Expression: {formula['expression']}
-Purpose: {formula['purpose']}
-Symbols: {symbols_str}
-Example: {formula.get('example', 'N/A')}
-
-Explain the "{section}" aspect of this formula in 2-3 clear, spoken sentences.
-Sections: purpose, symbol table, tiny worked example, or intuition (1-2 sentences).
-Do NOT introduce any symbols or variables not listed above.
-Respond with ONLY valid JSON: {{"text": "your explanation"}}"""
-
-        raw = await self._invoke(prompt)
-        parsed = _parse_json(raw)
+        raw = await self._invoke(
+            prompts.FORMULA_EXPLANATION,
+            expression=formula["expression"],
+            purpose=formula["purpose"],
+            symbols=symbols_str,
+            example=formula.get("example", "N/A"),
+            section=section,
+        )
+        parsed = _parse_json(prompts.FORMULA_EXPLANATION, raw)
         text = parsed["text"]
 
         # Runtime guard: check for hallucinated symbols
@@ -108,43 +209,32 @@ Respond with ONLY valid JSON: {{"text": "your explanation"}}"""
 
     # --- Grounded Q&A ---
 
+    @AI_CALL_SECONDS.timed(AI_CALL_ERRORS, span="llm.generate_grounded_qa", method="generate_grounded_qa")
     async def generate_grounded_qa(
         self, question: str, chunks: list[dict[str, Any]]
     ) -> dict[str, Any]:
         """Generate a grounded answer with citations.
-        Returns dict with 'answer', 'citations', 'clarifyingQuestion'."""
+        Returns dict with 'answer', 'citations', 'clarifyingQuestion' and
+        'repaired' (the reply was malformed JSON; serve it, but don't cache it)."""
         context = "\n\n".join(
             f"[{c['chunkId']}] (page {c['pageNo']}): {c['text']}"
             for c in chunks
         )
         chunk_ids = [c["chunkId"] for c in chunks]
 
-        prompt = f"""You are an accessibility-first tutor. Be concise, grounded in provided context, and never invent document content. If context is insufficient, say what's missing and ask one clarifying question.
-
-Answer the question using ONLY the provided context. Return citations with the chunkIds used.
-
-Context:
-{context}
-
-Question: {question}
-
-Rules:
-- Cite specific chunk IDs in your answer
-- If the context doesn't contain enough information, set clarifyingQuestion to ask for more detail
-- Keep the answer concise (2-3 sentences for speaking aloud)
-- Only reference chunkIds from this list: {chunk_ids}
-
-Respond with ONLY valid JSON:
-{{"answer": "your answer", "citations": [{{"chunkId": "id", "pageNo": 1}}], "clarifyingQuestion": null}}"""
+        raw = await self._invoke(prompts.GROUNDED_QA, context=context, chunk_ids=chunk_ids, question=question)
+        parsed, repaired = _parse_json_repaired(prompts.GROUNDED_QA, raw)
+        parsed["repaired"] = repaired
 
-        raw = await self._invoke(prompt)
-        parsed = _parse_json(raw)
-
-        # Validate citations reference actual chunks
-        valid_ids = set(chunk_ids)
+        # Validate citations reference actual chunks, taking pages from the chunks
+        by_id = {c["chunkId"]: c for c in chunks}
+        cited = [c.get("chunkId") for c in parsed.get("citations") or [] if isinstance(c, dict)]
+        if not any(cid in by_id for cid in cited) and parsed.get("answer"):
+            # The answer names chunk ids inline even when the citation list is empty or wrong
+            cited = [cid for cid in chunk_ids if re.search(rf"(?<![\w-]){re.escape(cid)}(?![\w-])", parsed["answer"])]
         parsed["citations"] = [
-            c for c in parsed.get("citations", [])
-            if c.get("chunkId") in valid_ids
+            {"chunkId": cid, "pageNo": by_id[cid]["pageNo"]}
+            for cid in dict.fromkeys(cited) if cid in by_id
         ]
 
         # Validation: empty citations + no clarifying question = invalid
@@ -153,8 +243,43 @@ Respond with ONLY valid JSON:
 
         return parsed
 
+    # --- Conversation Summary ---
+
+    @AI_CALL_SECONDS.timed(AI_CALL_ERRORS, span="llm.summarize_conversation", method="summarize_conversation")
+    async def summarize_conversation(
+        self, summary: str, turns: list[dict[str, str]], max_words: int = 120
+    ) -> str:
+        """Fold older Q&A turns into a running conversation summary.
+        Returns the updated summary text. Raises on failure."""
+        turns_text = "\n".join(
+            f"Student: {t['q']}\nTutor: {t['a']}" for t in turns
+        )
+
+        raw = await self._invoke(
+            prompts.CONVERSATION_SUMMARY, summary=summary or "(empty)", turns=turns_text, max_words=max_words
+        )
+        parsed = _parse_json(prompts.CONVERSATION_SUMMARY, raw)
+        text = parsed.get("summary", "").strip()
+        if not text:
+            raise ValueError("AI returned empty conversation summary")
+        return text
+
+    # --- Summaries ---
+
+    @AI_CALL_SECONDS.timed(AI_CALL_ERRORS, span="llm.summarize_text", method="summarize_text")
+    async def summarize_text(self, text: str, scope: str = "page") -> str:
+        """Summarize a page (or a section, from its page summaries) for listening.
+        Returns the summary text. Raises on failure."""
+        raw = await self._invoke(prompts.SUMMARIZE_TEXT, scope=scope, text=text)
+        parsed = _parse_json(prompts.SUMMARIZE_TEXT, raw)
+        summary = parsed.get("summary", "").strip()
+        if not summary:
+            raise ValueError("AI returned empty summary")
+        return summary
+
     # --- Explore Reflection ---
 
+    @AI_CALL_SECONDS.timed(AI_CALL_ERRORS, span="llm.generate_explore_reflection", method="generate_explore_reflection")
     async def generate_explore_reflection(
         self, visual_module: dict[str, Any], trace: dict[str, Any]
     ) -> dict[str, str]:
@@ -164,28 +289,16 @@ Respond with ONLY valid JSON:
         marked = trace.get("marked", [])
         duration = trace.get("durationSec", 0)
 
-        prompt = f"""You are an accessibility-first tutor. Be concise, grounded in provided context, and never invent document content. If context is insufficient, say what's missing and ask one clarifying question.
-
-Reflect on the student's exploration of a visual.
-
-Visual: {visual_module.get('title', 'Unknown')}
-Type: {visual_module.get('type', 'unknown')}
-Description: {visual_module.get('description', '')}
-Regions visited: {', '.join(visited) if visited else 'none'}
-Points marked: {len(marked)}
-Duration: {duration:.0f} seconds
-
-Write a brief reflection (max 3-4 sentences total across all fields):
-- reflection: 2 sentences on what the student explored
-- takeaway: 1 sentence key insight
-- nextSuggestion: 1 sentence next suggested action
-Avoid excessive coordinates; focus on meaning.
-
-Respond with ONLY valid JSON:
-{{"reflection": "...", "takeaway": "...", "nextSuggestion": "..."}}"""
-
-        raw = await self._invoke(prompt)
-        parsed = _parse_json(raw)
+        raw = await self._invoke(
+            prompts.EXPLORE_REFLECTION,
+            title=visual_module.get("title", "Unknown"),
+            type=visual_module.get("type", "unknown"),
+            description=visual_module.get("description", ""),
+            visited=", ".join(visited) if visited else "none",
+            marked=len(marked),
+            duration=duration,
+        )
+        parsed = _parse_json(prompts.EXPLORE_REFLECTION, raw)
 
         # Validate required fields
         for field in ("reflection", "takeaway", "nextSuggestion"):
@@ -196,134 +309,106 @@ Respond with ONLY valid JSON:
 
     # --- Module Extraction (for any PDF) ---
 
-    async def _invoke_with_image(self, prompt: str, image_base64: str) -> str:
-        """Invoke the LLM with a text prompt and a base64-encoded image."""
-        from langchain_core.messages import HumanMessage
+    async def _invoke_with_image(
+        self, template: prompts.PromptTemplate, image_base64: str, mime_type: str = "image/png", **values: Any
+    ) -> str:
+        """Invoke the LLM with a registered prompt template and a base64-encoded
+        image, appended after the variable text."""
+        from langchain_core.messages import HumanMessage, SystemMessage
 
         message = HumanMessage(
             content=[
-                {"type": "text", "text": prompt},
+                {"type": "text", "text": template.fill(**values)},
                 {
                     "type": "image_url",
                     "image_url": {
-                        "url": f"data:image/png;base64,{image_base64}",
+                        "url": f"data:{mime_type};base64,{image_base64}",
                     },
                 },
             ]
         )
-        result = await self.llm.ainvoke([message])
-        return str(result.content)
+        return await self._call(template, [SystemMessage(content=template.system_prompt), message], vision=True)
 
+    @AI_CALL_SECONDS.timed(AI_CALL_ERRORS, span="llm.extract_formulas_from_text", method="extract_formulas_from_text")
     async def extract_formulas_from_text(
         self, page_no: int, page_text: str
     ) -> list[dict[str, Any]]:
         """Extract formula modules from a page's text content."""
-        prompt = f"""You are an accessibility-first tutor analyzing lecture notes.
-
-Analyze the following text from page {page_no} of a lecture PDF. Identify ALL mathematical formulas, equations, or mathematical expressions present.
-
-For each formula found, produce a structured JSON object with:
-- expression: the formula written in plain text (e.g., "E = mc^2", "softmax(z_i) = exp(z_i) / sum_j exp(z_j)")
-- purpose: a one-sentence description of what this formula does or represents
-- symbols: an array of {{"sym": "...", "meaning": "..."}} for each variable/symbol
-- example: a brief worked example with concrete numbers (1-2 sentences)
-
-Page text:
----
-{page_text}
----
-
-Rules:
-- Only extract actual mathematical formulas/equations, not prose descriptions.
-- If no formulas are found, return an empty array.
-- Use plain ASCII text for the expression field.
-- Keep purpose to one sentence and example brief.
-
-Respond with ONLY valid JSON:
-{{"formulas": [...]}}"""
-
-        raw = await self._invoke(prompt)
-        parsed = _parse_json(raw)
+        raw = await self._invoke(prompts.EXTRACT_FORMULAS, page_no=page_no, page_text=page_text)
+        parsed = _parse_json(prompts.EXTRACT_FORMULAS, raw)
         return parsed.get("formulas", [])
 
+    @AI_CALL_SECONDS.timed(AI_CALL_ERRORS, span="llm.explain_formulas", method="explain_formulas")
+    async def explain_formulas(
+        self, page_no: int, expressions: list[str], context: str = ""
+    ) -> list[dict[str, Any]]:
+        """Write purpose, symbols and example for formula expressions already
+        extracted from the page layout. Returns one dict per expression, in order.
+
+        Entries are matched to expressions by the index the model echoes back;
+        a reply that doesn't cover each expression exactly once raises ValueError.
+        """
+        listed = "\n".join(f"{i + 1}. {e}" for i, e in enumerate(expressions))
+        raw = await self._invoke(prompts.EXPLAIN_FORMULAS, page_no=page_no, listed=listed, context=context[:300])
+        parsed = _parse_json(prompts.EXPLAIN_FORMULAS, raw)
+        notes = [n for n in parsed.get("formulas", []) if isinstance(n, dict)]
+        by_index = {n.get("index"): n for n in notes}
+        if len(notes) != len(expressions) or set(by_index) != set(range(1, len(expressions) + 1)):
+            raise ValueError(
+                f"explanations for {sorted(by_index, key=str)} do not match formulas 1..{len(expressions)}"
+            )
+        return [by_index[i + 1] for i in range(len(expressions))]
+
+    @AI_CALL_SECONDS.timed(AI_CALL_ERRORS, span="llm.analyze_page_image", method="analyze_page_image")
     async def analyze_page_image(
-        self, page_no: int, page_text: str, image_base64: str
+        self,
+        page_no: int,
+        page_text: str,
+        image_base64: str,
+        mime_type: str = "image/png",
     ) -> list[dict[str, Any]]:
-        """Analyze a page image to detect and describe visual elements."""
-        prompt = f"""You are an accessibility-first tutor analyzing a lecture slide/page image.
-
-Look at this image from page {page_no} of a lecture PDF. The text on this page is:
----
-{page_text[:500]}
----
-
-Identify any visual elements: graphs, charts, diagrams, flowcharts, or pipelines.
-For each visual found, determine its type and produce structured data.
-
-TYPE "line_graph" — for line charts, curves, scatter plots with trends:
-{{
-  "type": "line_graph",
-  "title": "descriptive title",
-  "description": "1-2 sentence description",
-  "data": {{
-    "xMin": <number>, "xMax": <number>,
-    "xLabel": "axis label", "yLabel": "axis label",
-    "points": [[x1,y1], [x2,y2], ...],
-    "features": {{
-      "min": [{{"x": <number>, "y": <number>}}],
-      "peak": [{{"x": <number>, "y": <number>}}],
-      "inflection": [{{"x": <number>, "y": <number>}}]
-    }}
-  }}
-}}
-For points: provide 15-30 representative [x,y] pairs capturing the curve shape.
-For features: identify min, max/peak, and inflection points. Use empty arrays if N/A.
-
-TYPE "flowchart" — for flowcharts, pipelines, process diagrams, block diagrams:
-{{
-  "type": "flowchart",
-  "title": "descriptive title",
-  "description": "1-2 sentence description",
-  "data": {{
-    "nodes": [
-      {{"id": "n1", "label": "short label", "x": 0.15, "y": 0.5, "r": 0.08, "desc": "1-sentence description"}},
-      ...
-    ],
-    "edges": [["n1", "n2"], ...],
-    "keyNodes": ["n1", ...]
-  }}
-}}
-For nodes: x and y are normalized 0.0-1.0 coordinates. r is radius (use 0.08). Identify 1-2 key nodes.
-
-Rules:
-- Only identify clear visual elements, not decorative images or logos.
-- If no visuals found, return an empty array.
-- Only use types "line_graph" or "flowchart". Skip anything else.
-- For line graphs, estimate data points from the visual as accurately as possible.
-- For flowcharts, capture all visible nodes and connections.
-
-Respond with ONLY valid JSON:
-{{"visuals": [...]}}"""
-
-        raw = await self._invoke_with_image(prompt, image_base64)
-        parsed = _parse_json(raw)
+        """Analyze a page image (or a crop of its figure region) to detect and describe visual elements."""
+        raw = await self._invoke_with_image(
+            prompts.ANALYZE_PAGE_IMAGE, image_base64, mime_type, page_no=page_no, page_text=page_text[:500]
+        )
+        parsed = _parse_json(prompts.ANALYZE_PAGE_IMAGE, raw)
         return parsed.get("visuals", [])
 
+    @AI_CALL_SECONDS.timed(AI_CALL_ERRORS, span="llm.describe_line_graph", method="describe_line_graph")
+    async def describe_line_graph(
+        self, page_no: int, page_text: str, data: dict[str, Any]
+    ) -> dict[str, str]:
+        """Title and describe a line graph whose data was extracted from the PDF.
+        Returns dict with 'title', 'description' and any missing axis labels."""
+        points = data.get("points", [])
+        step = max(1, len(points) // 12)
+        raw = await self._invoke(
+            prompts.DESCRIBE_LINE_GRAPH,
+            page_no=page_no,
+            page_text=page_text[:500],
+            x_label=data.get("xLabel", ""),
+            x_min=data.get("xMin"),
+            x_max=data.get("xMax"),
+            x_scale=data.get("xScale", "linear"),
+            y_label=data.get("yLabel", ""),
+            y_min=data.get("yMin"),
+            y_max=data.get("yMax"),
+            y_scale=data.get("yScale", "linear"),
+            points=points[::step],
+            features=json.dumps(data.get("features", {})),
+        )
+        return _parse_json(prompts.DESCRIBE_LINE_GRAPH, raw)
+
     # --- Free-form Chat ---
 
+    @AI_CALL_SECONDS.timed(AI_CALL_ERRORS, span="llm.chat", method="chat")
     async def chat(self, message: str, context: str = "") -> str:
         """Handle a free-form conversational message.
         Returns a spoken reply string."""
-        prompt = f"""You are an accessibility-first tutor. Be concise, grounded in provided context, and never invent document content. If context is insufficient, say what's missing and ask one clarifying question.
-
-The student is using a voice-controlled reading app.
-{f"Current reading context: {context}" if context else ""}
-
-The student said: "{message}"
-
-Reply in 1-2 short, spoken sentences. Be helpful and conversational.
-If you're not sure what they need, suggest saying "Help" for available commands."""
-
-        raw = await self._invoke(prompt)
+        raw = await self._invoke(
+            prompts.CHAT,
+            context_line=f"Current reading context: {context}\n\n" if context else "",
+            message=message,
+        )
         # Chat returns plain text, not JSON
         return raw.strip()
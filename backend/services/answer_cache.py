@@ -0,0 +1,97 @@
+"""
+Per-document cache of AI answers to grounded questions, shared by all students.
+
+An answer is keyed by the normalized question and the set of chunk ids it
+was grounded in. A question whose retrieval picks the same chunks reuses a
+cached answer when its content words are the same, or nearly the same:
+Jaccard similarity of the word sets at least QA_CACHE_SIMILARITY. So "what
+does softmax do" also finds "What does the softmax do?"; question words
+(what, why, how) count as content, since they change the answer. Answers
+keep the citations validated when they were generated. A document's
+entries are dropped when it is (re)ingested.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+from services.metrics import CACHE_REQUESTS
+
+QA_CACHE_SIMILARITY = float(os.getenv("QA_CACHE_SIMILARITY", "0.8"))
+QA_CACHE_MAX_PER_DOC = int(os.getenv("QA_CACHE_MAX_PER_DOC", "500"))
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "do", "does", "did", "of", "to",
+    "in", "on", "for", "and", "or", "it", "its", "this", "that", "these", "those", "can",
+    "you", "me", "i", "please", "tell", "explain", "about", "here", "there", "s",
+}
+
+
+@dataclass
+class _Entry:
+    words: frozenset[str]
+    chunk_ids: frozenset[str]
+    answer: Any
+
+
+_lock = threading.Lock()
+_entries: dict[str, OrderedDict[tuple[str, frozenset[str]], _Entry]] = {}
+
+
+def _content_words(question: str) -> frozenset[str]:
+    words = _WORD.findall(question.lower().replace("'", ""))
+    return frozenset(w[:-1] if len(w) > 3 and w.endswith("s") else w for w in words if w not in _STOPWORDS)
+
+
+def _similarity(a: frozenset[str], b: frozenset[str]) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def lookup(doc_id: str, question: str, chunk_ids: list[str]) -> Any | None:
+    """A cached answer for this question over these chunks, or None."""
+    words = _content_words(question)
+    ids = frozenset(chunk_ids)
+    key = (" ".join(sorted(words)), ids)
+    with _lock:
+        entries = _entries.get(doc_id)
+        if entries:
+            entry = entries.get(key)
+            if entry is not None:
+                entries.move_to_end(key)
+                CACHE_REQUESTS.inc(cache="qa_answers", result="hit")
+                return entry.answer
+            # Short questions ("why?") have too few words to compare safely
+            if len(words) >= 2:
+                best = max(
+                    (e for e in entries.values() if e.chunk_ids == ids),
+                    key=lambda e: _similarity(words, e.words),
+                    default=None,
+                )
+                if best is not None and _similarity(words, best.words) >= QA_CACHE_SIMILARITY:
+                    CACHE_REQUESTS.inc(cache="qa_answers", result="near_hit")
+                    return best.answer
+    CACHE_REQUESTS.inc(cache="qa_answers", result="miss")
+    return None
+
+
+def store(doc_id: str, question: str, chunk_ids: list[str], answer: Any) -> None:
+    words = _content_words(question)
+    if not words:
+        return
+    ids = frozenset(chunk_ids)
+    with _lock:
+        entries = _entries.setdefault(doc_id, OrderedDict())
+        entries[(" ".join(sorted(words)), ids)] = _Entry(words, ids, answer)
+        while len(entries) > QA_CACHE_MAX_PER_DOC:
+            entries.popitem(last=False)
+
+
+def invalidate(doc_id: str) -> None:
+    with _lock:
+        _entries.pop(doc_id, None)
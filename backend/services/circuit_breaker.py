@@ -0,0 +1,185 @@
+"""
+Circuit breakers for the external services (OpenAI, Deepgram).
+
+A breaker watches the outcomes of the last CIRCUIT_WINDOW calls; a call
+that raises or takes longer than the breaker's slow-call limit counts as a
+failure. Once at least CIRCUIT_MIN_CALLS are in the window and the failure
+rate reaches CIRCUIT_FAILURE_RATE, the breaker opens: calls fail at once
+with CircuitOpenError, so callers go straight to their fallbacks instead
+of each waiting out the outage. After CIRCUIT_OPEN_SECONDS it half-opens
+and lets one probe call through; success closes it, failure reopens it.
+Only the probe decides the half-open state, and a cancelled call (a
+caller's deadline, not the service) is not an outcome at all.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Iterator, Sequence
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatResult
+
+from services.metrics import Counter, Gauge
+
+logger = logging.getLogger(__name__)
+
+CIRCUIT_WINDOW = int(os.getenv("CIRCUIT_WINDOW", "20"))
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "5"))
+CIRCUIT_FAILURE_RATE = float(os.getenv("CIRCUIT_FAILURE_RATE", "0.5"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+CIRCUIT_TRANSITIONS = Counter(
+    "circuit_breaker_transitions_total", "Circuit breaker state changes by breaker and new state.")
+CIRCUIT_REJECTIONS = Counter(
+    "circuit_breaker_rejections_total", "Calls failed fast by an open circuit breaker.")
+
+_breakers: dict[str, "CircuitBreaker"] = {}
+
+
+class CircuitOpenError(RuntimeError):
+    """The breaker is open; the call was not made."""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, slow_call_ms: float):
+        self.name = name
+        self.slow_call_seconds = slow_call_ms / 1000
+        self.state = CLOSED
+        self._lock = threading.Lock()
+        self._outcomes: deque[tuple[bool, bool]] = deque(maxlen=CIRCUIT_WINDOW)  # (failed, slow)
+        self._opened_at = 0.0
+        self._probing = False
+        _breakers[name] = self
+        Gauge(f"{name}_circuit_state", f"{name} circuit breaker state (0 closed, 1 half-open, 2 open).",
+              lambda: _STATE_VALUES[self.state])
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            logger.warning("Circuit %s: %s -> %s", self.name, self.state, state)
+            self.state = state
+            CIRCUIT_TRANSITIONS.inc(breaker=self.name, state=state)
+
+    def before_call(self) -> bool:
+        """Raise CircuitOpenError unless a call may go through now. Returns
+        whether this call is the half-open probe."""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= CIRCUIT_OPEN_SECONDS:
+                self._set_state(HALF_OPEN)
+            if self.state == OPEN or (self.state == HALF_OPEN and self._probing):
+                CIRCUIT_REJECTIONS.inc(breaker=self.name)
+                raise CircuitOpenError(f"{self.name} circuit is open")
+            if self.state == HALF_OPEN:
+                self._probing = True
+                return True
+            return False
+
+    def record(self, failed: bool, seconds: float, probe: bool = False) -> None:
+        slow = seconds > self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                # Calls started before the breaker opened don't speak for it now
+                if not probe:
+                    return
+                self._probing = False
+                if failed or slow:
+                    self._open()
+                else:
+                    self._outcomes.clear()
+                    self._set_state(CLOSED)
+                return
+            self._outcomes.append((failed, slow))
+            if self.state == CLOSED and len(self._outcomes) >= CIRCUIT_MIN_CALLS \
+                    and self._failure_rate() >= CIRCUIT_FAILURE_RATE:
+                self._open()
+
+    def abandon(self, probe: bool) -> None:
+        """A call ended without an outcome; free the probe slot if it held it."""
+        if probe:
+            with self._lock:
+                self._probing = False
+
+    def _open(self) -> None:
+        self._opened_at = time.monotonic()
+        self._set_state(OPEN)
+
+    def _failure_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return sum(failed or slow for failed, slow in self._outcomes) / len(self._outcomes)
+
+    @contextmanager
+    def guard(self) -> Iterator[None]:
+        """Run a call through the breaker: fail fast when open, else record
+        whether it raised or ran slow. Cancellation (CancelledError,
+        GeneratorExit) is not recorded."""
+        probe = self.before_call()
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.record(True, time.perf_counter() - start, probe)
+            raise
+        except BaseException:
+            self.abandon(probe)
+            raise
+        self.record(False, time.perf_counter() - start, probe)
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            retry_in = CIRCUIT_OPEN_SECONDS - (time.monotonic() - self._opened_at) if self.state == OPEN else 0
+            return {
+                "state": self.state,
+                "windowCalls": len(self._outcomes),
+                "failureRate": round(self._failure_rate(), 3),
+                "slowCalls": sum(slow for _, slow in self._outcomes),
+                "slowCallMs": self.slow_call_seconds * 1000,
+                "retryInSec": round(max(0.0, retry_in), 1),
+            }
+
+
+class BreakerChatModel(BaseChatModel):
+    """Chat model that runs each call of an inner model through a breaker.
+
+    Used for the orchestrator agent, so the breaker sees model calls only:
+    tool time and the agent's own deadline don't count against the model,
+    and tools that call the same service can use a half-open probe between
+    the agent's turns.
+    """
+
+    inner: BaseChatModel
+    breaker: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return f"breaker-{self.inner._llm_type}"
+
+    def bind_tools(self, tools: Sequence[Any], *, tool_choice: str | None = None, **kwargs: Any):
+        from langchain_core.utils.function_calling import convert_to_openai_tool
+
+        if tool_choice is not None:
+            kwargs["tool_choice"] = tool_choice
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _generate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                  run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        with self.breaker.guard():
+            return self.inner._generate(messages, stop=stop, **kwargs)
+
+    async def _agenerate(self, messages: list[BaseMessage], stop: list[str] | None = None,
+                         run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        with self.breaker.guard():
+            return await self.inner._agenerate(messages, stop=stop, **kwargs)
+
+
+def breaker_report() -> dict[str, dict[str, Any]]:
+    return {name: b.snapshot() for name, b in _breakers.items()}
@@ -0,0 +1,153 @@
+"""
+Rolling conversation memory for follow-up Q&A.
+
+Keeps the most recent question/answer turns verbatim and folds older turns
+into a short running summary. Compaction runs asynchronously after each
+answer (AI summary when available, extractive fallback otherwise), so the
+history block pasted into follow-up prompts stays within a fixed token budget
+no matter how long the session runs.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Turns kept verbatim; anything older is folded into the running summary
+KEEP_RECENT_TURNS = 3
+# Token budget for the whole history block (summary + recent turns)
+HISTORY_TOKEN_BUDGET = int(os.getenv("QA_HISTORY_TOKEN_BUDGET", "400"))
+# Share of the budget reserved for the running summary
+SUMMARY_TOKEN_SHARE = 0.4
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return (len(text) + 3) // 4
+
+
+def _truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to roughly max_tokens, preferring a sentence boundary."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    limit = max(max_tokens * 4, 0)
+    cut = text[:limit]
+    boundary = max(cut.rfind(". "), cut.rfind("? "), cut.rfind("! "))
+    if boundary > limit // 2:
+        cut = cut[:boundary + 1]
+    return cut.rstrip() + "…"
+
+
+def _first_sentence(text: str) -> str:
+    parts = _SENTENCE_SPLIT.split(text.strip(), maxsplit=1)
+    return parts[0] if parts else ""
+
+
+def _extractive_fold(summary: str, turns: list[dict[str, str]], max_tokens: int) -> str:
+    """Fold turns into the summary without AI: keep each question and the
+    first sentence of its answer, dropping the oldest facts when over budget."""
+    facts = [f for f in summary.split("\n") if f.strip()]
+    for t in turns:
+        facts.append(f"Asked: {t['q'].strip().rstrip('?')}? Answer: {_first_sentence(t['a'])}")
+    while len(facts) > 1 and estimate_tokens("\n".join(facts)) > max_tokens:
+        facts.pop(0)
+    return _truncate_to_tokens("\n".join(facts), max_tokens)
+
+
+class ConversationMemory:
+    """Recent Q&A turns plus a running summary of everything older."""
+
+    def __init__(self) -> None:
+        self.summary = ""
+        self.turns: list[dict[str, str]] = []
+        self._lock = threading.Lock()
+        self._compacting = False
+
+    def record(self, question: str, answer: str) -> None:
+        with self._lock:
+            self.turns.append({"q": question, "a": answer})
+
+    def needs_compaction(self) -> bool:
+        with self._lock:
+            return len(self.turns) > KEEP_RECENT_TURNS and not self._compacting
+
+    async def compact(self) -> None:
+        """Fold turns older than KEEP_RECENT_TURNS into the running summary."""
+        with self._lock:
+            if self._compacting or len(self.turns) <= KEEP_RECENT_TURNS:
+                return
+            self._compacting = True
+            folded = self.turns[:-KEEP_RECENT_TURNS]
+            previous = self.summary
+
+        summary_budget = int(HISTORY_TOKEN_BUDGET * SUMMARY_TOKEN_SHARE)
+        try:
+            new_summary = None
+            try:
+                from services.ai_provider import get_ai_provider
+                ai = get_ai_provider()
+                if ai is not None:
+                    new_summary = await ai.summarize_conversation(
+                        previous, folded, max_words=summary_budget * 3 // 4
+                    )
+            except Exception as e:
+                logger.warning("AI history summary failed, using extractive fold: %s", e)
+
+            if not new_summary:
+                new_summary = _extractive_fold(previous, folded, summary_budget)
+
+            with self._lock:
+                self.summary = _truncate_to_tokens(new_summary, summary_budget)
+                # Turns recorded during compaction were appended after `folded`
+                self.turns = self.turns[len(folded):]
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def render(self, budget: int = HISTORY_TOKEN_BUDGET) -> str:
+        """Render summary + recent turns, trimmed to fit the token budget."""
+        with self._lock:
+            summary = self.summary
+            # If compaction is behind, only the newest turns are considered
+            turns = list(self.turns[-KEEP_RECENT_TURNS:])
+
+        parts: list[str] = []
+        remaining = budget
+        if summary:
+            summary_text = f"Summary of earlier conversation: {summary}"
+            summary_text = _truncate_to_tokens(
+                summary_text, int(budget * SUMMARY_TOKEN_SHARE)
+            )
+            parts.append(summary_text)
+            remaining -= estimate_tokens(summary_text)
+
+        # Newest turns first so the most relevant context survives trimming
+        rendered_turns: list[str] = []
+        for t in reversed(turns):
+            if remaining <= 0:
+                break
+            turn_text = f"Student: {t['q']}\nTutor: {t['a']}"
+            if estimate_tokens(turn_text) > remaining:
+                turn_text = _truncate_to_tokens(turn_text, remaining)
+            rendered_turns.insert(0, turn_text)
+            remaining -= estimate_tokens(turn_text)
+
+        parts.extend(rendered_turns)
+        return "\n".join(parts)
+
+
+# Keyed by docId
+_memories: dict[str, ConversationMemory] = {}
+
+
+def get_memory(doc_id: str) -> ConversationMemory:
+    memory = _memories.get(doc_id)
+    if memory is None:
+        memory = _memories.setdefault(doc_id, ConversationMemory())
+    return memory
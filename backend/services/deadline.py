@@ -0,0 +1,94 @@
+"""
+Deadline-bounded AI calls raced against a deterministic fallback.
+
+Interactive endpoints (Q&A, formula explanations, reflections, and the
+voice tools that use them) start the AI call and compute the cheap
+deterministic answer alongside it. If the AI answer is not ready by the
+deadline, the fallback is returned; the AI call keeps running and its
+result is kept (unless the caller's `keep` rejects it), so the same
+request made again gets the AI answer at once.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, TypeVar
+
+from services.metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Longest an interactive endpoint waits for the AI before answering with the fallback
+AI_DEADLINE_MS = int(os.getenv("AI_DEADLINE_MS", "2500"))
+# AI answers that arrived after their deadline, kept for the next identical request
+LATE_RESULT_CACHE_SIZE = 256
+
+AI_DEADLINE_RESULTS = Counter(
+    "ai_deadline_results_total",
+    "Deadline-bounded AI calls by endpoint and outcome (ai, late_cache, timeout, error, unavailable).")
+
+_late_results: OrderedDict[tuple[str, Hashable], Any] = OrderedDict()
+# Late AI calls still running (held so they aren't GC'd)
+_pending: set[asyncio.Task] = set()
+
+
+def _store_late(key: tuple[str, Hashable], task: asyncio.Task, keep: Callable[[Any], bool] | None) -> None:
+    _pending.discard(task)
+    if task.cancelled():
+        return
+    if task.exception() is not None:
+        logger.info("Late AI call for %s failed: %s", key[0], task.exception())
+        return
+    if keep is not None and not keep(task.result()):
+        return
+    _late_results[key] = task.result()
+    _late_results.move_to_end(key)
+    while len(_late_results) > LATE_RESULT_CACHE_SIZE:
+        _late_results.popitem(last=False)
+
+
+async def race_with_fallback(
+    endpoint: str,
+    key: Hashable,
+    ai_call: Callable[[], Awaitable[T]] | None,
+    fallback: Callable[[], T],
+    deadline_ms: int | None = None,
+    keep: Callable[[T], bool] | None = None,
+) -> T:
+    """The AI result if it arrives within the deadline, else the fallback.
+
+    `ai_call` is None when no AI provider is configured. `key` identifies
+    the request, so an AI answer that arrives late serves the next one,
+    unless `keep` returns False for it.
+    """
+    cache_key = (endpoint, key)
+    if cache_key in _late_results:
+        AI_DEADLINE_RESULTS.inc(endpoint=endpoint, result="late_cache")
+        _late_results.move_to_end(cache_key)
+        return _late_results[cache_key]
+    if ai_call is None:
+        AI_DEADLINE_RESULTS.inc(endpoint=endpoint, result="unavailable")
+        return fallback()
+
+    deadline = (AI_DEADLINE_MS if deadline_ms is None else deadline_ms) / 1000
+    task = asyncio.ensure_future(ai_call())
+    fallback_future = asyncio.ensure_future(asyncio.to_thread(fallback))
+    done, _ = await asyncio.wait({task}, timeout=deadline)
+    if task in done:
+        if task.exception() is None:
+            fallback_future.cancel()
+            AI_DEADLINE_RESULTS.inc(endpoint=endpoint, result="ai")
+            return task.result()
+        logger.warning("AI %s failed, using fallback: %s", endpoint, task.exception())
+        AI_DEADLINE_RESULTS.inc(endpoint=endpoint, result="error")
+    else:
+        logger.info("AI %s missed its %.1fs deadline, using fallback", endpoint, deadline)
+        AI_DEADLINE_RESULTS.inc(endpoint=endpoint, result="timeout")
+        _pending.add(task)
+        task.add_done_callback(lambda t: _store_late(cache_key, t, keep))
+    return await fallback_future
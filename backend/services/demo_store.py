@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 import json
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
 from pathlib import Path
 
 from models import (
@@ -8,9 +10,13 @@ from models import (
     DocumentManifest,
     FormulaModule,
     FormulasResponse,
+    PageBundle,
+    SummariesResponse,
     VisualModule,
     VisualsResponse,
 )
+from services import answer_cache, response_cache
+from services.summarizer import build_extractive_summaries
 
 DATA_DIR = Path(__file__).resolve().parent.parent.parent / "data"
 
@@ -18,31 +24,60 @@ _manifest: DocumentManifest | None = None
 _chunks: ChunksResponse | None = None
 _formulas: FormulasResponse | None = None
 _visuals: VisualsResponse | None = None
+_summaries: SummariesResponse | None = None
 
 # In-memory store for uploaded documents (keyed by docId)
 _uploaded: dict[str, dict] = {}
 
 
+@dataclass
+class _ChunkIndex:
+    """A document's chunks in reading order, laid out by page."""
+    ordered: list
+    page_nos: list[int]  # pageNo of each entry in `ordered`, for bisecting page ranges
+    position: dict[str, int]  # chunkId -> index in `ordered`
+
+
+# Built on first windowed read of a document, dropped when it is stored again
+_chunk_index: dict[str, _ChunkIndex] = {}
+_page_bundles: dict[str, dict[int, PageBundle]] = {}
+
+
 def _load_json(filename: str) -> dict:
     with open(DATA_DIR / filename, encoding="utf-8") as f:
         return json.load(f)
 
 
 def load_demo_data() -> None:
-    global _manifest, _chunks, _formulas, _visuals
+    global _manifest, _chunks, _formulas, _visuals, _summaries
     _manifest = DocumentManifest(**_load_json("demo_manifest.json"))
     _chunks = ChunksResponse(**_load_json("demo_chunks.json"))
     _formulas = FormulasResponse(**_load_json("demo_formula_modules.json"))
     _visuals = VisualsResponse(**_load_json("demo_visual_modules.json"))
-
-
-def store_uploaded(doc_id: str, manifest: DocumentManifest, chunks: list, formulas: list[FormulaModule], visuals: list[VisualModule]) -> None:
+    _summaries = build_extractive_summaries(
+        _manifest.docId,
+        _chunks.chunks,
+        [p.pageNo for p in _manifest.pages],
+        _manifest.outline,
+    )
+    _chunk_index.pop(_manifest.docId, None)
+    _page_bundles.pop(_manifest.docId, None)
+    answer_cache.invalidate(_manifest.docId)
+    response_cache.invalidate(_manifest.docId)
+
+
+def store_uploaded(doc_id: str, manifest: DocumentManifest, chunks: list, formulas: list[FormulaModule], visuals: list[VisualModule], summaries: SummariesResponse | None = None) -> None:
     _uploaded[doc_id] = {
         "manifest": manifest,
         "chunks": chunks,
         "formulas": formulas,
         "visuals": visuals,
+        "summaries": summaries,
     }
+    _chunk_index.pop(doc_id, None)
+    _page_bundles.pop(doc_id, None)
+    answer_cache.invalidate(doc_id)
+    response_cache.invalidate(doc_id)
 
 
 def get_manifest(doc_id: str) -> DocumentManifest | None:
@@ -61,6 +96,74 @@ def get_chunks(doc_id: str) -> list:
     return []
 
 
+def _index(doc_id: str) -> _ChunkIndex | None:
+    index = _chunk_index.get(doc_id)
+    if index is None:
+        chunks = get_chunks(doc_id)
+        if not chunks:
+            return None
+        ordered = sorted(chunks, key=lambda c: (c.pageNo, c.order))
+        index = _ChunkIndex(
+            ordered,
+            [c.pageNo for c in ordered],
+            {c.chunkId: i for i, c in enumerate(ordered)},
+        )
+        _chunk_index[doc_id] = index
+    return index
+
+
+def get_chunk_window(
+    doc_id: str,
+    from_page: int | None = None,
+    to_page: int | None = None,
+    cursor: str | None = None,
+    limit: int | None = None,
+) -> tuple[list, str | None] | None:
+    """Chunks of pages from_page..to_page in reading order, starting at the
+    chunk `cursor` names, at most `limit` of them. Returns the chunks and the
+    cursor for the rest of the range (None when it is exhausted), or None
+    when the document is unknown. Raises KeyError for an unknown cursor."""
+    index = _index(doc_id)
+    if index is None:
+        return None
+    start = bisect_left(index.page_nos, from_page) if from_page is not None else 0
+    end = bisect_right(index.page_nos, to_page) if to_page is not None else len(index.ordered)
+    if cursor is not None:
+        start = max(start, index.position[cursor])
+    stop = end if limit is None else min(end, start + limit)
+    next_cursor = index.ordered[stop].chunkId if stop < end else None
+    return index.ordered[start:stop], next_cursor
+
+
+def get_page_bundles(doc_id: str, from_page: int, to_page: int) -> list[PageBundle] | None:
+    """Bundles for the document's pages from from_page to to_page, or None
+    when the document is unknown. All pages are bundled on first use, in one
+    pass over the chunks, formulas and visuals."""
+    bundles = _page_bundles.get(doc_id)
+    if bundles is None:
+        manifest = get_manifest(doc_id)
+        if manifest is None:
+            return None
+        summaries = get_summaries(doc_id)
+        page_summaries = {p.pageNo: p.summary for p in summaries.pages} if summaries else {}
+        bundles = {
+            p.pageNo: PageBundle(pageNo=p.pageNo, summary=page_summaries.get(p.pageNo), chunks=[], formulas=[], visuals=[])
+            for p in manifest.pages
+        }
+        index = _index(doc_id)
+        for chunk in index.ordered if index else []:
+            if chunk.pageNo in bundles:
+                bundles[chunk.pageNo].chunks.append(chunk)
+        for formula in get_formulas(doc_id):
+            if formula.pageNo in bundles:
+                bundles[formula.pageNo].formulas.append(formula)
+        for visual in get_visuals(doc_id):
+            if visual.pageNo in bundles:
+                bundles[visual.pageNo].visuals.append(visual)
+        _page_bundles[doc_id] = bundles
+    return [bundles[n] for n in range(from_page, to_page + 1) if n in bundles]
+
+
 def get_formulas(doc_id: str, page_no: int | None = None) -> list[FormulaModule]:
     if _formulas and _formulas.docId == doc_id:
         formulas = _formulas.formulas
@@ -83,3 +186,18 @@ def get_visuals(doc_id: str, page_no: int | None = None) -> list[VisualModule]:
     if page_no is not None:
         return [v for v in visuals if v.pageNo == page_no]
     return visuals
+
+
+def get_summaries(doc_id: str) -> SummariesResponse | None:
+    if _summaries and _summaries.docId == doc_id:
+        return _summaries
+    if doc_id in _uploaded:
+        return _uploaded[doc_id].get("summaries")
+    return None
+
+
+def get_page_summary(doc_id: str, page_no: int) -> str | None:
+    summaries = get_summaries(doc_id)
+    if not summaries:
+        return None
+    return next((p.summary for p in summaries.pages if p.pageNo == page_no), None)
@@ -6,7 +6,9 @@ Future: GoogleDriveSource, OneDriveSource.
 
 from typing import Protocol, runtime_checkable
 
-from models import DocumentManifest, Chunk, FormulaModule, VisualModule
+import fitz  # PyMuPDF
+
+from models import DocumentManifest, Chunk, FormulaModule, SummariesResponse, VisualModule
 
 
 class IngestedDocument:
@@ -18,11 +20,13 @@ class IngestedDocument:
         chunks: list[Chunk],
         formulas: list[FormulaModule],
         visuals: list[VisualModule],
+        summaries: SummariesResponse | None = None,
     ):
         self.manifest = manifest
         self.chunks = chunks
         self.formulas = formulas
         self.visuals = visuals
+        self.summaries = summaries
 
 
 @runtime_checkable
@@ -37,7 +41,7 @@ class DemoSource:
         self.doc_id = doc_id
 
     async def ingest(self) -> IngestedDocument:
-        from services.demo_store import get_manifest, get_chunks, get_formulas, get_visuals
+        from services.demo_store import get_manifest, get_chunks, get_formulas, get_summaries, get_visuals
 
         manifest = get_manifest(self.doc_id)
         if not manifest:
@@ -45,20 +49,23 @@ class DemoSource:
         chunks = get_chunks(self.doc_id) or []
         formulas = get_formulas(self.doc_id) or []
         visuals = get_visuals(self.doc_id) or []
-        return IngestedDocument(manifest, chunks, formulas, visuals)
+        summaries = get_summaries(self.doc_id)
+        return IngestedDocument(manifest, chunks, formulas, visuals, summaries)
 
 
 class UploadSource:
     """Parses an uploaded PDF into manifest + chunks + formula/visual modules.
 
+    Takes an already-open document; the caller owns (and closes) it.
+
     Uses AI to detect formulas from text and visuals from page images.
     Falls back to empty modules if AI is unavailable.
     """
 
-    def __init__(self, filename: str, pdf_bytes: bytes):
+    def __init__(self, filename: str, doc: fitz.Document):
         self.filename = filename
-        self.pdf_bytes = pdf_bytes
+        self.doc = doc
 
     async def ingest(self) -> IngestedDocument:
         from services.pdf_parser import parse_pdf_with_modules
-        return await parse_pdf_with_modules(self.filename, self.pdf_bytes)
+        return await parse_pdf_with_modules(self.filename, self.doc)
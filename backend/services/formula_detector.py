@@ -0,0 +1,144 @@
+"""
+Local formula detector.
+
+Scores each text line for mathematical content: math Unicode ranges, operator
+density, formula-shaped patterns (assignments, sub/superscripts, math function
+calls, LaTeX commands) and, when a PyMuPDF page is available, spans set in
+math fonts. Prose with an equals sign, code and function-call-looking text
+score low, so fewer pages are sent to the formula LLM.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from dataclasses import dataclass, field
+
+import fitz  # PyMuPDF
+
+# A page is sent to the formula LLM when its best line scores at least this
+FORMULA_SCORE_THRESHOLD = float(os.getenv("FORMULA_SCORE_THRESHOLD", "0.5"))
+
+_MATH_RANGES = (
+    (0x0391, 0x03C9),    # Greek letters
+    (0x2032, 0x2037),    # primes
+    (0x2070, 0x209F),    # superscripts and subscripts
+    (0x2190, 0x21FF),    # arrows
+    (0x2200, 0x22FF),    # mathematical operators
+    (0x27C0, 0x27EF),    # misc mathematical symbols A
+    (0x2980, 0x2AFF),    # misc mathematical symbols B, supplemental operators
+    (0x1D400, 0x1D7FF),  # mathematical alphanumerics
+)
+_MATH_LATIN1 = set("±×÷²³¹·¬")
+
+_MATH_FONT = re.compile(
+    r"CMMI|CMSY|CMEX|CMBSY|MSAM|MSBM|LMMath|Math|Symbol|STIX|Cambria|Euclid|rsfs|esint|MTExtra",
+    re.IGNORECASE,
+)
+
+_OPERATORS = set("=+-*/^_<>|")
+
+_PATTERNS = [
+    # y = ..., f(x) = ..., z_i = ..., L(θ) = ..., E[x] = ...
+    re.compile(r"(?:^|[\s(])[A-Za-z\u0391-\u03C9](?:_\{?\w+\}?|\^\{?\w+\}?|\([\w\u0391-\u03C9,|\s]*\)|\[[^\]=]*\](?:\^\{?\w+\}?)?)?\s*=\s*[^\s=]"),
+    # exp(...), log(...), sqrt(...) and friends
+    re.compile(r"\b(?:exp|log|ln|sin|cos|tan|tanh|sqrt|argmax|argmin|softmax|sigmoid|lim|det|tr)\s*\("),
+    # x^2, e^{-x}, x_i, w_{t+1}
+    re.compile(r"[\w)\]]\^[\w{(\-]|[A-Za-z]_[\w{]"),
+    # LaTeX commands
+    re.compile(r"\\(?:frac|sum|prod|int|partial|sqrt|alpha|beta|gamma|delta|theta|lambda|mu|sigma|nabla|cdot|times|leq|geq|log|exp)\b"),
+    # a + b - c / d chains of short operands
+    re.compile(r"(?:^|\s)[\w.]{1,4}\s*[+\-*/]\s*[\w.(]{1,6}\s*[+\-*/=]"),
+    # dy/dx, d/dt derivatives
+    re.compile(r"\bd\w?\s*/\s*d\w\b"),
+    # 1/n, (a)/(b) fractions
+    re.compile(r"(?:\b\d+|\))\s*/\s*(?:\(|[A-Za-z]\b)"),
+]
+
+# Code-shaped tokens
+_CODE = re.compile(
+    r"==|!=|:=|->|=>|\+\+|&&|\|\||;\s*$|\bdef\b|\breturn\b|\bimport\b|\bprint\(|\bself\.|\w\.\w+\(|\(\)|[{}]\s*$|https?://|\w=\w+&"
+)
+_WORD = re.compile(r"[A-Za-z]{4,}")
+
+
+def _is_math_char(ch: str) -> bool:
+    if ch in _MATH_LATIN1:
+        return True
+    cp = ord(ch)
+    return any(lo <= cp <= hi for lo, hi in _MATH_RANGES)
+
+
+def is_math_font(font_name: str) -> bool:
+    """True for TeX math, Symbol and other math-typesetting font names."""
+    return bool(_MATH_FONT.search(font_name))
+
+
+def score_formula_line(text: str, math_font_ratio: float = 0.0) -> float:
+    """Score one line of text in [0, 1] for how formula-like it is."""
+    stripped = text.strip()
+    chars = [c for c in stripped if not c.isspace()]
+    if len(chars) < 3:
+        return 0.0
+
+    math_chars = sum(1 for c in chars if _is_math_char(c))
+    op_density = sum(1 for c in chars if c in _OPERATORS) / len(chars)
+    pattern_hits = sum(1 for p in _PATTERNS if p.search(stripped))
+
+    tokens = stripped.split()
+    prose_ratio = sum(1 for t in tokens if _WORD.fullmatch(t.strip(".,;:!?\"'()"))) / len(tokens)
+
+    score = (
+        0.35 * min(1.0, math_chars / 2)
+        + 0.25 * min(1.0, op_density * 8)
+        + 0.30 * min(1.0, pattern_hits / 2)
+        # A few glyphs in a math font are enough; symbols are short next to operands
+        + 0.40 * min(1.0, math_font_ratio * 3)
+    )
+    # Sentences with an incidental "=" are mostly long plain words
+    if prose_ratio > 0.5:
+        score -= prose_ratio - 0.4
+    if _CODE.search(stripped):
+        score -= 0.4
+    return max(0.0, min(1.0, score))
+
+
+@dataclass
+class FormulaScore:
+    """Best line score on a page plus how many lines cleared the threshold."""
+
+    score: float
+    formula_lines: int
+    lines: list[tuple[str, float]] = field(default_factory=list)
+
+    @property
+    def is_formula(self) -> bool:
+        return self.score >= FORMULA_SCORE_THRESHOLD
+
+
+def _summarize(lines: list[tuple[str, float]]) -> FormulaScore:
+    best = max((s for _, s in lines), default=0.0)
+    count = sum(1 for _, s in lines if s >= FORMULA_SCORE_THRESHOLD)
+    return FormulaScore(score=best, formula_lines=count, lines=lines)
+
+
+def score_formula_text(text: str) -> FormulaScore:
+    """Score plain page text line by line."""
+    return _summarize([(line, score_formula_line(line)) for line in text.splitlines() if line.strip()])
+
+
+def score_formula_page(page: fitz.Page) -> FormulaScore:
+    """Score a page line by line, using span fonts to spot math typesetting."""
+    lines: list[tuple[str, float]] = []
+    for block in page.get_text("dict").get("blocks", []):
+        for line in block.get("lines", []):
+            spans = line.get("spans", [])
+            text = "".join(s["text"] for s in spans)
+            total = sum(len(s["text"].strip()) for s in spans)
+            if not total:
+                continue
+            math_font = sum(
+                len(s["text"].strip()) for s in spans if is_math_font(s.get("font", ""))
+            )
+            lines.append((text, score_formula_line(text, math_font / total)))
+    return _summarize(lines)
@@ -0,0 +1,249 @@
+"""
+Local structural formula extraction.
+
+Rebuilds formula expressions from `page.get_text("rawdict")` spans: span
+sizes and baselines recover sub/superscripts that plain text extraction
+flattens ("x_i^2" instead of "xi2"), Symbol-font and math-alphanumeric
+glyphs are mapped to readable names, and each expression keeps its
+location on the page. Lines are kept when the formula detector scores
+them as math, so the LLM only has to explain a precise expression.
+"""
+
+from __future__ import annotations
+
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass, field
+
+import fitz  # PyMuPDF
+
+from services.formula_detector import FORMULA_SCORE_THRESHOLD, is_math_font, score_formula_line
+
+# Spans smaller than this share of the row's base size are script candidates
+SCRIPT_SIZE_RATIO = 0.85
+# Baseline offsets, as a share of the base size, that mark a super/subscript
+SUPERSCRIPT_RISE = 0.15
+SUBSCRIPT_DROP = 0.1
+# Horizontal gap, as a share of the base size, rendered as a space
+SPACE_GAP_RATIO = 0.2
+
+# Symbol-font code points PDFs often emit without a ToUnicode map
+_SYMBOL_FONT = {
+    "a": "alpha", "b": "beta", "c": "chi", "d": "delta", "e": "epsilon", "f": "phi",
+    "g": "gamma", "h": "eta", "i": "iota", "k": "kappa", "l": "lambda", "m": "mu",
+    "n": "nu", "p": "pi", "q": "theta", "r": "rho", "s": "sigma", "t": "tau",
+    "u": "upsilon", "w": "omega", "x": "xi", "y": "psi", "z": "zeta",
+    "D": "Delta", "F": "Phi", "G": "Gamma", "L": "Lambda", "P": "Pi", "Q": "Theta",
+    "S": "sum", "W": "Omega", "X": "Xi", "Y": "Psi",
+}
+
+_ASCII = {
+    "−": "-", "–": "-", "×": "*", "·": "*", "⋅": "*", "÷": "/", "∕": "/",
+    "≤": "<=", "≥": ">=", "≠": "!=", "≈": "~=", "≡": "==", "±": "+/-",
+    "→": "->", "←": "<-", "⇒": "=>", "↦": "->",
+    "∑": " sum ", "∏": " prod ", "∫": " integral ", "√": " sqrt ", "∞": " inf ",
+    "∂": " d", "∇": " grad ", "∈": " in ", "∀": " for all ", "∃": " exists ",
+    "′": "'", "″": "''", "‖": "||", "⟨": "<", "⟩": ">",
+}
+_SUPERSCRIPT_DIGITS = str.maketrans("⁰¹²³⁴⁵⁶⁷⁸⁹⁺⁻ⁿ", "0123456789+-n")
+_SUBSCRIPT_DIGITS = str.maketrans("₀₁₂₃₄₅₆₇₈₉₊₋", "0123456789+-")
+_TIGHT_AFTER = re.compile(r"([(\[{])\s+")
+_TIGHT_BEFORE = re.compile(r"\s+([)\]},_^'])")
+
+
+@dataclass
+class _Span:
+    text: str
+    font: str
+    size: float
+    x0: float
+    x1: float
+    baseline: float
+    bbox: fitz.Rect
+
+
+@dataclass
+class _Row:
+    baseline: float
+    size: float
+    x0: float
+    x1: float
+    spans: list[tuple[_Span, str]] = field(default_factory=list)  # (span, "" | "sub" | "sup")
+
+    def add(self, span: _Span, role: str = "") -> None:
+        self.spans.append((span, role))
+        self.x0, self.x1 = min(self.x0, span.x0), max(self.x1, span.x1)
+
+
+@dataclass
+class PageExpression:
+    """A formula line rebuilt from span layout, with its page location."""
+
+    expression: str
+    bbox: fitz.Rect
+    score: float
+
+
+def _greek_name(ch: str) -> str:
+    # "GREEK SMALL LETTER THETA" -> theta, "GREEK CAPITAL LETTER SIGMA" -> Sigma
+    name = unicodedata.name(ch, "").split()
+    if not name:
+        return ch
+    letter = "lambda" if name[-1] == "LAMDA" else name[-1].lower()
+    return letter if "SMALL" in name else letter.capitalize()
+
+
+def _to_ascii(text: str, font: str) -> str:
+    symbol_font = "symbol" in font.lower()
+    out = []
+    for i, ch in enumerate(text):
+        if symbol_font and ch in _SYMBOL_FONT:
+            word = _SYMBOL_FONT[ch]
+        elif "Α" <= ch <= "ω":
+            word = _greek_name(ch)
+        else:
+            word = None
+        if word:
+            # Keep names apart from neighbouring letters: "ηx" -> "eta x", "σ(z)" -> "sigma(z)"
+            before = " " if i and text[i - 1].isalnum() else ""
+            after = " " if i + 1 < len(text) and text[i + 1].isalnum() else ""
+            out.append(f"{before}{word}{after}")
+        elif ch in _ASCII:
+            out.append(_ASCII[ch])
+        elif ord(ch) >= 0x1D400:
+            out.append(unicodedata.normalize("NFKC", ch))  # math italic x -> x
+        else:
+            out.append(ch.translate(_SUPERSCRIPT_DIGITS).translate(_SUBSCRIPT_DIGITS))
+    return "".join(out)
+
+
+def _tidy(expression: str) -> str:
+    expression = " ".join(expression.split())
+    expression = _TIGHT_AFTER.sub(r"\1", expression)
+    return _TIGHT_BEFORE.sub(r"\1", expression)
+
+
+def normalize_expression(text: str) -> str:
+    """Plain-text form of an expression (ASCII operators, named Greek letters, tidy spacing)."""
+    return _tidy(_to_ascii(text, ""))
+
+
+def _page_spans(page: fitz.Page) -> list[_Span]:
+    spans = []
+    for block in page.get_text("rawdict").get("blocks", []):
+        for line in block.get("lines", []):
+            for s in line.get("spans", []):
+                text = "".join(c["c"] for c in s.get("chars", []))
+                if text.strip():
+                    spans.append(_Span(
+                        text=text, font=s.get("font", ""), size=s["size"],
+                        x0=s["bbox"][0], x1=s["bbox"][2], baseline=s["origin"][1],
+                        bbox=fitz.Rect(s["bbox"]),
+                    ))
+    return spans
+
+
+def _group_rows(spans: list[_Span]) -> list[_Row]:
+    """Spans sharing a baseline and horizontally close (not across columns) form a row."""
+    rows: list[_Row] = []
+    for s in sorted(spans, key=lambda s: (s.baseline, s.x0)):
+        row = next((
+            r for r in rows
+            if abs(r.baseline - s.baseline) <= 0.25 * r.size
+            and r.x0 - 3 * r.size <= s.x1 and s.x0 <= r.x1 + 3 * r.size
+        ), None)
+        if row is None:
+            row = _Row(baseline=s.baseline, size=s.size, x0=s.x0, x1=s.x1)
+            rows.append(row)
+        row.add(s)
+    return rows
+
+
+def _rows(spans: list[_Span]) -> list[_Row]:
+    """Group spans into rows on full-size baselines and attach scripts to them.
+
+    PyMuPDF often puts a raised or lowered span in its own line or block, so
+    this works page-wide rather than per line.
+    """
+    sizes = Counter()
+    for s in spans:
+        sizes[round(s.size, 1)] += len(s.text.strip())
+    base = sizes.most_common(1)[0][0]
+
+    rows = _group_rows([s for s in spans if s.size >= SCRIPT_SIZE_RATIO * base])
+    orphans = []
+    for s in (s for s in spans if s.size < SCRIPT_SIZE_RATIO * base):
+        # Scripts sit between a cap height above and a descender below their row's baseline
+        near = [
+            r for r in rows
+            if r.baseline - r.size <= s.baseline <= r.baseline + 0.5 * r.size
+            and r.x0 - r.size <= s.x0 <= r.x1 + r.size
+        ]
+        if not near:
+            orphans.append(s)
+            continue
+        row = min(near, key=lambda r: abs(r.baseline - s.baseline))
+        if s.baseline < row.baseline - SUPERSCRIPT_RISE * row.size:
+            row.add(s, "sup")
+        elif s.baseline > row.baseline + SUBSCRIPT_DROP * row.size:
+            row.add(s, "sub")
+        else:
+            row.add(s)
+    # Small text with no row to attach to (footnotes, captions) forms its own rows
+    return rows + _group_rows(orphans)
+
+
+def _render_row(row: _Row) -> tuple[str, str, float]:
+    """(expression, plain text, share of characters in math fonts) for a row."""
+    parts: list[str] = []
+    plain: list[str] = []
+    math_chars = total = 0
+    prev_x1 = None
+    group_role, group = "", []
+
+    def flush() -> None:
+        if not group:
+            return
+        text = _tidy("".join(group))
+        if group_role:
+            mark = "^" if group_role == "sup" else "_"
+            parts.append(f"{mark}{text}" if len(text) == 1 else f"{mark}{{{text}}}")
+        else:
+            parts.append("".join(group))
+
+    for span, role in sorted(row.spans, key=lambda sr: sr[0].x0):
+        gap = prev_x1 is not None and span.x0 - prev_x1 > SPACE_GAP_RATIO * row.size
+        if role != group_role or (role and gap):
+            flush()
+            group_role, group = role, []
+        if gap and not role:
+            group.append(" ")
+        group.append(_to_ascii(span.text, span.font))
+        plain.append((" " if gap else "") + span.text)
+        chars = len(span.text.strip())
+        total += chars
+        if is_math_font(span.font):
+            math_chars += chars
+        prev_x1 = span.x1
+    flush()
+    return _tidy("".join(parts)), "".join(plain), math_chars / total if total else 0.0
+
+
+def extract_page_expressions(page: fitz.Page) -> list[PageExpression]:
+    """Formula lines on a page, rebuilt with sub/superscripts and located."""
+    spans = _page_spans(page)
+    if not spans:
+        return []
+    found: list[PageExpression] = []
+    for row in _rows(spans):
+        expression, plain, math_ratio = _render_row(row)
+        # Score the script-marked form too: x^2 is formula-shaped, "x2" is not
+        score = max(score_formula_line(plain, math_ratio), score_formula_line(expression, math_ratio))
+        if score >= FORMULA_SCORE_THRESHOLD:
+            bbox = fitz.Rect(row.spans[0][0].bbox)
+            for span, _ in row.spans[1:]:
+                bbox |= span.bbox
+            found.append(PageExpression(expression=expression, bbox=bbox, score=score))
+    found.sort(key=lambda e: (e.bbox.y0, e.bbox.x0))
+    return found
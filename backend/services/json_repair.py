@@ -0,0 +1,121 @@
+"""
+Lenient JSON parsing for model replies.
+
+Structured output makes malformed replies rare, but cassettes, JSON mode
+and models without schema support still return code fences, prose around
+the object, trailing commas, smart quotes or a reply cut off at the token
+limit. parse_json_lenient recovers the object from all of these, so a paid
+call is not thrown away for a syntax slip. A string value cut off by the
+token limit is never completed: it is dropped with its item, so truncated
+text can't pass as a whole answer.
+"""
+
+from __future__ import annotations
+
+import json
+from typing import Any
+
+MAX_REPAIR_STEPS = 20
+
+_DECODER = json.JSONDecoder()
+_CLOSERS = {"{": "}", "[": "]"}
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"'})
+
+
+class JSONRepairError(ValueError):
+    """The reply holds no recoverable JSON object."""
+
+
+def _strip_fences(text: str) -> str:
+    lines = [l for l in text.strip().split("\n") if not l.strip().startswith("```")]
+    return "\n".join(lines).strip()
+
+
+def _close(text: str) -> str:
+    """One pass over `text`: drop trailing commas, escape raw newlines in
+    strings, drop whatever a reply cut off mid-item was writing, then close
+    any open brackets.
+
+    An item cut off inside a string or a nested object or array is dropped
+    whole: the outermost open array is cut back to its last complete
+    element, since everything still open inside it is incomplete. Outside
+    any array only the truncated string goes; the key
+    left without its value makes the result invalid, so the caller cuts
+    back to the previous complete item."""
+    out: list[str] = []
+    stack: list[str] = []
+    # Per open bracket, where in `out` its current element starts
+    element_starts: list[int] = []
+    in_string = escaped = False
+    string_start = 0
+    for ch in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_string = False
+            elif ch == "\n":
+                ch = "\\n"
+            out.append(ch)
+            continue
+        if ch == '"':
+            in_string = True
+            string_start = len(out)
+        elif ch in _CLOSERS:
+            stack.append(_CLOSERS[ch])
+            element_starts.append(len(out) + 1)
+        elif ch in "}]":
+            while out and out[-1] in " \t\r\n,":
+                out.pop()
+            if not stack:
+                break
+            ch = stack.pop()
+            element_starts.pop()
+        elif ch == "," and stack:
+            element_starts[-1] = len(out)
+        out.append(ch)
+        if not stack and ch in "}]":
+            break
+    outer = stack.index("]") if "]" in stack else -1
+    if outer >= 0 and (in_string or outer < len(stack) - 1):
+        del out[element_starts[outer]:]
+        del stack[outer + 1:]
+    elif in_string:
+        del out[string_start:]
+    return "".join(out).rstrip(" \t\r\n,:") + "".join(reversed(stack))
+
+
+def parse_json_lenient(text: str) -> tuple[Any, bool]:
+    """Parse a model reply as JSON. Returns (value, repaired), where
+    `repaired` is False when the reply was already valid JSON (fences aside).
+    Raises JSONRepairError when nothing can be recovered."""
+    cleaned = _strip_fences(text)
+    try:
+        return json.loads(cleaned), False
+    except json.JSONDecodeError:
+        pass
+    starts = [i for i in (cleaned.find("{"), cleaned.find("[")) if i >= 0]
+    if not starts:
+        raise JSONRepairError(f"No JSON object in reply: {text[:80]!r}")
+    body = cleaned[min(starts):]
+    if '"' not in body:
+        body = body.translate(_SMART_QUOTES)
+    try:
+        # Valid object followed by prose
+        return _DECODER.raw_decode(body)[0], True
+    except json.JSONDecodeError:
+        pass
+    # Close what is open; if a reply cut off mid-item still fails, drop
+    # items from the end, one comma at a time, until the rest parses
+    for _ in range(MAX_REPAIR_STEPS):
+        try:
+            return json.loads(_close(body)), True
+        except json.JSONDecodeError as e:
+            error = e
+        cut = body.rfind(",")
+        if cut <= 0:
+            break
+        body = body[:cut]
+    raise JSONRepairError(f"Unrecoverable JSON in reply: {error}")
@@ -0,0 +1,210 @@
+"""
+In-process metrics rendered in the Prometheus text format at /metrics.
+
+A minimal registry of counters, gauges and latency histograms, safe to
+update from the worker threads LangGraph runs tools in. The metrics the
+backend records are defined at the bottom of this module.
+"""
+
+from __future__ import annotations
+
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+from services.tracing import record_span
+
+# Seconds; spans a fast cache hit to a slow multi-page vision call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry: list["_Metric"] = []
+
+LabelKey = tuple[tuple[str, str], ...]
+
+
+def _label_key(labels: dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: tuple[str, str] | None = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _samples(self) -> list[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        return "\n".join(lines + self._samples())
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self._values: dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def _samples(self) -> list[str]:
+        with self._lock:
+            return [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in sorted(self._values.items())]
+
+
+class Gauge(_Metric):
+    """A gauge read from a callback at scrape time."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, read: Callable[[], float]):
+        super().__init__(name, help_text)
+        self._read = read
+
+    def _samples(self) -> list[str]:
+        return [f"{self.name} {_format_value(self._read())}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = buckets
+        self._series: dict[LabelKey, list[float]] = {}  # bucket counts..., sum, count
+
+    def observe(self, seconds: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.setdefault(key, [0.0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[i] += 1
+            series[-2] += seconds
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, errors: Counter | None = None, span: str | None = None, **labels: Any) -> Iterator[None]:
+        """Observe the duration of a block; count it in `errors` if it raises.
+
+        With `span`, the block is also recorded in the current request trace.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            if errors is not None:
+                errors.inc(**labels)
+            raise
+        finally:
+            ended = time.perf_counter()
+            self.observe(ended - start, **labels)
+            if span:
+                record_span(span, start, ended)
+
+    def timed(self, errors: Counter | None = None, span: str | None = None, **labels: Any) -> Callable:
+        """Decorator form of time(), for sync and async functions."""
+        def decorator(fn: Callable) -> Callable:
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                    with self.time(errors, span, **labels):
+                        return await fn(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                with self.time(errors, span, **labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, **labels: Any) -> int:
+        series = self._series.get(_label_key(labels))
+        return int(series[-1]) if series else 0
+
+    def _samples(self) -> list[str]:
+        lines = []
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, n in zip(self.buckets, series):
+                    lines.append(f"{self.name}_bucket{_format_labels(key, ('le', _format_value(bound)))} {_format_value(n)}")
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {_format_value(series[-1])}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series[-2])}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {_format_value(series[-1])}")
+        return lines
+
+
+def render_metrics() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    return "\n".join(m.render() for m in _registry) + "\n"
+
+
+def _uploaded_documents() -> float:
+    from services import demo_store
+    return len(demo_store._uploaded)
+
+
+def _uploaded_chunks() -> float:
+    from services import demo_store
+    return sum(len(d["chunks"]) for d in list(demo_store._uploaded.values()))
+
+
+# ─── Backend metrics ───
+
+VOICE_STAGE_SECONDS = Histogram(
+    "voice_stage_seconds", "Time per /api/voice stage (transcribe, context, orchestrator).")
+AGENT_SECONDS = Histogram(
+    "orchestrator_agent_seconds", "Time the orchestrator agent takes to route and answer a command.")
+TOOL_SECONDS = Histogram(
+    "orchestrator_tool_seconds", "Time per orchestrator tool call.")
+AI_CALL_SECONDS = Histogram(
+    "ai_call_seconds", "Time per AIProvider method call.")
+AI_CALL_ERRORS = Counter(
+    "ai_call_errors_total", "AIProvider method calls that raised (callers fall back to templates).")
+AI_COALESCED = Counter(
+    "ai_coalesced_calls_total", "AIProvider calls that joined an identical call already in flight, by prompt template.")
+AI_PARSE_RESULTS = Counter(
+    "ai_parse_total", "JSON model replies by prompt template and parse result (ok, repaired, failed).")
+VISION_RENDER_PIXELS = Counter(
+    "vision_render_pixels_total",
+    "Pixels of page images sent to vision calls (sent) and of the full-page renders they replace (full_page).")
+VISION_RENDER_BYTES = Counter(
+    "vision_render_bytes_total",
+    "Bytes of page images sent to vision calls (sent) and, with VISION_RENDER_AUDIT=1, "
+    "of the full-page PNGs they replace (full_page_png).")
+INGEST_STAGE_SECONDS = Histogram(
+    "ingest_stage_seconds",
+    "Time per upload ingest stage (parse, formula_scan, visual_scan, render, formula, visual, summaries).")
+CACHE_REQUESTS = Counter(
+    "cache_requests_total", "Cache lookups by cache and result (hit or miss).")
+DOCUMENT_STORE_DOCUMENTS = Gauge(
+    "document_store_documents", "Uploaded documents held in memory.", _uploaded_documents)
+DOCUMENT_STORE_CHUNKS = Gauge(
+    "document_store_chunks", "Chunks of uploaded documents held in memory.", _uploaded_chunks)
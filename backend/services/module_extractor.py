@@ -1,58 +1,237 @@
 """
-Extract formula and visual modules from PDF pages using AI.
+Extract formula and visual modules from PDF pages, locally where the
+layout allows and with AI otherwise.
 Coordinates between pdf_parser (raw extraction) and ai_provider (LLM calls).
 """
 
 import asyncio
 import base64
 import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
 
 import fitz  # PyMuPDF
 
 from models import FormulaModule, VisualModule, ModuleRef, Symbol
+from services.formula_detector import score_formula_page
+from services.formula_layout import PageExpression, extract_page_expressions, normalize_expression
+from services.metrics import CACHE_REQUESTS, INGEST_STAGE_SECONDS, VISION_RENDER_BYTES, VISION_RENDER_PIXELS
+from services.usage import (
+    IngestBudget,
+    current_budget,
+    current_scope,
+    estimate_image_tokens,
+    estimate_text_tokens,
+    record_skipped,
+)
+from services.vector_graph import extract_line_graph
+from services.visual_detector import VisualRegion, figure_regions, union_rect
 
 logger = logging.getLogger(__name__)
 
 MAX_CONCURRENCY = 5
 
-# Indicators that suggest a page contains mathematical formulas
-_FORMULA_INDICATORS = [
-    "=", "\u2211", "\u222B", "\u2202", "\u221A", "\u03A3", "\u220F",
-    "sum_", "exp(", "log(", "sin(", "cos(", "tan(",
-    "argmax", "argmin", "softmax", "sigmoid",
-    "^2", "^n", "f(x)", "P(", "E[", "d/dx",
-    "\\frac", "\\sum", "\\int", "\\partial",
-]
+# Vision render budget: never above VISION_MAX_DPI, never above VISION_MAX_PIXELS
+VISION_MAX_DPI = 150
+VISION_MAX_PIXELS = int(os.getenv("VISION_MAX_PIXELS", str(1024 * 1024)))
+# Padding around the figure bbox so titles, axis labels and ticks stay in frame
+VISION_CROP_MARGIN = 36
+# Crops covering more than this share of the page are sent as the full page
+VISION_FULL_PAGE_RATIO = 0.85
+VISION_JPEG_QUALITY = 80
+# Line-art PNGs above this size are also tried as JPEG, keeping the smaller
+VISION_PNG_MAX_BYTES = 300 * 1024
+# Also render the old full-page PNG to report exact bytes saved per page (an
+# extra full-page render per vision page, so off by default; pixel savings
+# are always reported from the crop geometry)
+VISION_RENDER_AUDIT = os.getenv("VISION_RENDER_AUDIT", "") == "1"
+
+# Images repeated on at least this share of pages (and this many pages) are
+# template assets (logos, slide backgrounds) and never trigger a vision call
+TEMPLATE_IMAGE_PAGE_RATIO = 0.5
+TEMPLATE_IMAGE_MIN_PAGES = 3
+
+# Token estimates used to fit LLM jobs into an ingest budget
+LLM_PROMPT_OVERHEAD_TOKENS = 300
+LLM_OUTPUT_TOKENS = 400
+LLM_PROMPT_TEXT_CHARS = 2000
+
+# Explanations (purpose, symbols, example) keyed by normalized expression, so
+# an expression seen on any page or document is explained by the LLM once;
+# least recently used entries are evicted past FORMULA_EXPLANATION_CACHE_SIZE
+FORMULA_EXPLANATION_CACHE_SIZE = int(os.getenv("FORMULA_EXPLANATION_CACHE_SIZE", "2048"))
+_formula_explanations: OrderedDict[str, dict] = OrderedDict()
+
+
+def _cached_explanation(key: str) -> dict | None:
+    f = _formula_explanations.get(key)
+    if f is not None:
+        _formula_explanations.move_to_end(key)
+    return f
+
+
+def _store_explanation(key: str, f: dict) -> None:
+    _formula_explanations[key] = f
+    _formula_explanations.move_to_end(key)
+    while len(_formula_explanations) > FORMULA_EXPLANATION_CACHE_SIZE:
+        _formula_explanations.popitem(last=False)
+
+
+def _page_figure_regions(page: fitz.Page) -> list[VisualRegion]:
+    """Drawing regions the geometric detector scores as a line graph or flowchart."""
+    try:
+        return figure_regions(page.get_drawings(), page.rect)
+    except Exception:
+        return []
+
+
+@dataclass
+class TemplateImages:
+    """Image xrefs and content digests that repeat across most pages."""
+
+    xrefs: set[int]
+    digests: set[bytes]
+
+    def is_template(self, info: dict) -> bool:
+        xref = info.get("xref", 0)
+        return (xref != 0 and xref in self.xrefs) or info.get("digest") in self.digests
+
 
+def _scan_page_images(doc: fitz.Document) -> list[list[dict]]:
+    """Per-page image placements with xrefs and content hashes."""
+    return [page.get_image_info(hashes=True, xrefs=True) for page in doc]
 
-def _has_formula_indicators(text: str) -> bool:
-    """Heuristic: does this page text likely contain formulas?"""
-    text_lower = text.lower()
-    matches = sum(1 for ind in _FORMULA_INDICATORS if ind.lower() in text_lower)
-    return matches >= 2
 
+def _find_template_images(page_images: list[list[dict]]) -> TemplateImages:
+    """Count on how many pages each image xref/digest appears; frequent ones are template assets."""
+    xref_pages: dict[int, int] = {}
+    digest_pages: dict[bytes, int] = {}
+    for infos in page_images:
+        # Count each asset once per page, by xref and by content (re-embedded copies differ in xref)
+        for xref in {i["xref"] for i in infos if i.get("xref")}:
+            xref_pages[xref] = xref_pages.get(xref, 0) + 1
+        for digest in {i["digest"] for i in infos if i.get("digest")}:
+            digest_pages[digest] = digest_pages.get(digest, 0) + 1
 
-def _has_visual_indicators(page: fitz.Page) -> bool:
-    """Check if a page likely contains visual elements (images or drawings)."""
-    images = page.get_images(full=True)
+    threshold = max(TEMPLATE_IMAGE_MIN_PAGES, TEMPLATE_IMAGE_PAGE_RATIO * len(page_images))
+    return TemplateImages(
+        xrefs={x for x, n in xref_pages.items() if n >= threshold},
+        digests={d for d, n in digest_pages.items() if n >= threshold},
+    )
+
+
+def _has_visual_indicators(
+    page: fitz.Page,
+    regions: list[VisualRegion] | None = None,
+    images: list[dict] | None = None,
+) -> bool:
+    """Check if a page likely contains a visual worth a vision call:
+    a non-template raster image, or vector drawings that look like a line graph or flowchart."""
+    if images is None:
+        images = page.get_image_info()
     if images:
         return True
-    try:
-        drawings = page.get_drawings()
-        if len(drawings) > 5:
-            return True
-    except Exception:
-        pass
-    return False
+    if regions is None:
+        regions = _page_figure_regions(page)
+    return bool(regions)
+
+
+@dataclass
+class RenderedPage:
+    """A page (or figure crop) encoded for a vision call."""
+
+    image_base64: str
+    mime_type: str
+    width: int
+    height: int
+    encoded_bytes: int
+    # Pixel count of the full-page VISION_MAX_DPI render this replaces
+    baseline_pixels: int
+    # Size of that full-page PNG; only measured when VISION_RENDER_AUDIT is set
+    baseline_bytes: int | None = None
+
+    @property
+    def bytes_saved(self) -> int | None:
+        if self.baseline_bytes is None:
+            return None
+        return self.baseline_bytes - self.encoded_bytes
+
+
+def _figure_bbox(
+    page: fitz.Page,
+    regions: list[VisualRegion] | None = None,
+    images: list[dict] | None = None,
+) -> fitz.Rect | None:
+    """Union of detected figure regions and image bboxes, padded and clipped to the page."""
+    if regions is None:
+        regions = _page_figure_regions(page)
+    if images is None:
+        images = page.get_image_info()
+    rects = [r.bbox for r in regions]
+    rects += [fitz.Rect(info["bbox"]) for info in images]
+    if not rects:
+        return None
+    m = VISION_CROP_MARGIN
+    return (union_rect(rects) + (-m, -m, m, m)) & page.rect
+
+
+def _render_page_for_vision(
+    page: fitz.Page,
+    regions: list[VisualRegion] | None = None,
+    images: list[dict] | None = None,
+) -> RenderedPage:
+    """Render the figure region of a page at the smallest useful size.
+
+    Crops to the figure bbox, scales to fit VISION_MAX_PIXELS (capped at
+    VISION_MAX_DPI), and encodes it as PNG or, for raster content and large
+    PNGs, as JPEG when that comes out smaller.
+    """
+    if images is None:
+        images = page.get_image_info()
+    clip = _figure_bbox(page, regions, images)
+    page_area = page.rect.width * page.rect.height
+    if clip is None or clip.width * clip.height > VISION_FULL_PAGE_RATIO * page_area:
+        clip = page.rect
+
+    max_zoom = VISION_MAX_DPI / 72.0
+    zoom = min(max_zoom, math.sqrt(VISION_MAX_PIXELS / (clip.width * clip.height)))
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), clip=clip, alpha=False)
+
+    # Raster content is tried as JPEG too; flat or synthetic images can still
+    # come out smaller as PNG, so the smaller encoding wins either way
+    has_raster = any(fitz.Rect(info["bbox"]).intersects(clip) for info in images)
+    data, mime = pix.tobytes("png"), "image/png"
+    if has_raster or len(data) > VISION_PNG_MAX_BYTES:
+        jpeg = pix.tobytes("jpeg", jpg_quality=VISION_JPEG_QUALITY)
+        if len(jpeg) < len(data):
+            data, mime = jpeg, "image/jpeg"
+
+    return RenderedPage(
+        image_base64=base64.b64encode(data).decode("utf-8"),
+        mime_type=mime,
+        width=pix.width,
+        height=pix.height,
+        encoded_bytes=len(data),
+        baseline_pixels=int(page_area * max_zoom * max_zoom),
+    )
+
+
+def _full_page_png_bytes(page: fitz.Page) -> int:
+    """Size of the full-page VISION_MAX_DPI PNG that vision calls used to send."""
+    zoom = VISION_MAX_DPI / 72.0
+    return len(page.get_pixmap(matrix=fitz.Matrix(zoom, zoom)).tobytes("png"))
 
 
-def _render_page_to_base64(page: fitz.Page, dpi: int = 150) -> str:
-    """Render a PDF page to a base64-encoded PNG string."""
-    zoom = dpi / 72.0
-    mat = fitz.Matrix(zoom, zoom)
-    pix = page.get_pixmap(matrix=mat)
-    png_bytes = pix.tobytes("png")
-    return base64.b64encode(png_bytes).decode("utf-8")
+@asynccontextmanager
+async def _llm_slot(semaphore: asyncio.Semaphore, stage: str):
+    """Hold an LLM concurrency slot, timing the work done in it as an ingest stage."""
+    async with semaphore:
+        with INGEST_STAGE_SECONDS.time(stage=stage):
+            yield
 
 
 async def _extract_page_formulas(
@@ -62,7 +241,7 @@ async def _extract_page_formulas(
     semaphore: asyncio.Semaphore,
 ) -> list[FormulaModule]:
     """Extract formulas from a single page via LLM."""
-    async with semaphore:
+    async with _llm_slot(semaphore, "formula"):
         try:
             raw_formulas = await ai.extract_formulas_from_text(page_no, page_text)
             result = []
@@ -85,17 +264,68 @@ async def _extract_page_formulas(
             return []
 
 
+async def _explain_page_expressions(
+    ai,
+    page_no: int,
+    page_text: str,
+    expressions: list[PageExpression],
+    semaphore: asyncio.Semaphore,
+) -> list[FormulaModule]:
+    """Formula modules for expressions rebuilt from the page layout.
+
+    The LLM only writes purpose, symbols and example, and only for
+    expressions not already explained. If it fails, or `ai` is None (no
+    budget left), the located expressions are still returned, with empty
+    explanations.
+    """
+    keys = [normalize_expression(e.expression) for e in expressions]
+    explained = {k: f for k in set(keys) if (f := _cached_explanation(k)) is not None}
+    missing = list(dict.fromkeys(k for k in keys if k not in explained))
+    CACHE_REQUESTS.inc(len(set(keys)) - len(missing), cache="formula_explanations", result="hit")
+    CACHE_REQUESTS.inc(len(missing), cache="formula_explanations", result="miss")
+    if missing and ai is not None:
+        async with _llm_slot(semaphore, "formula"):
+            try:
+                # One entry per expression, matched by the index the model echoes
+                written = await ai.explain_formulas(page_no, missing, page_text)
+                for key, f in zip(missing, written):
+                    if f.get("purpose"):
+                        explained[key] = f
+                        _store_explanation(key, f)
+            except Exception as e:
+                logger.warning("Formula explanation failed for page %d: %s", page_no, e)
+
+    result = []
+    for idx, (expr, key) in enumerate(zip(expressions, keys)):
+        f = explained.get(key, {})
+        result.append(FormulaModule(
+            formulaId=f"f{page_no}-{idx + 1}",
+            pageNo=page_no,
+            expression=expr.expression,
+            purpose=f.get("purpose", ""),
+            symbols=[
+                Symbol(sym=s.get("sym", ""), meaning=s.get("meaning", ""))
+                for s in f.get("symbols", [])
+            ],
+            example=f.get("example", ""),
+            bbox=[round(v, 1) for v in expr.bbox],
+        ))
+    return result
+
+
 async def _extract_page_visuals(
     ai,
     page_no: int,
     page_text: str,
-    image_base64: str,
+    image: RenderedPage,
     semaphore: asyncio.Semaphore,
 ) -> list[VisualModule]:
     """Extract visuals from a single page via vision LLM."""
-    async with semaphore:
+    async with _llm_slot(semaphore, "visual"):
         try:
-            raw_visuals = await ai.analyze_page_image(page_no, page_text, image_base64)
+            raw_visuals = await ai.analyze_page_image(
+                page_no, page_text, image.image_base64, image.mime_type
+            )
             result = []
             for idx, v in enumerate(raw_visuals):
                 vis_type = v.get("type", "")
@@ -115,11 +345,139 @@ async def _extract_page_visuals(
             return []
 
 
+def _local_line_graphs(
+    page: fitz.Page, regions: list[VisualRegion], images: list[dict]
+) -> list[dict] | None:
+    """Data for every figure on a page when all are vector line graphs with readable axes.
+
+    Returns None when any figure needs the vision model (raster images,
+    flowcharts, graphs without tick labels).
+    """
+    if images or not regions or any(r.kind != "line_graph" for r in regions):
+        return None
+    graphs = []
+    for region in regions:
+        try:
+            data = extract_line_graph(page, region)
+        except Exception as e:
+            logger.warning("Vector graph extraction failed on page %d: %s", page.number + 1, e)
+            return None
+        if data is None:
+            return None
+        graphs.append(data)
+    return graphs
+
+
+def _graph_title(data: dict) -> str:
+    if data["xLabel"] and data["yLabel"]:
+        return f"{data['yLabel']} vs {data['xLabel']}"
+    return "Line graph"
+
+
+def _graph_description(data: dict) -> str:
+    x_label = data["xLabel"] or "x"
+    y_label = data["yLabel"] or "y"
+    first, last = data["points"][0][1], data["points"][-1][1]
+    trend = "rises" if last > first else "falls" if last < first else "ends level"
+    return (
+        f"A line graph of {y_label} against {x_label} from {data['xMin']} to {data['xMax']}; "
+        f"{y_label} {trend} from {first} to {last}."
+    )
+
+
+async def _describe_page_graphs(
+    ai,
+    page_no: int,
+    page_text: str,
+    graphs: list[dict],
+    semaphore: asyncio.Semaphore,
+) -> list[VisualModule]:
+    """Wrap locally extracted line graphs as modules, titled by a text-only LLM
+    call (or from the extracted data alone when `ai` is None)."""
+    result = []
+    for idx, data in enumerate(graphs):
+        title, description = _graph_title(data), _graph_description(data)
+        if ai is not None:
+            async with _llm_slot(semaphore, "visual"):
+                try:
+                    written = await ai.describe_line_graph(page_no, page_text, data)
+                    title = written.get("title") or title
+                    description = written.get("description") or description
+                    for key in ("xLabel", "yLabel"):
+                        if not data[key] and written.get(key):
+                            data[key] = written[key]
+                except Exception as e:
+                    logger.warning("Graph description failed for page %d: %s", page_no, e)
+        result.append(VisualModule(
+            visualId=f"v{page_no}-{idx + 1}",
+            pageNo=page_no,
+            type="line_graph",
+            title=title,
+            description=description,
+            data=data,
+        ))
+    return result
+
+
+def _plan_llm_jobs(page_data: list[dict], budget: IngestBudget | None) -> set[tuple[int, str]]:
+    """(page_no, job) pairs to send to the LLM under the ingest budget.
+
+    Jobs are admitted by value until the vision-call cap or the estimated
+    token budget runs out: vision pages first (nothing else can read them,
+    vector-detected figures ahead of raster-only pages), then formula
+    extraction from text, then explanations for locally rebuilt expressions
+    and titles for local graphs, which degrade to local-only modules. Ties
+    go to the more formula-like page, then the earlier page.
+    """
+    jobs: list[tuple[float, int, str, int]] = []  # (priority, page_no, job, estimated tokens)
+    for pd in page_data:
+        page_no, text_tokens = pd["page_no"], estimate_text_tokens(pd["text"][:LLM_PROMPT_TEXT_CHARS])
+        if pd["expressions"]:
+            expr_tokens = sum(estimate_text_tokens(e.expression) for e in pd["expressions"])
+            jobs.append((1 + pd["formula_score"], page_no, "expressions",
+                         LLM_PROMPT_OVERHEAD_TOKENS + expr_tokens + 100 + LLM_OUTPUT_TOKENS))
+        elif pd["check_formulas"]:
+            jobs.append((2 + pd["formula_score"], page_no, "formulas",
+                         LLM_PROMPT_OVERHEAD_TOKENS + text_tokens + LLM_OUTPUT_TOKENS))
+        if pd["check_visuals"] and pd["image"]:
+            image_tokens = estimate_image_tokens(pd["image"].width, pd["image"].height)
+            jobs.append((3 + (0.5 if pd["figure_regions"] else 0), page_no, "vision",
+                         LLM_PROMPT_OVERHEAD_TOKENS + text_tokens + image_tokens + LLM_OUTPUT_TOKENS))
+        if pd["graphs"]:
+            jobs.append((1, page_no, "graphs",
+                         len(pd["graphs"]) * (LLM_PROMPT_OVERHEAD_TOKENS + 150 + LLM_OUTPUT_TOKENS)))
+
+    if budget is None or not budget.limited:
+        return {(page_no, job) for _, page_no, job, _ in jobs}
+
+    admitted: set[tuple[int, str]] = set()
+    skipped: dict[str, int] = {}
+    tokens_left = budget.tokens_left()
+    vision_left = budget.max_vision_calls or math.inf
+    for _, page_no, job, tokens in sorted(jobs, key=lambda j: (-j[0], j[1])):
+        if tokens > tokens_left or (job == "vision" and vision_left < 1):
+            skipped[job] = skipped.get(job, 0) + 1
+            continue
+        admitted.add((page_no, job))
+        tokens_left -= tokens
+        vision_left -= job == "vision"
+
+    if skipped:
+        doc_id = current_scope().doc_id
+        for job, count in skipped.items():
+            record_skipped(doc_id, job, count)
+        logger.info(
+            "Ingest budget (%s): admitted %d of %d LLM jobs, skipped %s",
+            budget.to_dict(), len(admitted), len(jobs), skipped,
+        )
+    return admitted
+
+
 async def extract_all_modules(
-    pdf_bytes: bytes,
+    doc: fitz.Document,
     page_texts: dict[int, str],
 ) -> tuple[list[FormulaModule], list[VisualModule], dict[int, list[ModuleRef]]]:
-    """Extract formula and visual modules from all pages of a PDF.
+    """Extract formula and visual modules from all pages of an open PDF.
 
     Returns (formulas, visuals, page_module_refs).
     """
@@ -127,43 +485,119 @@ async def extract_all_modules(
 
     ai = get_ai_provider()
     if ai is None:
-        logger.info("AI provider not available, skipping module extraction")
-        return [], [], {}
+        logger.info("AI provider not available; extracting local modules only")
 
     # Pre-compute all synchronous data before any async work
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
+    page_images = _scan_page_images(doc)
+    template = _find_template_images(page_images)
+    template_skips = 0
     page_data: list[dict] = []
+    formula_scan = visual_scan = 0.0
 
     for page_idx in range(len(doc)):
         page = doc[page_idx]
         page_no = page_idx + 1
         text = page_texts.get(page_no, "")
 
-        check_formulas = _has_formula_indicators(text)
-        check_visuals = _has_visual_indicators(page)
-        image_b64 = _render_page_to_base64(page) if check_visuals else None
+        started = time.perf_counter()
+        formula = score_formula_page(page)
+        check_formulas = formula.is_formula
+        expressions = extract_page_expressions(page) if check_formulas else []
+        formula_scan += time.perf_counter() - started
+
+        started = time.perf_counter()
+        regions = _page_figure_regions(page)
+        images = [i for i in page_images[page_idx] if not template.is_template(i)]
+        check_visuals = _has_visual_indicators(page, regions, images)
+        if not check_visuals and len(images) < len(page_images[page_idx]):
+            template_skips += 1
+        graphs = _local_line_graphs(page, regions, images) if check_visuals else None
+        visual_scan += time.perf_counter() - started
+
+        # Pages only the vision model can read aren't rendered without a provider
+        needs_vision = check_visuals and graphs is None and ai is not None
+        image = None
+        if needs_vision:
+            with INGEST_STAGE_SECONDS.time(stage="render"):
+                image = _render_page_for_vision(page, regions, images)
+        if image is not None:
+            VISION_RENDER_PIXELS.inc(image.width * image.height, kind="sent")
+            VISION_RENDER_PIXELS.inc(image.baseline_pixels, kind="full_page")
+            VISION_RENDER_BYTES.inc(image.encoded_bytes, kind="sent")
+            if VISION_RENDER_AUDIT:
+                image.baseline_bytes = _full_page_png_bytes(page)
+                VISION_RENDER_BYTES.inc(image.baseline_bytes, kind="full_page_png")
+            logger.info(
+                "Page %d vision render: %dx%d %s, %d bytes, %.0f%% of full-page pixels%s",
+                page_no, image.width, image.height, image.mime_type, image.encoded_bytes,
+                100 * image.width * image.height / image.baseline_pixels,
+                f", {image.bytes_saved} bytes saved" if image.bytes_saved is not None else "",
+            )
 
         page_data.append({
             "page_no": page_no,
             "text": text,
             "check_formulas": check_formulas,
+            "formula_score": formula.score,
+            "expressions": expressions,
             "check_visuals": check_visuals,
-            "image_b64": image_b64,
+            "graphs": graphs,
+            "image": image,
+            "figure_regions": len(regions),
         })
 
-    doc.close()
+    INGEST_STAGE_SECONDS.observe(formula_scan, stage="formula_scan")
+    INGEST_STAGE_SECONDS.observe(visual_scan, stage="visual_scan")
+
+    logger.info(
+        "Formula detector flagged %d of %d pages; expressions rebuilt locally on %d",
+        sum(1 for pd in page_data if pd["check_formulas"]), len(page_data),
+        sum(1 for pd in page_data if pd["expressions"]),
+    )
 
-    # Dispatch async LLM calls
+    local_pages = sum(1 for pd in page_data if pd["graphs"])
+    if local_pages:
+        logger.info("Vector line graphs extracted locally on %d pages (no vision call)", local_pages)
+
+    if template.xrefs or template.digests:
+        logger.info(
+            "Template images: %d repeated assets; %d pages skipped vision calls",
+            max(len(template.xrefs), len(template.digests)), template_skips,
+        )
+
+    rendered = [pd["image"] for pd in page_data if pd["image"] is not None]
+    if rendered:
+        logger.info(
+            "Rendered %d pages for vision: %d bytes total%s",
+            len(rendered),
+            sum(r.encoded_bytes for r in rendered),
+            f", {sum(r.bytes_saved for r in rendered)} bytes saved"
+            if VISION_RENDER_AUDIT else "",
+        )
+
+    # Dispatch async LLM calls, within the ingest budget. Without a provider
+    # none are admitted, and local expressions and graphs are kept as they are
+    admitted = _plan_llm_jobs(page_data, current_budget()) if ai is not None else set()
     semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
     tasks = []
 
     for pd in page_data:
-        if pd["check_formulas"]:
-            tasks.append(("formula", pd["page_no"],
-                          _extract_page_formulas(ai, pd["page_no"], pd["text"], semaphore)))
-        if pd["check_visuals"] and pd["image_b64"]:
-            tasks.append(("visual", pd["page_no"],
-                          _extract_page_visuals(ai, pd["page_no"], pd["text"], pd["image_b64"], semaphore)))
+        page_no = pd["page_no"]
+        if pd["expressions"]:
+            # Without budget the expressions are kept, unexplained
+            page_ai = ai if (page_no, "expressions") in admitted else None
+            tasks.append(("formula", page_no,
+                          _explain_page_expressions(page_ai, page_no, pd["text"], pd["expressions"], semaphore)))
+        elif pd["check_formulas"] and (page_no, "formulas") in admitted:
+            tasks.append(("formula", page_no,
+                          _extract_page_formulas(ai, page_no, pd["text"], semaphore)))
+        if pd["check_visuals"] and pd["image"] and (page_no, "vision") in admitted:
+            tasks.append(("visual", page_no,
+                          _extract_page_visuals(ai, page_no, pd["text"], pd["image"], semaphore)))
+        if pd["graphs"]:
+            page_ai = ai if (page_no, "graphs") in admitted else None
+            tasks.append(("visual", page_no,
+                          _describe_page_graphs(page_ai, page_no, pd["text"], pd["graphs"], semaphore)))
 
     if not tasks:
         return [], [], {}
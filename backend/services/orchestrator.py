@@ -6,6 +6,7 @@ Falls back to conversational chat when no tool matches.
 
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
 import os
@@ -16,17 +17,30 @@ from langchain_core.tools import tool
 from langchain_openai import ChatOpenAI
 from langgraph.prebuilt import create_react_agent
 
-from models import VoiceState
+from models import QACitation, QAResponse, VoiceState
+from services import answer_cache, prompts
+from services.ai_cassette import cassette_mode, wrap_chat_model
+from services.ai_provider import AI_BREAKER
+from services.circuit_breaker import BreakerChatModel, CircuitOpenError
+from services.conversation_memory import get_memory
+from services.deadline import race_with_fallback
+from services.metrics import AGENT_SECONDS, TOOL_SECONDS
+from services.tracing import LLMSpanHandler, current_trace
+from services.usage import UsageHandler
 
 logger = logging.getLogger(__name__)
 
+# Longest a voice command waits for the agent (routing, tools and reply)
+ORCHESTRATOR_DEADLINE_MS = int(os.getenv("ORCHESTRATOR_DEADLINE_MS", "10000"))
+
 # ─── Shared state passed to tools via module-level var ───
 _current_state: VoiceState | None = None
 _current_context: dict[str, Any] = {}
+# The server's event loop, for tools (run in worker threads) to schedule coroutines on
+_loop: asyncio.AbstractEventLoop | None = None
 
-# ─── Conversation history for follow-up Q&A (keyed by docId) ───
-_conversation_history: dict[str, list[dict[str, str]]] = {}
-MAX_HISTORY = 10
+# ─── Background history compaction tasks (held so they aren't GC'd) ───
+_background_tasks: set[asyncio.Task] = set()
 
 
 def _get_state() -> VoiceState:
@@ -38,10 +52,16 @@ def _get_context() -> dict[str, Any]:
     return _current_context
 
 
+def _get_loop() -> asyncio.AbstractEventLoop:
+    assert _loop is not None
+    return _loop
+
+
 # ─── Tools ───
 
 
 @tool
+@TOOL_SECONDS.timed(span="tool.reading_control", tool="reading_control")
 def reading_control(command: str) -> str:
     """Control the reading flow. Use this when the student wants to navigate through the document.
 
@@ -116,9 +136,12 @@ def reading_control(command: str) -> str:
         return json.dumps({"action": None, "speech": None})
 
     if command == "summarize":
+        from services.demo_store import get_page_summary
+        summary = get_page_summary(st.docId, st.pageNo)
         return json.dumps({
             "action": "SUMMARIZE",
-            "speech": None,  # Will be handled by frontend or a separate call
+            # Precomputed at ingest; frontend falls back to the page text if missing
+            "speech": f"Summary of page {st.pageNo}: {summary}" if summary else None,
         })
 
     if command == "end":
@@ -131,6 +154,7 @@ def reading_control(command: str) -> str:
 
 
 @tool
+@TOOL_SECONDS.timed(span="tool.ask_question", tool="ask_question")
 def ask_question(question: str) -> str:
     """Answer a question about the document content using the provided context chunks.
     Use this when the student asks a question about what they're reading,
@@ -139,64 +163,75 @@ def ask_question(question: str) -> str:
     chunks = ctx.get("nearby_chunks", [])
     st = _get_state()
 
-    # Get conversation history for context
-    history = _conversation_history.get(st.docId, [])
-
-    # Try AI-powered Q&A first
-    try:
-        from services.ai_provider import get_ai_provider
-        ai = get_ai_provider()
-        if ai is not None:
-            import asyncio
-            chunk_dicts = [{"chunkId": c["chunkId"], "pageNo": c["pageNo"], "text": c["text"]} for c in chunks]
-
-            # Build question with conversation history for follow-ups
-            full_question = question
-            if history:
-                history_text = "\n".join(
-                    f"Student: {h['q']}\nTutor: {h['a']}" for h in history[-5:]
-                )
-                full_question = f"Previous conversation:\n{history_text}\n\nNew question: {question}"
-
-            loop = asyncio.get_event_loop()
-            result = loop.run_until_complete(ai.generate_grounded_qa(full_question, chunk_dicts))
-            answer = result.get("answer", "I couldn't find an answer.")
-
-            # Record in history
-            _record_qa(st.docId, question, answer)
-
-            return json.dumps({
-                "action": "ENTER_QA",
-                "speech": answer,
-            })
-    except Exception as e:
-        logger.warning("AI Q&A failed, using fallback: %s", e)
-
-    # Fallback: lexical search
-    from models import Chunk
-    from services.qa_engine import answer_question
-    chunk_models = [Chunk(**c) for c in chunks]
-    result = answer_question(question, chunk_models, st.pageNo)
-
-    _record_qa(st.docId, question, result.answer)
+    # Summary + recent turns, bounded by the history token budget
+    history_text = get_memory(st.docId).render()
+
+    def fallback() -> str:
+        # Lexical search
+        from models import Chunk
+        from services.qa_engine import answer_question
+        return answer_question(question, [Chunk(**c) for c in chunks], st.pageNo).answer
+
+    from services.ai_provider import get_ai_provider
+    ai = get_ai_provider()
+    chunk_ids = [c["chunkId"] for c in chunks]
+    # Only standalone questions share answers; follow-ups depend on the history
+    cached = answer_cache.lookup(st.docId, question, chunk_ids) if ai is not None and not history_text else None
+    if cached is not None:
+        _record_qa(st.docId, question, cached.answer)
+        return json.dumps({"action": "ENTER_QA", "speech": cached.answer})
+    repaired = False
+
+    async def ai_call() -> str:
+        nonlocal repaired
+        chunk_dicts = [{"chunkId": c["chunkId"], "pageNo": c["pageNo"], "text": c["text"]} for c in chunks]
+        # Build question with conversation history for follow-ups
+        full_question = question
+        if history_text:
+            full_question = f"Previous conversation:\n{history_text}\n\nNew question: {question}"
+        result = await ai.generate_grounded_qa(full_question, chunk_dicts)
+        repaired = result.get("repaired", False)
+        answer = result.get("answer", "I couldn't find an answer.")
+        if not history_text and not repaired:
+            answer_cache.store(st.docId, question, chunk_ids, QAResponse(
+                answer=answer,
+                citations=[QACitation(pageNo=c["pageNo"], chunkId=c["chunkId"]) for c in result.get("citations", [])],
+            ))
+        return answer
+
+    # Tools run in a worker thread: race AI against lexical on the server's loop.
+    # Follow-ups depend on the history, so it is part of the key.
+    key = (st.docId, st.pageNo, question.strip().lower(), history_text)
+    answer = asyncio.run_coroutine_threadsafe(
+        race_with_fallback("voice_qa", key, ai_call if ai else None, fallback, keep=lambda _: not repaired),
+        _get_loop(),
+    ).result()
+
+    _record_qa(st.docId, question, answer)
 
     return json.dumps({
         "action": "ENTER_QA",
-        "speech": result.answer,
+        "speech": answer,
     })
 
 
 def _record_qa(doc_id: str, question: str, answer: str) -> None:
     """Store a Q&A pair in conversation history."""
-    if doc_id not in _conversation_history:
-        _conversation_history[doc_id] = []
-    _conversation_history[doc_id].append({"q": question, "a": answer})
-    # Trim to max
-    if len(_conversation_history[doc_id]) > MAX_HISTORY:
-        _conversation_history[doc_id] = _conversation_history[doc_id][-MAX_HISTORY:]
+    get_memory(doc_id).record(question, answer)
+
+
+def _schedule_history_compaction(doc_id: str) -> None:
+    """Fold older turns into the running summary without blocking the reply."""
+    memory = get_memory(doc_id)
+    if not memory.needs_compaction():
+        return
+    task = asyncio.create_task(memory.compact())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
 
 
 @tool
+@TOOL_SECONDS.timed(span="tool.formula_control", tool="formula_control")
 def formula_control(command: str) -> str:
     """Control the formula tutor mode. Use this when the student is on a formula page.
 
@@ -233,6 +268,7 @@ def formula_control(command: str) -> str:
 
 
 @tool
+@TOOL_SECONDS.timed(span="tool.visual_control", tool="visual_control")
 def visual_control(command: str, target: str = "") -> str:
     """Control the visual explorer mode. Use this when the student is exploring a graph, chart, or diagram.
 
@@ -317,7 +353,7 @@ def _get_agent():
         return _agent
 
     api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
+    if not api_key and cassette_mode() != "replay":
         return None
 
     model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
@@ -326,7 +362,13 @@ def _get_agent():
         api_key=api_key,
         temperature=0.2,
         max_retries=1,
-    )
+    ) if api_key else None
+    llm = wrap_chat_model(llm, "orchestrator")
+    if llm is None:
+        return None
+    # Guard each model call, not whole agent runs: tool time isn't OpenAI's,
+    # and ask_question's own OpenAI call needs the breaker between turns
+    llm = BreakerChatModel(inner=llm, breaker=AI_BREAKER)
 
     _agent = create_react_agent(
         llm,
@@ -336,86 +378,71 @@ def _get_agent():
     return _agent
 
 
+def _mode_prompt(state: VoiceState) -> prompts.PromptTemplate:
+    return prompts.ORCHESTRATOR.get(state.mode, prompts.ORCHESTRATOR["READING"])
+
+
 def _build_system_prompt(state: VoiceState, context: dict[str, Any]) -> str:
+    """Static per-mode instructions first, then the current state."""
     chunk_text = context.get("chunk_text", "")
-    mode = state.mode
-
-    if mode == "FORMULA":
-        mode_block = """The current mode is FORMULA. Use formula_control for:
-- "continue"/"next"/"keep going" -> formula_control(command="continue") to EXIT formula mode
-- "symbols" -> formula_control(command="symbols")
-- "example" -> formula_control(command="example")
-- "intuition"/"simple"/"break it down" -> formula_control(command="intuition")
-- "go back"/"back" -> reading_control(command="back")"""
-    elif mode == "VISUAL":
-        mode_block = """The current mode is VISUAL. Use visual_control for:
-- "start exploring"/"explore" -> visual_control(command="start_exploring")
-- "what is here"/"what's here" -> visual_control(command="what_is_here")
-- "describe"/"describe the graph"/"tell me about this graph"/"summarize"/"what is this" -> visual_control(command="describe")
-- "mark this"/"mark" -> visual_control(command="mark")
-- "guide me to X" -> visual_control(command="guide_to", target="X")
-- "I'm done"/"done"/"finished"/"continue"/"stop" -> visual_control(command="done")
-- "next key point" -> visual_control(command="next_key_point")
-- "go back"/"exit" -> visual_control(command="quick_exit")"""
-    else:
-        mode_block = """The current mode is READING. Use reading_control for:
-- "continue"/"next"/"keep going"/"go on"/"move on"/"carry on" -> reading_control(command="next")
-- "go back"/"back"/"previous" -> reading_control(command="back")
-- "where am I"/"what page" -> reading_control(command="where_am_i")
-- "repeat"/"again"/"say that again" -> reading_control(command="repeat")
-- "help"/"options"/"what can I say" -> reading_control(command="help")
-- "stop"/"quiet"/"silence" -> reading_control(command="stop")
-- "summarize"/"summary" -> reading_control(command="summarize")
-- "end"/"finish"/"exit"/"I'm done reading" -> reading_control(command="end")"""
-
+    template = _mode_prompt(state)
     formula_info = f"\nFormula step: {state.formulaStep}" if state.formulaStep else ""
     text_info = f'\nCurrent text: "{chunk_text[:200]}"' if chunk_text else ""
+    state_block = template.fill(
+        mode=state.mode,
+        page_no=state.pageNo,
+        chunk=state.chunkIndex + 1,
+        formula_info=formula_info,
+        text_info=text_info,
+    )
+    return f"{template.system_prompt}\n\n{state_block}"
 
-    return f"""You are an accessibility-first tutor controlling a voice-first reading app for visually impaired students.
-
-Current state: mode={mode}, page {state.pageNo}, chunk {state.chunkIndex + 1}.{formula_info}{text_info}
-
-Given the student's voice command, decide which tool to call.
-
-{mode_block}
-
-Use ask_question when the student asks about the content (e.g. "what does this mean", "explain this", questions starting with what/how/why).
-The student can also ask follow-up questions about previous answers — always use ask_question for these too.
 
-If the command is conversational or doesn't match any tool, respond directly in 1-2 spoken sentences.
-Keep all responses concise -- they will be spoken aloud.
-IMPORTANT: Always respond. Never return empty."""
+_AI_UNAVAILABLE = {
+    "action": None,
+    "speech": "AI is not available. Please use the buttons.",
+    "special": None,
+    "payload": None,
+}
 
 
 async def process(transcript: str, state: VoiceState, context: dict[str, Any]) -> dict[str, Any]:
     """Process a voice transcript through the orchestrator.
     Returns dict with action, speech, special, payload."""
-    global _current_state, _current_context
+    global _current_state, _current_context, _loop
     _current_state = state
     _current_context = context
+    _loop = asyncio.get_running_loop()
 
     agent = _get_agent()
     if agent is None:
         # No AI available — return a fallback
-        return {
-            "action": None,
-            "speech": "AI is not available. Please use the buttons.",
-            "special": None,
-            "payload": None,
-        }
+        return dict(_AI_UNAVAILABLE)
 
     system_prompt = _build_system_prompt(state, context)
 
     try:
-        result = await agent.ainvoke({
-            "messages": [
-                SystemMessage(content=system_prompt),
-                HumanMessage(content=transcript),
-            ]
-        })
+        trace = current_trace()
+        with AGENT_SECONDS.time(span="agent"):
+            result = await asyncio.wait_for(
+                agent.ainvoke(
+                    {
+                        "messages": [
+                            SystemMessage(content=system_prompt),
+                            HumanMessage(content=transcript),
+                        ]
+                    },
+                    config={"callbacks": [UsageHandler()] + ([LLMSpanHandler(trace)] if trace else [])},
+                ),
+                timeout=ORCHESTRATOR_DEADLINE_MS / 1000,
+            )
+        _schedule_history_compaction(state.docId)
 
         # Extract the last message from the agent
         messages = result.get("messages", [])
+        for msg in messages:
+            if getattr(msg, "type", None) == "ai":
+                _mode_prompt(state).record_response(msg)
         if not messages:
             return {"action": None, "speech": "I didn't understand that.", "special": None, "payload": None}
 
@@ -445,6 +472,17 @@ async def process(transcript: str, state: VoiceState, context: dict[str, Any]) -
             "payload": None,
         }
 
+    except CircuitOpenError:
+        # OpenAI is failing; don't make the user wait for it
+        return dict(_AI_UNAVAILABLE)
+    except asyncio.TimeoutError:
+        logger.warning("Orchestrator missed its %d ms deadline", ORCHESTRATOR_DEADLINE_MS)
+        return {
+            "action": None,
+            "speech": "Sorry, that took too long. Please try again.",
+            "special": None,
+            "payload": None,
+        }
     except Exception as e:
         logger.error("Orchestrator error: %s", e)
         return {
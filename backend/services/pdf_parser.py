@@ -1,56 +1,236 @@
 """PDF text extraction using PyMuPDF.
 
-Extracts text page-by-page and chunks by paragraph breaks.
-Optionally extracts formula and visual modules via AI.
+Extracts text blocks page-by-page, orders them by column, and chunks them
+into headings (by font size), paragraphs, bullets and captions of bounded
+length. Optionally extracts formula and visual modules via AI.
 """
 
 import logging
+import os
+import re
 import uuid
+from collections import Counter
+from dataclasses import dataclass
 
 import fitz  # PyMuPDF
 
 from models import DocumentManifest, Chunk, Page, Source
+from services.metrics import INGEST_STAGE_SECONDS
+from services.usage import start_ingest_budget
 
 logger = logging.getLogger(__name__)
 
+# Longest chunk, in characters; CHUNK_MAX_SPEECH_SECONDS (if set) tightens it
+# using a typical text-to-speech rate
+CHUNK_MAX_CHARS = int(os.getenv("CHUNK_MAX_CHARS", "600"))
+CHUNK_MAX_SPEECH_SECONDS = float(os.getenv("CHUNK_MAX_SPEECH_SECONDS", "0"))
+SPEECH_CHARS_PER_SECOND = 15
+# Text at least this much larger than the body size is a heading
+HEADING_SIZE_RATIO = 1.2
+HEADING_MAX_CHARS = 150
+# Blocks closer than this share of the font size continue the same paragraph
+PARAGRAPH_GAP_RATIO = 0.5
+# Blocks wider than this share of the text area span all columns
+FULL_WIDTH_RATIO = 0.55
 
-def parse_pdf(filename: str, pdf_bytes: bytes):
-    """Parse a PDF into manifest + chunks."""
+_BULLET = re.compile(r"^\s*(?:[•▪◦‣∙·\-–*]|\(?\d{1,2}[.)]|\(?[a-z][.)])\s+")
+_CAPTION = re.compile(r"^(?:Figure|Fig\.|Table|Chart|Diagram)\s*\d", re.IGNORECASE)
+_SENTENCE_END = re.compile(r"(?<=[.!?;:])\s+")
+
+
+@dataclass
+class _TextBlock:
+    text: str
+    bbox: fitz.Rect
+    size: float
+    bold: bool
+    lines: int
+
+
+def _max_chunk_chars() -> int:
+    if CHUNK_MAX_SPEECH_SECONDS > 0:
+        return min(CHUNK_MAX_CHARS, int(CHUNK_MAX_SPEECH_SECONDS * SPEECH_CHARS_PER_SECOND))
+    return CHUNK_MAX_CHARS
+
+
+def _page_blocks(page: fitz.Page) -> list[_TextBlock]:
+    """Text blocks with their dominant font size and weight."""
+    blocks = []
+    for block in page.get_text("dict").get("blocks", []):
+        if block.get("type") != 0:
+            continue
+        lines, sizes, bold_chars, total = [], Counter(), 0, 0
+        for line in block.get("lines", []):
+            text = "".join(s["text"] for s in line.get("spans", []))
+            if not text.strip():
+                continue
+            lines.append(text.rstrip())
+            for s in line["spans"]:
+                n = len(s["text"].strip())
+                sizes[round(s["size"], 1)] += n
+                total += n
+                if s["flags"] & 16:
+                    bold_chars += n
+        if not lines:
+            continue
+        blocks.append(_TextBlock(
+            text="\n".join(lines).strip(),
+            bbox=fitz.Rect(block["bbox"]),
+            size=sizes.most_common(1)[0][0],
+            bold=bold_chars >= 0.8 * total,
+            lines=len(lines),
+        ))
+    return blocks
+
+
+def _reading_order(blocks: list[_TextBlock], page_rect: fitz.Rect) -> list[_TextBlock]:
+    """Top-to-bottom bands split by full-width blocks; columns left to right within a band."""
+    if not blocks:
+        return []
+    left = min(b.bbox.x0 for b in blocks)
+    width = max(b.bbox.x1 for b in blocks) - left or page_rect.width
+
+    ordered: list[_TextBlock] = []
+    band: list[_TextBlock] = []
+
+    def flush_band() -> None:
+        columns: list[list[_TextBlock]] = []
+        for b in sorted(band, key=lambda b: b.bbox.x0):
+            col = next((c for c in columns if any(
+                b.bbox.x0 < o.bbox.x1 and o.bbox.x0 < b.bbox.x1 for o in c
+            )), None)
+            if col is None:
+                columns.append([b])
+            else:
+                col.append(b)
+        columns.sort(key=lambda c: min(b.bbox.x0 for b in c))
+        for col in columns:
+            ordered.extend(sorted(col, key=lambda b: b.bbox.y0))
+        band.clear()
+
+    for b in sorted(blocks, key=lambda b: (b.bbox.y0, b.bbox.x0)):
+        if b.bbox.width >= FULL_WIDTH_RATIO * width:
+            flush_band()
+            ordered.append(b)
+        else:
+            band.append(b)
+    flush_band()
+    return ordered
+
+
+def _body_size(pages: list[list[_TextBlock]]) -> float:
+    sizes = Counter()
+    for blocks in pages:
+        for b in blocks:
+            sizes[b.size] += len(b.text)
+    return sizes.most_common(1)[0][0] if sizes else 0.0
+
+
+def _block_type(block: _TextBlock, body_size: float) -> str:
+    if len(block.text) <= HEADING_MAX_CHARS and (
+        block.size >= HEADING_SIZE_RATIO * body_size
+        or (block.bold and block.lines == 1 and block.size >= body_size)
+    ):
+        return "heading"
+    if _CAPTION.match(block.text):
+        return "caption"
+    if _BULLET.match(block.text):
+        return "bullets"
+    return "paragraph"
+
+
+def _dehyphenate(text: str) -> str:
+    return re.sub(r"(\w)-\n(?=[a-z])", r"\1", text)
+
+
+def _split_long(text: str, limit: int) -> list[str]:
+    """Split at sentence ends (then word breaks) into pieces of at most limit chars."""
+    if len(text) <= limit:
+        return [text]
+    pieces: list[str] = []
+    current = ""
+    for sentence in _SENTENCE_END.split(text):
+        while len(sentence) > limit:
+            cut = sentence.rfind(" ", 0, limit)
+            cut = cut if cut > 0 else limit
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.append(sentence[:cut].strip())
+            sentence = sentence[cut:].strip()
+        if current and len(current) + 1 + len(sentence) > limit:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}".strip() if current else sentence
+    if current:
+        pieces.append(current)
+    return [p for p in pieces if p]
+
+
+def _chunk_page(blocks: list[_TextBlock], body_size: float, limit: int) -> list[tuple[str, str]]:
+    """(type, text) chunks for one page's blocks in reading order."""
+    merged: list[tuple[str, _TextBlock, str]] = []
+    for b in blocks:
+        # Small letterless text is figure furniture (tick labels, axis numbers)
+        if b.size < body_size and not any(c.isalpha() for c in b.text):
+            continue
+        kind = _block_type(b, body_size)
+        if merged:
+            prev_kind, prev, prev_text = merged[-1]
+            gap = b.bbox.y0 - prev.bbox.y1
+            same_column = b.bbox.x0 < prev.bbox.x1 and prev.bbox.x0 < b.bbox.x1
+            continues = (
+                kind == prev_kind and kind in ("paragraph", "bullets")
+                and same_column and abs(b.size - prev.size) < 0.5
+                and -0.5 * b.size <= gap <= PARAGRAPH_GAP_RATIO * b.size
+            )
+            # Wrapped lines of one bullet continue it too
+            continues = continues or (
+                prev_kind == "bullets" and kind == "paragraph" and same_column
+                and b.bbox.x0 > prev.bbox.x0 + 2 and gap <= PARAGRAPH_GAP_RATIO * b.size
+            )
+            if continues and len(prev_text) + 1 + len(b.text) <= limit:
+                merged[-1] = (prev_kind, b, f"{prev_text}\n{b.text}")
+                continue
+        merged.append((kind, b, b.text))
+
+    chunks: list[tuple[str, str]] = []
+    for kind, _, text in merged:
+        text = _dehyphenate(text)
+        if kind == "heading":
+            chunks.append((kind, " ".join(text.split())))
+        else:
+            chunks.extend((kind, piece) for piece in _split_long(text, limit))
+    return chunks
+
+
+def parse_pdf(filename: str, doc: fitz.Document):
+    """Parse an open PDF document into manifest + chunks."""
     from services.document_source import IngestedDocument
 
     doc_id = f"upload-{uuid.uuid4().hex[:8]}"
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
 
     pages: list[Page] = []
     chunks: list[Chunk] = []
 
-    for page_idx in range(len(doc)):
-        page = doc[page_idx]
-        page_no = page_idx + 1
-        text = page.get_text("text").strip()
+    page_blocks = [_reading_order(_page_blocks(page), page.rect) for page in doc]
+    body_size = _body_size(page_blocks)
+    limit = _max_chunk_chars()
 
+    for page_idx, blocks in enumerate(page_blocks):
+        page_no = page_idx + 1
         pages.append(Page(pageNo=page_no, modules=[]))
 
-        if not text:
-            continue
-
-        # Split into paragraphs by double newline or significant whitespace
-        paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
-
-        for order, para in enumerate(paragraphs):
-            chunk_id = f"p{page_no}-c{order + 1}"
-            # Simple heuristic: short lines that are title-case might be headings
-            chunk_type = "heading" if len(para) < 80 and para[0].isupper() and "\n" not in para else "paragraph"
+        for order, (chunk_type, text) in enumerate(_chunk_page(blocks, body_size, limit)):
             chunks.append(Chunk(
-                chunkId=chunk_id,
+                chunkId=f"p{page_no}-c{order + 1}",
                 pageNo=page_no,
                 order=order,
                 type=chunk_type,
-                text=para,
+                text=text,
             ))
 
-    doc.close()
-
     manifest = DocumentManifest(
         docId=doc_id,
         title=filename.replace(".pdf", "").replace("_", " "),
@@ -72,24 +252,28 @@ def parse_pdf(filename: str, pdf_bytes: bytes):
     )
 
 
-async def parse_pdf_with_modules(filename: str, pdf_bytes: bytes):
-    """Parse a PDF and extract formula/visual modules via AI.
-    Falls back to empty modules if AI is unavailable or fails."""
+async def parse_pdf_with_modules(filename: str, doc: fitz.Document):
+    """Parse a PDF, extract formula/visual modules and precompute
+    page/section summaries.
+    Without AI, keeps only locally extracted modules (rebuilt expressions,
+    vector line graphs) and uses extractive summaries."""
+    from services.ai_provider import get_ai_provider
     from services.module_extractor import extract_all_modules
+    from services.summarizer import build_summaries
 
-    result = parse_pdf(filename, pdf_bytes)
+    with INGEST_STAGE_SECONDS.time(stage="parse"):
+        result = parse_pdf(filename, doc)
+    budget = start_ingest_budget(result.manifest.docId)
 
     # Collect page texts for module extraction
     page_texts: dict[int, str] = {}
-    doc = fitz.open(stream=pdf_bytes, filetype="pdf")
     for page_idx in range(len(doc)):
         page = doc[page_idx]
         page_texts[page_idx + 1] = page.get_text("text").strip()
-    doc.close()
 
     try:
         formulas, visuals, page_module_refs = await extract_all_modules(
-            pdf_bytes, page_texts
+            doc, page_texts
         )
         result.formulas = formulas
         result.visuals = visuals
@@ -103,4 +287,14 @@ async def parse_pdf_with_modules(filename: str, pdf_bytes: bytes):
     except Exception as e:
         logger.warning("Module extraction failed, returning basic parse: %s", e)
 
+    with INGEST_STAGE_SECONDS.time(stage="summaries"):
+        result.summaries = await build_summaries(
+            result.manifest.docId,
+            result.chunks,
+            [p.pageNo for p in result.manifest.pages],
+            result.manifest.outline,
+            # Extractive summaries once the ingest budget is spent
+            ai=None if budget.exhausted() else get_ai_provider(),
+        )
+
     return result
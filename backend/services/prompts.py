@@ -0,0 +1,462 @@
+"""
+Prompt template registry.
+
+Every LLM prompt is a set of instructions (sent as the system message)
+followed by a suffix holding the per-call data (sent as the user message).
+
+Templates that expect JSON carry a response schema, sent as a strict
+structured-output response_format so the provider can only return valid
+JSON of that shape. AI_STRUCTURED_OUTPUT=json falls back to plain JSON mode
+(for models without schema support) and =off sends neither.
+
+Each template also keeps render, token and parse statistics for the
+prompt report served at /api/usage/prompts.
+"""
+
+from __future__ import annotations
+
+import functools
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any
+
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from pydantic import BaseModel
+
+from models import FormulaExplainResponse, QACitation, ReflectResponse, Symbol
+
+# "schema" (strict JSON schema), "json" (JSON mode) or "off"
+AI_STRUCTURED_OUTPUT = os.getenv("AI_STRUCTURED_OUTPUT", "schema").strip().lower()
+
+PREAMBLE = (
+    "You are an accessibility-first tutor. Be concise, grounded in provided context, "
+    "and never invent document content."
+)
+_CLARIFY = "If context is insufficient, say what's missing and ask one clarifying question."
+
+
+# ─── Response schemas ───
+
+class GroundedAnswer(BaseModel):
+    answer: str
+    citations: list[QACitation]
+    clarifyingQuestion: str | None
+
+
+class TextSummary(BaseModel):
+    summary: str
+
+
+class ExtractedFormula(BaseModel):
+    expression: str
+    purpose: str
+    symbols: list[Symbol]
+    example: str
+
+
+class ExtractedFormulas(BaseModel):
+    formulas: list[ExtractedFormula]
+
+
+class FormulaNotes(BaseModel):
+    index: int  # the formula's number in the prompt's list
+    purpose: str
+    symbols: list[Symbol]
+    example: str
+
+
+class FormulaNotesList(BaseModel):
+    formulas: list[FormulaNotes]
+
+
+class LineGraphText(BaseModel):
+    title: str
+    description: str
+    xLabel: str
+    yLabel: str
+
+
+@functools.cache
+def _strict_schema(schema: type[BaseModel]) -> dict[str, Any]:
+    """JSON schema in the form strict structured output requires: every
+    property required, no additional properties, no defaults."""
+    def walk(node: Any) -> None:
+        if isinstance(node, dict):
+            node.pop("default", None)
+            if "properties" in node:
+                node["additionalProperties"] = False
+                node["required"] = list(node["properties"])
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    result = schema.model_json_schema()
+    walk(result)
+    return result
+
+
+@dataclass
+class PromptTemplate:
+    name: str
+    instructions: str
+    suffix: str
+    schema: type[BaseModel] | None = None
+    json_output: bool = False
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    renders: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    # Replies by parse outcome: ok, repaired, failed
+    parses: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def system_prompt(self) -> str:
+        return f"{PREAMBLE}\n\n{self.instructions}"
+
+    def fill(self, **values: Any) -> str:
+        """The user message for one call."""
+        text = self.suffix.format(**values)
+        with self._lock:
+            self.renders += 1
+        return text
+
+    def render(self, **values: Any) -> list[BaseMessage]:
+        return [SystemMessage(content=self.system_prompt), HumanMessage(content=self.fill(**values))]
+
+    def record_response(self, message: Any) -> None:
+        """Count prompt tokens, and those the provider reports served from its cache."""
+        usage = getattr(message, "usage_metadata", None) or {}
+        with self._lock:
+            self.prompt_tokens += usage.get("input_tokens", 0)
+            self.cached_tokens += (usage.get("input_token_details") or {}).get("cache_read", 0)
+
+    def response_format(self) -> dict[str, Any] | None:
+        """The response_format to request, per AI_STRUCTURED_OUTPUT."""
+        if AI_STRUCTURED_OUTPUT not in ("schema", "json") or not (self.schema or self.json_output):
+            return None
+        if self.schema is not None and AI_STRUCTURED_OUTPUT == "schema":
+            return {
+                "type": "json_schema",
+                "json_schema": {"name": self.name, "schema": _strict_schema(self.schema), "strict": True},
+            }
+        return {"type": "json_object"}
+
+    def record_parse(self, outcome: str) -> None:
+        with self._lock:
+            self.parses[outcome] = self.parses.get(outcome, 0) + 1
+
+    def report(self) -> dict[str, Any]:
+        parsed = sum(self.parses.values())
+        return {
+            "renders": self.renders,
+            "promptTokens": self.prompt_tokens,
+            "cachedTokens": self.cached_tokens,
+            "responseFormat": (self.response_format() or {}).get("type"),
+            "parses": dict(self.parses),
+            "parseFailureRate": round(self.parses.get("failed", 0) / parsed, 3) if parsed else None,
+        }
+
+
+PROMPTS: dict[str, PromptTemplate] = {}
+
+
+def _register(name: str, instructions: str, suffix: str,
+              schema: type[BaseModel] | None = None, json_output: bool = False) -> PromptTemplate:
+    PROMPTS[name] = PromptTemplate(name, instructions.strip(), suffix.strip(), schema, json_output)
+    return PROMPTS[name]
+
+
+def prompt_report() -> dict[str, dict[str, Any]]:
+    """Renders, prompt tokens, cache hits and parse outcomes, per template."""
+    return {name: t.report() for name, t in PROMPTS.items()}
+
+
+FORMULA_EXPLANATION = _register("formula_explanation", f"""
+{_CLARIFY}
+
+The student is learning about a formula, given with its purpose, symbols and an example.
+Explain the requested aspect of the formula in 2-3 clear, spoken sentences.
+Sections: purpose, symbol table, tiny worked example, or intuition (1-2 sentences).
+Do NOT introduce any symbols or variables not listed with the formula.
+Respond with ONLY valid JSON: {{"text": "your explanation"}}
+""", """
+Expression: {expression}
+Purpose: {purpose}
+Symbols: {symbols}
+Example: {example}
+
+Explain the "{section}" aspect of this formula.
+""", schema=FormulaExplainResponse)
+
+GROUNDED_QA = _register("grounded_qa", f"""
+{_CLARIFY}
+
+Answer the question using ONLY the provided context. Return citations with the chunkIds used.
+
+Rules:
+- Cite specific chunk IDs in your answer
+- If the context doesn't contain enough information, set clarifyingQuestion to ask for more detail
+- Keep the answer concise (2-3 sentences for speaking aloud)
+- Only reference chunkIds from the list given with the context
+
+Respond with ONLY valid JSON:
+{{"answer": "your answer", "citations": [{{"chunkId": "id", "pageNo": 1}}], "clarifyingQuestion": null}}
+""", """
+Context:
+{context}
+
+Chunk IDs: {chunk_ids}
+
+Question: {question}
+""", schema=GroundedAnswer)
+
+CONVERSATION_SUMMARY = _register("conversation_summary", """
+You maintain a running summary of a tutoring conversation so follow-up questions keep their context.
+
+Fold the new exchanges into the current summary, within the given word limit.
+Keep the topics the student asked about and the key facts from the answers.
+Drop greetings, filler, and repeated information.
+
+Respond with ONLY valid JSON: {"summary": "updated summary"}
+""", """
+Current summary:
+{summary}
+
+New exchanges to fold in:
+{turns}
+
+Word limit: {max_words}
+""", schema=TextSummary)
+
+SUMMARIZE_TEXT = _register("summarize_text", f"""
+{_CLARIFY}
+
+Summarize the given page (or section, from its page summaries) of lecture notes for a student who is listening, not reading.
+
+Rules:
+- 2-3 short spoken sentences.
+- Only use information from the content.
+- No lists, symbols, or markdown.
+
+Respond with ONLY valid JSON: {{"summary": "your summary"}}
+""", """
+Summarize this {scope}.
+
+Content:
+---
+{text}
+---
+""", schema=TextSummary)
+
+EXPLORE_REFLECTION = _register("explore_reflection", f"""
+{_CLARIFY}
+
+Reflect on the student's exploration of a visual.
+
+Write a brief reflection (max 3-4 sentences total across all fields):
+- reflection: 2 sentences on what the student explored
+- takeaway: 1 sentence key insight
+- nextSuggestion: 1 sentence next suggested action
+Avoid excessive coordinates; focus on meaning.
+
+Respond with ONLY valid JSON:
+{{"reflection": "...", "takeaway": "...", "nextSuggestion": "..."}}
+""", """
+Visual: {title}
+Type: {type}
+Description: {description}
+Regions visited: {visited}
+Points marked: {marked}
+Duration: {duration:.0f} seconds
+""", schema=ReflectResponse)
+
+EXTRACT_FORMULAS = _register("extract_formulas", """
+You are analyzing lecture notes. Identify ALL mathematical formulas, equations, or mathematical expressions present in the given page text.
+
+For each formula found, produce a structured JSON object with:
+- expression: the formula written in plain text (e.g., "E = mc^2", "softmax(z_i) = exp(z_i) / sum_j exp(z_j)")
+- purpose: a one-sentence description of what this formula does or represents
+- symbols: an array of {"sym": "...", "meaning": "..."} for each variable/symbol
+- example: a brief worked example with concrete numbers (1-2 sentences)
+
+Rules:
+- Only extract actual mathematical formulas/equations, not prose descriptions.
+- If no formulas are found, return an empty array.
+- Use plain ASCII text for the expression field.
+- Keep purpose to one sentence and example brief.
+
+Respond with ONLY valid JSON:
+{"formulas": [...]}
+""", """
+Text from page {page_no} of a lecture PDF:
+---
+{page_text}
+---
+""", schema=ExtractedFormulas)
+
+EXPLAIN_FORMULAS = _register("explain_formulas", """
+You are explaining formulas from a lecture PDF. The formulas were read exactly from the page (x_i is a subscript, x^2 a superscript); nearby page text is given for context only.
+
+For each numbered formula, produce exactly one entry:
+- index: the formula's number from the list
+- purpose: one sentence on what the formula does or represents
+- symbols: an array of {"sym": "...", "meaning": "..."} for each variable/symbol
+- example: a brief worked example with concrete numbers (1-2 sentences)
+
+Do not rewrite the expressions.
+
+Respond with ONLY valid JSON:
+{"formulas": [{"index": 1, "purpose": "...", "symbols": [...], "example": "..."}, ...]}
+""", """
+Formulas from page {page_no}:
+{listed}
+
+Nearby page text:
+---
+{context}
+---
+""", schema=FormulaNotesList)
+
+ANALYZE_PAGE_IMAGE = _register("analyze_page_image", """
+You are analyzing a lecture slide/page image. It may be cropped to the figure region of the page; the page text is given with it.
+
+Identify any visual elements: graphs, charts, diagrams, flowcharts, or pipelines.
+For each visual found, determine its type and produce structured data.
+
+TYPE "line_graph" — for line charts, curves, scatter plots with trends:
+{
+  "type": "line_graph",
+  "title": "descriptive title",
+  "description": "1-2 sentence description",
+  "data": {
+    "xMin": <number>, "xMax": <number>,
+    "xLabel": "axis label", "yLabel": "axis label",
+    "points": [[x1,y1], [x2,y2], ...],
+    "features": {
+      "min": [{"x": <number>, "y": <number>}],
+      "peak": [{"x": <number>, "y": <number>}],
+      "inflection": [{"x": <number>, "y": <number>}]
+    }
+  }
+}
+For points: provide 15-30 representative [x,y] pairs capturing the curve shape.
+For features: identify min, max/peak, and inflection points. Use empty arrays if N/A.
+
+TYPE "flowchart" — for flowcharts, pipelines, process diagrams, block diagrams:
+{
+  "type": "flowchart",
+  "title": "descriptive title",
+  "description": "1-2 sentence description",
+  "data": {
+    "nodes": [
+      {"id": "n1", "label": "short label", "x": 0.15, "y": 0.5, "r": 0.08, "desc": "1-sentence description"},
+      ...
+    ],
+    "edges": [["n1", "n2"], ...],
+    "keyNodes": ["n1", ...]
+  }
+}
+For nodes: x and y are normalized 0.0-1.0 coordinates. r is radius (use 0.08). Identify 1-2 key nodes.
+
+Rules:
+- Only identify clear visual elements, not decorative images or logos.
+- If no visuals found, return an empty array.
+- Only use types "line_graph" or "flowchart". Skip anything else.
+- For line graphs, estimate data points from the visual as accurately as possible.
+- For flowcharts, capture all visible nodes and connections.
+
+Respond with ONLY valid JSON:
+{"visuals": [...]}
+""", """
+Image from page {page_no} of a lecture PDF. The text on this page is:
+---
+{page_text}
+---
+""", json_output=True)
+
+DESCRIBE_LINE_GRAPH = _register("describe_line_graph", """
+A line graph from a lecture PDF was read exactly from its vector drawing. Its axes, sample points and features are given with the text of its page.
+
+Rules:
+- title: a short descriptive title, using the page text where it names the graph.
+- description: 1-2 spoken sentences on what the curve shows.
+- xLabel / yLabel: only if the axis label given is empty and the page text makes it clear; otherwise "".
+
+Respond with ONLY valid JSON:
+{"title": "...", "description": "...", "xLabel": "", "yLabel": ""}
+""", """
+Line graph on page {page_no}. The text on this page is:
+---
+{page_text}
+---
+
+Graph data:
+- x axis: "{x_label}" from {x_min} to {x_max} ({x_scale})
+- y axis: "{y_label}" from {y_min} to {y_max} ({y_scale})
+- sample points: {points}
+- features: {features}
+""", schema=LineGraphText)
+
+CHAT = _register("chat", f"""
+{_CLARIFY}
+
+The student is using a voice-controlled reading app.
+Reply in 1-2 short, spoken sentences. Be helpful and conversational.
+If you're not sure what they need, suggest saying "Help" for available commands.
+""", """
+{context_line}The student said: "{message}"
+""")
+
+
+# ─── Orchestrator system prompts, one per app mode ───
+
+_ORCHESTRATOR_BASE = """
+You control a voice-first reading app for visually impaired students.
+Given the student's voice command, decide which tool to call.
+
+Use ask_question when the student asks about the content (e.g. "what does this mean", "explain this", questions starting with what/how/why).
+The student can also ask follow-up questions about previous answers — always use ask_question for these too.
+
+If the command is conversational or doesn't match any tool, respond directly in 1-2 spoken sentences.
+Keep all responses concise -- they will be spoken aloud.
+IMPORTANT: Always respond. Never return empty.
+"""
+
+_MODE_BLOCKS = {
+    "READING": """The current mode is READING. Use reading_control for:
+- "continue"/"next"/"keep going"/"go on"/"move on"/"carry on" -> reading_control(command="next")
+- "go back"/"back"/"previous" -> reading_control(command="back")
+- "where am I"/"what page" -> reading_control(command="where_am_i")
+- "repeat"/"again"/"say that again" -> reading_control(command="repeat")
+- "help"/"options"/"what can I say" -> reading_control(command="help")
+- "stop"/"quiet"/"silence" -> reading_control(command="stop")
+- "summarize"/"summary" -> reading_control(command="summarize")
+- "end"/"finish"/"exit"/"I'm done reading" -> reading_control(command="end")""",
+    "FORMULA": """The current mode is FORMULA. Use formula_control for:
+- "continue"/"next"/"keep going" -> formula_control(command="continue") to EXIT formula mode
+- "symbols" -> formula_control(command="symbols")
+- "example" -> formula_control(command="example")
+- "intuition"/"simple"/"break it down" -> formula_control(command="intuition")
+- "go back"/"back" -> reading_control(command="back")""",
+    "VISUAL": """The current mode is VISUAL. Use visual_control for:
+- "start exploring"/"explore" -> visual_control(command="start_exploring")
+- "what is here"/"what's here" -> visual_control(command="what_is_here")
+- "describe"/"describe the graph"/"tell me about this graph"/"summarize"/"what is this" -> visual_control(command="describe")
+- "mark this"/"mark" -> visual_control(command="mark")
+- "guide me to X" -> visual_control(command="guide_to", target="X")
+- "I'm done"/"done"/"finished"/"continue"/"stop" -> visual_control(command="done")
+- "next key point" -> visual_control(command="next_key_point")
+- "go back"/"exit" -> visual_control(command="quick_exit")""",
+}
+
+_ORCHESTRATOR_STATE = """
+Current state: mode={mode}, page {page_no}, chunk {chunk}.{formula_info}{text_info}
+"""
+
+ORCHESTRATOR = {
+    mode: _register(f"orchestrator_{mode.lower()}", f"{_ORCHESTRATOR_BASE.strip()}\n\n{block}", _ORCHESTRATOR_STATE)
+    for mode, block in _MODE_BLOCKS.items()
+}
@@ -0,0 +1,128 @@
+"""
+Serialized responses for the document read endpoints.
+
+A document's manifest, chunks, summaries and modules never change after
+ingest, so each response body is serialized once (with orjson when it is
+installed), compressed once (gzip, and brotli when the brotli package is
+installed) and served from memory with a strong ETag. A request whose
+If-None-Match matches gets an empty 304. Entries are dropped when a
+document is stored again.
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Hashable
+
+from fastapi import Request, Response
+from pydantic import BaseModel
+
+from services.metrics import CACHE_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+    logger.warning("orjson not installed — document responses use the stdlib JSON encoder")
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+# Clients may keep responses but must revalidate (a cheap 304) before reuse
+CACHE_CONTROL = "no-cache"
+
+
+@dataclass
+class Serialized:
+    digest: str
+    bodies: dict[str, bytes]  # by Content-Encoding; "" is identity
+
+    def etag(self, encoding: str) -> str:
+        # Strong ETags differ per representation, so each encoding gets its own
+        return f'"{self.digest}-{encoding}"' if encoding else f'"{self.digest}"'
+
+
+_lock = threading.Lock()
+_bodies: dict[str, dict[Hashable, Serialized]] = {}
+
+
+def _jsonable(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if isinstance(value, dict):
+        return {k: _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    return value
+
+
+def dumps(value: Any) -> bytes:
+    """Compact JSON bytes for Pydantic models, dicts and lists of them."""
+    data = _jsonable(value)
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def _serialize(value: Any) -> Serialized:
+    raw = dumps(value)
+    bodies = {"": raw}
+    if len(raw) >= MIN_COMPRESS_BYTES:
+        bodies["gzip"] = gzip.compress(raw, compresslevel=6, mtime=0)
+        if brotli is not None:
+            bodies["br"] = brotli.compress(raw, quality=5)
+    return Serialized(hashlib.sha256(raw).hexdigest()[:32], bodies)
+
+
+def _accepted_encodings(header: str) -> set[str]:
+    accepted = set()
+    for part in header.split(","):
+        name, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def _etag_matches(if_none_match: str, entry: Serialized) -> bool:
+    """Any encoding's ETag revalidates: the content is the same."""
+    for tag in if_none_match.split(","):
+        tag = tag.strip().removeprefix("W/").strip('"')
+        if tag == "*" or tag.split("-")[0] == entry.digest:
+            return True
+    return False
+
+
+def cached_json(request: Request, doc_id: str, key: Hashable, build: Callable[[], Any]) -> Response:
+    """The JSON response for `key` of a document, built and serialized on first use."""
+    with _lock:
+        entry = _bodies.get(doc_id, {}).get(key)
+    CACHE_REQUESTS.inc(cache="document_responses", result="hit" if entry else "miss")
+    if entry is None:
+        entry = _serialize(build())
+        with _lock:
+            _bodies.setdefault(doc_id, {})[key] = entry
+
+    accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+    encoding = next((e for e in ("br", "gzip") if e in accepted and e in entry.bodies), "")
+    headers = {"ETag": entry.etag(encoding), "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    if _etag_matches(request.headers.get("if-none-match", ""), entry):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(entry.bodies[encoding], media_type="application/json", headers=headers)
+
+
+def invalidate(doc_id: str) -> None:
+    with _lock:
+        _bodies.pop(doc_id, None)
@@ -0,0 +1,188 @@
+"""
+Page- and section-level summaries computed once at ingest.
+
+Page summaries come from the AI provider when configured, otherwise from a
+local extractive summarizer. Section summaries are built from the page
+summaries they cover, so "Summarize" is a lookup instead of an LLM call.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+from collections import Counter
+
+from models import Chunk, OutlineSection, PageSummary, SectionSummary, SummariesResponse
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENCY = 5
+PAGE_SUMMARY_SENTENCES = 2
+SECTION_SUMMARY_SENTENCES = 3
+# Pages grouped per section when the document has no outline
+SECTION_PAGE_SPAN = 5
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+_WORD = re.compile(r"[a-zA-Z][a-zA-Z\-']+")
+_STOPWORDS = {
+    "the", "a", "an", "is", "are", "was", "were", "be", "been", "of", "to", "in",
+    "for", "and", "or", "it", "this", "that", "these", "those", "with", "on", "as",
+    "by", "at", "from", "we", "you", "our", "its", "can", "will", "which", "each",
+    "into", "than", "then", "so", "such", "not", "but", "if", "also", "has", "have",
+}
+
+
+def extractive_summary(text: str, max_sentences: int = PAGE_SUMMARY_SENTENCES) -> str:
+    """Pick the highest-scoring sentences by content-word frequency, in order."""
+    sentences = [s.strip() for s in _SENTENCE_SPLIT.split(text) if len(s.strip()) > 3]
+    if len(sentences) <= max_sentences:
+        return " ".join(sentences)
+
+    freq = Counter(
+        w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS
+    )
+    if not freq:
+        return " ".join(sentences[:max_sentences])
+    top = max(freq.values())
+
+    def score(sentence: str) -> float:
+        words = [w for w in _WORD.findall(sentence.lower()) if w not in _STOPWORDS]
+        if not words:
+            return 0.0
+        return sum(freq[w] / top for w in words) / len(words) ** 0.5
+
+    ranked = sorted(range(len(sentences)), key=lambda i: score(sentences[i]), reverse=True)
+    keep = sorted(ranked[:max_sentences])
+    return " ".join(sentences[i] for i in keep)
+
+
+def _page_text(chunks: list[Chunk]) -> str:
+    """Join page chunks, terminating headings so they split as sentences."""
+    parts = []
+    for c in sorted(chunks, key=lambda c: c.order):
+        text = c.text.strip()
+        if c.type == "heading" and not text.endswith((".", "!", "?", ":")):
+            text += "."
+        parts.append(text)
+    return "\n".join(parts)
+
+
+def _derive_sections(
+    chunks_by_page: dict[int, list[Chunk]], page_nos: list[int]
+) -> list[OutlineSection]:
+    """Group pages into fixed spans, titled by their first heading."""
+    sections = []
+    for start in range(0, len(page_nos), SECTION_PAGE_SPAN):
+        span = page_nos[start:start + SECTION_PAGE_SPAN]
+        title = next(
+            (c.text for p in span for c in chunks_by_page.get(p, []) if c.type == "heading"),
+            f"Pages {span[0]} to {span[-1]}",
+        )
+        sections.append(OutlineSection(
+            id=f"s{len(sections) + 1}",
+            title=title[:80],
+            startPage=span[0],
+            endPage=span[-1],
+        ))
+    return sections
+
+
+def _group_by_page(chunks: list[Chunk]) -> dict[int, list[Chunk]]:
+    chunks_by_page: dict[int, list[Chunk]] = {}
+    for c in chunks:
+        chunks_by_page.setdefault(c.pageNo, []).append(c)
+    return chunks_by_page
+
+
+def _section_text(section: OutlineSection, page_summaries: dict[int, str]) -> str:
+    return "\n".join(
+        page_summaries[p]
+        for p in range(section.startPage, section.endPage + 1)
+        if page_summaries.get(p)
+    )
+
+
+def _response(
+    doc_id: str,
+    pages: list[PageSummary],
+    sections_src: list[OutlineSection],
+    section_summaries: list[str],
+) -> SummariesResponse:
+    sections = [
+        SectionSummary(
+            sectionId=s.id,
+            title=s.title,
+            startPage=s.startPage,
+            endPage=s.endPage,
+            summary=summary,
+        )
+        for s, summary in zip(sections_src, section_summaries)
+    ]
+    return SummariesResponse(docId=doc_id, pages=pages, sections=sections)
+
+
+def build_extractive_summaries(
+    doc_id: str,
+    chunks: list[Chunk],
+    page_nos: list[int],
+    outline: list[OutlineSection] | None = None,
+) -> SummariesResponse:
+    """Build page and section summaries locally, without AI."""
+    chunks_by_page = _group_by_page(chunks)
+    pages = [
+        PageSummary(pageNo=p, summary=extractive_summary(_page_text(chunks_by_page.get(p, []))))
+        for p in page_nos
+    ]
+    page_summaries = {p.pageNo: p.summary for p in pages}
+    sections_src = outline or _derive_sections(chunks_by_page, page_nos)
+    section_summaries = [
+        extractive_summary(_section_text(s, page_summaries), SECTION_SUMMARY_SENTENCES)
+        for s in sections_src
+    ]
+    return _response(doc_id, pages, sections_src, section_summaries)
+
+
+async def _summarize(ai, text: str, scope: str, max_sentences: int, semaphore) -> str:
+    if text.strip():
+        async with semaphore:
+            try:
+                return await ai.summarize_text(text, scope)
+            except Exception as e:
+                logger.warning("AI %s summary failed, using extractive: %s", scope, e)
+    return extractive_summary(text, max_sentences)
+
+
+async def build_summaries(
+    doc_id: str,
+    chunks: list[Chunk],
+    page_nos: list[int],
+    outline: list[OutlineSection] | None = None,
+    ai=None,
+) -> SummariesResponse:
+    """Build page summaries, then section summaries on top of them.
+    Uses the extractive summarizer when no AI provider is given."""
+    if ai is None:
+        return build_extractive_summaries(doc_id, chunks, page_nos, outline)
+
+    chunks_by_page = _group_by_page(chunks)
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    page_results = await asyncio.gather(*(
+        _summarize(ai, _page_text(chunks_by_page.get(p, [])), "page",
+                   PAGE_SUMMARY_SENTENCES, semaphore)
+        for p in page_nos
+    ))
+    pages = [PageSummary(pageNo=p, summary=s) for p, s in zip(page_nos, page_results)]
+    page_summaries = {p.pageNo: p.summary for p in pages}
+
+    sections_src = outline or _derive_sections(chunks_by_page, page_nos)
+
+    async def summarize_section(section: OutlineSection) -> str:
+        text = _section_text(section, page_summaries)
+        # Single-page sections reuse the page summary as-is
+        if section.startPage == section.endPage:
+            return text
+        return await _summarize(ai, text, "section", SECTION_SUMMARY_SENTENCES, semaphore)
+
+    section_summaries = await asyncio.gather(*(summarize_section(s) for s in sections_src))
+    return _response(doc_id, pages, sections_src, list(section_summaries))
@@ -0,0 +1,171 @@
+"""
+Per-request span tracing.
+
+Each HTTP request gets a trace with a correlation id (the caller's
+X-Request-ID, or a new one). Stages record spans into it (transcription,
+context build, agent invoke, tool calls, LLM calls) and the middleware
+returns them as a Server-Timing header, plus X-Request-ID. With
+TRACE_LOG_PATH set, every trace is also appended to that JSONL file so a
+slow request can be looked up by its id. The file is written by a
+background thread, so logging a trace never blocks the event loop.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+logger = logging.getLogger(__name__)
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+_current: ContextVar["Trace | None"] = ContextVar("trace", default=None)
+
+# (path, JSONL line) pairs for the trace log writer; None stops it
+_log_queue: "queue.SimpleQueue[tuple[str, str] | None]" = queue.SimpleQueue()
+_log_writer: threading.Thread | None = None
+_log_writer_lock = threading.Lock()
+
+
+@dataclass
+class Span:
+    name: str
+    start_ms: float
+    dur_ms: float
+
+
+@dataclass
+class Trace:
+    request_id: str
+    started: float = field(default_factory=time.perf_counter)
+    spans: list[Span] = field(default_factory=list)
+
+    def add(self, name: str, started: float, ended: float) -> None:
+        # list.append is atomic, so tools running in worker threads can record too
+        self.spans.append(Span(name, (started - self.started) * 1000, (ended - started) * 1000))
+
+    def server_timing(self, total_ms: float) -> str:
+        parts = [f"{s.name};dur={s.dur_ms:.1f}" for s in sorted(self.spans, key=lambda s: s.start_ms)]
+        parts.append(f"total;dur={total_ms:.1f}")
+        return ", ".join(parts)
+
+
+def current_trace() -> Trace | None:
+    return _current.get()
+
+
+def record_span(name: str, started: float, ended: float) -> None:
+    """Add a finished span (perf_counter times) to the current request's trace, if any."""
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, started, ended)
+
+
+class LLMSpanHandler(BaseCallbackHandler):
+    """LangChain callback that records each chat model call made inside the
+    agent graph as an "llm.agent" span."""
+
+    def __init__(self, trace: Trace):
+        self.trace = trace
+        self._starts: dict[UUID, float] = {}
+
+    def on_chat_model_start(self, serialized: Any, messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._starts[run_id] = time.perf_counter()
+
+    def _end(self, run_id: UUID) -> None:
+        started = self._starts.pop(run_id, None)
+        if started is not None:
+            self.trace.add("llm.agent", started, time.perf_counter())
+
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+
+def _drain_log_queue() -> None:
+    """Writer thread: append queued trace lines, a batch per file open."""
+    while True:
+        item = _log_queue.get()
+        batch: dict[str, list[str]] = {}
+        stop = False
+        while True:
+            if item is None:
+                stop = True
+            else:
+                batch.setdefault(item[0], []).append(item[1])
+            try:
+                item = _log_queue.get_nowait()
+            except queue.Empty:
+                break
+        for path, lines in batch.items():
+            try:
+                with open(path, "a", encoding="utf-8") as f:
+                    f.writelines(lines)
+            except OSError as e:
+                logger.warning("Could not write trace log %s: %s", path, e)
+        if stop:
+            return
+
+
+def close_trace_log() -> None:
+    """Flush queued trace lines and stop the writer thread (app shutdown)."""
+    global _log_writer
+    with _log_writer_lock:
+        if _log_writer is None:
+            return
+        _log_queue.put(None)
+        _log_writer.join(timeout=5)
+        _log_writer = None
+
+
+def _write_log(path: str, trace: Trace, method: str, url_path: str, status: int, total_ms: float) -> None:
+    """Queue one trace for the log writer thread, starting it on first use."""
+    global _log_writer
+    entry = {
+        "id": trace.request_id,
+        "ts": time.time(),
+        "method": method,
+        "path": url_path,
+        "status": status,
+        "total_ms": round(total_ms, 1),
+        "spans": [
+            {"name": s.name, "start_ms": round(s.start_ms, 1), "dur_ms": round(s.dur_ms, 1)}
+            for s in sorted(trace.spans, key=lambda s: s.start_ms)
+        ],
+    }
+    with _log_writer_lock:
+        if _log_writer is None:
+            _log_writer = threading.Thread(target=_drain_log_queue, name="trace-log", daemon=True)
+            _log_writer.start()
+        _log_queue.put((path, json.dumps(entry) + "\n"))
+
+
+async def trace_request(request, call_next):
+    """HTTP middleware: open a trace, then attach Server-Timing and X-Request-ID."""
+    request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex[:16]
+    trace = Trace(request_id)
+    token = _current.set(trace)
+    try:
+        response = await call_next(request)
+    finally:
+        _current.reset(token)
+    total_ms = (time.perf_counter() - trace.started) * 1000
+    response.headers["Server-Timing"] = trace.server_timing(total_ms)
+    response.headers[REQUEST_ID_HEADER] = request_id
+    log_path = os.getenv("TRACE_LOG_PATH")
+    if log_path:
+        _write_log(log_path, trace, request.method, request.url.path, response.status_code, total_ms)
+    return response
@@ -8,12 +8,20 @@ from __future__ import annotations
 import logging
 import os
 
+from services.circuit_breaker import CircuitBreaker
+
 logger = logging.getLogger(__name__)
 
+# Calls slower than this count as failures toward opening the circuit
+STT_SLOW_CALL_MS = int(os.getenv("STT_SLOW_CALL_MS", "5000"))
+
+STT_BREAKER = CircuitBreaker("deepgram", slow_call_ms=STT_SLOW_CALL_MS)
+
 
 async def transcribe_audio(audio_bytes: bytes, mimetype: str = "audio/webm") -> str:
     """Transcribe audio bytes using Deepgram nova-2.
-    Returns the transcript string. Raises on failure."""
+    Returns the transcript string. Raises on failure, and raises
+    CircuitOpenError at once while Deepgram is failing."""
     from deepgram import DeepgramClient
 
     api_key = os.getenv("DEEPGRAM_API_KEY")
@@ -22,12 +30,13 @@ async def transcribe_audio(audio_bytes: bytes, mimetype: str = "audio/webm") ->
 
     client = DeepgramClient(api_key=api_key)
 
-    response = client.listen.v1.media.transcribe_file(
-        request=audio_bytes,
-        model="nova-2",
-        smart_format=True,
-        language="en",
-    )
+    with STT_BREAKER.guard():
+        response = client.listen.v1.media.transcribe_file(
+            request=audio_bytes,
+            model="nova-2",
+            smart_format=True,
+            language="en",
+        )
 
     transcript = (
         response.results.channels[0].alternatives[0].transcript
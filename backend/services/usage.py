@@ -0,0 +1,255 @@
+"""
+LLM token and cost accounting, and per-ingest budgets.
+
+Usage is read from every model response (AIProvider calls and the
+orchestrator agent's own model calls) and added to running totals per
+document, per session (the X-Session-ID header) and per endpoint. The
+request middleware opens a scope for the endpoint and session, and routers
+add the document id once they know it. An AIProvider call that joins an
+identical call already in flight is counted as coalesced in the joiner's
+scope; the tokens are charged once, to the scope that made the call.
+
+An ingest budget caps the vision calls and tokens one upload may spend.
+extract_all_modules plans its LLM work against it, highest-value pages
+first, and skips work that would not fit. Tokens actually spent are checked
+again before each call, so a bad estimate cannot overrun the budget by more
+than the calls already in flight.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import threading
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from services.metrics import Counter
+
+# Per-ingest budgets; 0 means unlimited
+INGEST_MAX_VISION_CALLS = int(os.getenv("INGEST_MAX_VISION_CALLS", "0"))
+INGEST_MAX_TOKENS = int(os.getenv("INGEST_MAX_TOKENS", "0"))
+# USD per million tokens, for cost estimates (defaults: gpt-4o-mini list price)
+LLM_INPUT_COST_PER_MTOK = float(os.getenv("LLM_INPUT_COST_PER_MTOK", "0.15"))
+LLM_OUTPUT_COST_PER_MTOK = float(os.getenv("LLM_OUTPUT_COST_PER_MTOK", "0.60"))
+# Input tokens served from the provider's prompt-prefix cache
+LLM_CACHED_INPUT_COST_PER_MTOK = float(os.getenv("LLM_CACHED_INPUT_COST_PER_MTOK", "0.075"))
+SESSION_HEADER = "X-Session-ID"
+
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens by direction (input, cached_input, output) and caller.")
+
+_lock = threading.Lock()
+
+
+@dataclass
+class Usage:
+    calls: int = 0
+    visionCalls: int = 0
+    inputTokens: int = 0
+    cachedInputTokens: int = 0
+    outputTokens: int = 0
+    # Calls answered by an identical call already in flight for another scope;
+    # its tokens are charged there, so these cost nothing here
+    coalescedCalls: int = 0
+
+    def add(self, input_tokens: int, output_tokens: int, vision: bool, cached_tokens: int = 0) -> None:
+        self.calls += 1
+        self.visionCalls += int(vision)
+        self.inputTokens += input_tokens
+        self.cachedInputTokens += cached_tokens
+        self.outputTokens += output_tokens
+
+    @property
+    def tokens(self) -> int:
+        return self.inputTokens + self.outputTokens
+
+    def to_dict(self) -> dict[str, Any]:
+        cost = (
+            (self.inputTokens - self.cachedInputTokens) * LLM_INPUT_COST_PER_MTOK
+            + self.cachedInputTokens * LLM_CACHED_INPUT_COST_PER_MTOK
+            + self.outputTokens * LLM_OUTPUT_COST_PER_MTOK
+        ) / 1e6
+        return {
+            "calls": self.calls,
+            "visionCalls": self.visionCalls,
+            "inputTokens": self.inputTokens,
+            "cachedInputTokens": self.cachedInputTokens,
+            "outputTokens": self.outputTokens,
+            "coalescedCalls": self.coalescedCalls,
+            "costUsd": round(cost, 6),
+        }
+
+
+_total = Usage()
+_by_document: dict[str, Usage] = {}
+_by_session: dict[str, Usage] = {}
+_by_endpoint: dict[str, Usage] = {}
+# Ingest LLM tasks skipped for budget, per document and task kind
+_ingest_skips: dict[str, dict[str, int]] = {}
+
+
+@dataclass
+class IngestBudget:
+    max_vision_calls: int = INGEST_MAX_VISION_CALLS
+    max_tokens: int = INGEST_MAX_TOKENS
+    used: Usage = field(default_factory=Usage)
+
+    @property
+    def limited(self) -> bool:
+        return bool(self.max_vision_calls or self.max_tokens)
+
+    def tokens_left(self) -> float:
+        return self.max_tokens - self.used.tokens if self.max_tokens else math.inf
+
+    def exhausted(self) -> bool:
+        return self.tokens_left() <= 0
+
+    def to_dict(self) -> dict[str, int]:
+        return {"maxVisionCalls": self.max_vision_calls, "maxTokens": self.max_tokens}
+
+
+class BudgetExhaustedError(RuntimeError):
+    """The ingest token budget was spent before this LLM call."""
+
+
+@dataclass
+class UsageScope:
+    endpoint: str = ""
+    session_id: str = ""
+    doc_id: str = ""
+    budget: IngestBudget | None = None
+
+
+_scope: ContextVar[UsageScope | None] = ContextVar("usage_scope", default=None)
+
+
+def current_scope() -> UsageScope:
+    """The scope usage is attributed to, created on first use outside a request."""
+    scope = _scope.get()
+    if scope is None:
+        scope = UsageScope()
+        _scope.set(scope)
+    return scope
+
+
+def set_document(doc_id: str) -> None:
+    current_scope().doc_id = doc_id
+
+
+def current_budget() -> IngestBudget | None:
+    scope = _scope.get()
+    return scope.budget if scope else None
+
+
+def start_ingest_budget(doc_id: str) -> IngestBudget:
+    """Attribute the rest of this ingest to `doc_id` under a fresh budget."""
+    scope = current_scope()
+    scope.doc_id = doc_id
+    scope.budget = IngestBudget()
+    return scope.budget
+
+
+def record_skipped(doc_id: str, kind: str, count: int = 1) -> None:
+    with _lock:
+        skips = _ingest_skips.setdefault(doc_id, {})
+        skips[kind] = skips.get(kind, 0) + count
+
+
+def _token_counts(message: Any) -> tuple[int, int, int]:
+    """Input, output and cache-served input tokens of a model response."""
+    usage = getattr(message, "usage_metadata", None)
+    if usage:
+        cached = (usage.get("input_token_details") or {}).get("cache_read", 0)
+        return usage.get("input_tokens", 0), usage.get("output_tokens", 0), cached
+    token_usage = (getattr(message, "response_metadata", None) or {}).get("token_usage") or {}
+    cached = (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0)
+    return token_usage.get("prompt_tokens", 0), token_usage.get("completion_tokens", 0), cached
+
+
+def record_usage(message: Any, caller: str, vision: bool = False) -> None:
+    """Add one model response's token usage to every total it belongs to."""
+    input_tokens, output_tokens, cached_tokens = _token_counts(message)
+    scope = current_scope()
+    with _lock:
+        _total.add(input_tokens, output_tokens, vision, cached_tokens)
+        for key, table in ((scope.doc_id, _by_document), (scope.session_id, _by_session), (scope.endpoint, _by_endpoint)):
+            if key:
+                table.setdefault(key, Usage()).add(input_tokens, output_tokens, vision, cached_tokens)
+        if scope.budget is not None:
+            scope.budget.used.add(input_tokens, output_tokens, vision, cached_tokens)
+    LLM_TOKENS.inc(input_tokens, direction="input", caller=caller)
+    LLM_TOKENS.inc(cached_tokens, direction="cached_input", caller=caller)
+    LLM_TOKENS.inc(output_tokens, direction="output", caller=caller)
+
+
+def record_coalesced() -> None:
+    """Count a call that joined an identical one in flight against the joiner's
+    totals. The shared call's tokens go to the scope that started it."""
+    scope = current_scope()
+    with _lock:
+        _total.coalescedCalls += 1
+        for key, table in ((scope.doc_id, _by_document), (scope.session_id, _by_session), (scope.endpoint, _by_endpoint)):
+            if key:
+                table.setdefault(key, Usage()).coalescedCalls += 1
+
+
+class UsageHandler(BaseCallbackHandler):
+    """LangChain callback recording usage of the model calls inside the agent graph."""
+
+    def on_llm_end(self, response: Any, **kwargs: Any) -> None:
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                if message is not None:
+                    record_usage(message, "orchestrator")
+
+
+def estimate_text_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def estimate_image_tokens(width: int, height: int) -> int:
+    """OpenAI high-detail image cost: fit 2048 square, shortest side 768, 170 per 512px tile."""
+    scale = min(1.0, 2048 / max(width, height))
+    w, h = width * scale, height * scale
+    scale = min(1.0, 768 / min(w, h))
+    w, h = w * scale, h * scale
+    return 85 + 170 * math.ceil(w / 512) * math.ceil(h / 512)
+
+
+def usage_report(doc_id: str | None = None) -> dict[str, Any]:
+    with _lock:
+        if doc_id is not None:
+            return {
+                "docId": doc_id,
+                "usage": _by_document.get(doc_id, Usage()).to_dict(),
+                "skippedIngestTasks": dict(_ingest_skips.get(doc_id, {})),
+            }
+        return {
+            "total": _total.to_dict(),
+            "documents": {k: v.to_dict() for k, v in _by_document.items()},
+            "sessions": {k: v.to_dict() for k, v in _by_session.items()},
+            "endpoints": {k: v.to_dict() for k, v in _by_endpoint.items()},
+            "skippedIngestTasks": {k: dict(v) for k, v in _ingest_skips.items()},
+            "ingestBudget": IngestBudget().to_dict(),
+            "pricing": {
+                "inputPerMTok": LLM_INPUT_COST_PER_MTOK,
+                "cachedInputPerMTok": LLM_CACHED_INPUT_COST_PER_MTOK,
+                "outputPerMTok": LLM_OUTPUT_COST_PER_MTOK,
+            },
+        }
+
+
+async def usage_scope_middleware(request, call_next):
+    """HTTP middleware: attribute LLM usage in this request to its endpoint and session."""
+    token = _scope.set(UsageScope(
+        endpoint=f"{request.method} {request.url.path}",
+        session_id=request.headers.get(SESSION_HEADER, ""),
+    ))
+    try:
+        return await call_next(request)
+    finally:
+        _scope.reset(token)
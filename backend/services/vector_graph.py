@@ -0,0 +1,309 @@
+"""
+Local line-graph extraction from vector drawings.
+
+For a region the visual detector scored as a line graph, maps the data
+polyline from page space to data space using the numeric tick labels read
+from page text, then derives min/peak/inflection features and axis labels.
+The result uses the VisualModule.data schema, so vector charts need no
+vision call; raster charts and graphs without readable tick labels still go
+to the vision model.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from dataclasses import dataclass
+
+import fitz  # PyMuPDF
+
+from services.visual_detector import VisualRegion
+
+# Points kept per curve (the vision prompt asked for 15-30 estimates)
+LINE_GRAPH_MAX_POINTS = 200
+# Tick labels sit within this distance (points) of their axis
+TICK_LABEL_GAP = 28.0
+# Axis titles sit within this distance (points) of their axis
+AXIS_TITLE_GAP = 64.0
+# A label snaps to a tick mark or gridline this close (points)
+TICK_SNAP = 8.0
+# Largest tick-fit residual, as a share of the axis span, for a usable scale
+TICK_FIT_TOLERANCE = 0.02
+# Local extrema must stand out by this share of the y range
+FEATURE_PROMINENCE = 0.05
+# Smallest total change in normalized slope for a bend to count toward an inflection
+INFLECTION_MIN_BEND = 0.1
+
+_NUMBER = re.compile(r"^[-−]?(?:\d{1,3}(?:,\d{3})+|\d+)?(?:\.\d+)?(?:[eE][-+]?\d+)?%?$")
+
+
+@dataclass
+class _Label:
+    text: str
+    rect: fitz.Rect
+    vertical: bool = False
+
+
+@dataclass
+class _Scale:
+    """Affine (or log10) map from a page coordinate to a data value."""
+
+    slope: float
+    offset: float
+    log: bool = False
+
+    def __call__(self, pos: float) -> float:
+        value = self.slope * pos + self.offset
+        return 10 ** value if self.log else value
+
+
+def _parse_number(text: str) -> float | None:
+    text = text.strip()
+    if not text or not _NUMBER.match(text) or not any(c.isdigit() for c in text):
+        return None
+    try:
+        return float(text.replace("−", "-").replace(",", "").rstrip("%"))
+    except ValueError:
+        return None
+
+
+def _page_labels(page: fitz.Page) -> list[_Label]:
+    # No clip: clipping cuts labels that straddle the figure edge ("1.0" -> "0")
+    labels = []
+    for block in page.get_text("dict").get("blocks", []):
+        for line in block.get("lines", []):
+            text = "".join(s["text"] for s in line.get("spans", [])).strip()
+            if text:
+                dx, dy = line.get("dir", (1, 0))
+                labels.append(_Label(text, fitz.Rect(line["bbox"]), vertical=abs(dy) > abs(dx)))
+    return labels
+
+
+def _fit(pairs: list[tuple[float, float]]) -> tuple[float, float, float] | None:
+    """Least-squares line through (pos, value); returns slope, offset, max residual."""
+    if len({v for _, v in pairs}) < 2:
+        return None
+    n = len(pairs)
+    mp = sum(p for p, _ in pairs) / n
+    mv = sum(v for _, v in pairs) / n
+    var = sum((p - mp) ** 2 for p, _ in pairs)
+    if var == 0:
+        return None
+    slope = sum((p - mp) * (v - mv) for p, v in pairs) / var
+    offset = mv - slope * mp
+    residual = max(abs(slope * p + offset - v) for p, v in pairs)
+    return slope, offset, residual
+
+
+def _scale(ticks: list[tuple[float, float]]) -> _Scale | None:
+    """Linear scale from tick labels, or log10 when that fits and linear does not."""
+    linear = _fit(ticks)
+    if linear is None:
+        return None
+    values = [v for _, v in ticks]
+    span = max(values) - min(values)
+    slope, offset, residual = linear
+    if residual <= TICK_FIT_TOLERANCE * span:
+        return _Scale(slope, offset)
+    if min(values) > 0:
+        logged = _fit([(p, math.log10(v)) for p, v in ticks])
+        if logged:
+            lslope, loffset, lresidual = logged
+            lspan = math.log10(max(values)) - math.log10(min(values))
+            if lresidual <= TICK_FIT_TOLERANCE * lspan:
+                return _Scale(lslope, loffset, log=True)
+    return None
+
+
+def _snap(pos: float, marks: list[float]) -> float:
+    nearest = min(marks, key=lambda m: abs(m - pos), default=None)
+    return nearest if nearest is not None and abs(nearest - pos) <= TICK_SNAP else pos
+
+
+def _axis_ticks(labels: list[_Label], region: VisualRegion) -> tuple[list, list]:
+    """(page x, value) pairs below the x axis and (page y, value) pairs left of the y axis."""
+    (hx0, hy, hx1, _), (vx, vy0, _, vy1) = region.axes
+    hx0, hx1 = sorted((hx0, hx1))
+    vy0, vy1 = sorted((vy0, vy1))
+    # Tick marks, gridlines and axis ends: vertical rules crossing the x axis,
+    # horizontal ones crossing the y axis
+    x_marks = [hx0, hx1] + [
+        x0 for x0, y0, x1, y1 in region.rules
+        if abs(x1 - x0) <= 1.5 and min(y0, y1) - TICK_SNAP <= hy <= max(y0, y1) + TICK_SNAP
+    ]
+    y_marks = [vy0, vy1] + [
+        y0 for x0, y0, x1, y1 in region.rules
+        if abs(y1 - y0) <= 1.5 and min(x0, x1) - TICK_SNAP <= vx <= max(x0, x1) + TICK_SNAP
+    ]
+
+    x_ticks, y_ticks = [], []
+    for label in labels:
+        value = _parse_number(label.text)
+        if value is None:
+            continue
+        r = label.rect
+        cx, cy = (r.x0 + r.x1) / 2, (r.y0 + r.y1) / 2
+        if hy - 2 <= r.y0 <= hy + TICK_LABEL_GAP and hx0 - TICK_SNAP <= cx <= hx1 + TICK_SNAP:
+            x_ticks.append((_snap(cx, x_marks), value))
+        elif vx - TICK_LABEL_GAP - r.width <= r.x0 and r.x1 <= vx + 2 and vy0 - TICK_SNAP <= cy <= vy1 + TICK_SNAP:
+            y_ticks.append((_snap(cy, y_marks), value))
+    return x_ticks, y_ticks
+
+
+def _axis_titles(labels: list[_Label], region: VisualRegion) -> tuple[str, str]:
+    (hx0, hy, hx1, _), (vx, vy0, _, vy1) = region.axes
+    hx0, hx1 = sorted((hx0, hx1))
+    vy0, vy1 = sorted((vy0, vy1))
+    x_title, y_title = None, None
+    for label in labels:
+        if _parse_number(label.text) is not None:
+            continue
+        r = label.rect
+        cx, cy = (r.x0 + r.x1) / 2, (r.y0 + r.y1) / 2
+        if hx0 <= cx <= hx1 and hy < r.y0 <= hy + AXIS_TITLE_GAP:
+            if x_title is None or r.y0 < x_title.rect.y0:
+                x_title = label
+        elif vy0 <= cy <= vy1 and vx - AXIS_TITLE_GAP <= r.x0 and r.x1 <= vx:
+            # Prefer rotated titles, then the one furthest from the axis (ticks sit closer)
+            if y_title is None or (label.vertical, -r.x0) > (y_title.vertical, -y_title.rect.x0):
+                y_title = label
+    return (x_title.text if x_title else "", y_title.text if y_title else "")
+
+
+def _round(value: float, span: float) -> float:
+    """Keep about four significant digits relative to the axis span."""
+    digits = 3 - math.floor(math.log10(span)) if span > 0 else 4
+    return round(value, max(0, digits)) + 0.0  # + 0.0 drops -0.0
+
+
+def _prominent(ys: list[float], i: int, sign: int) -> float:
+    """Topographic prominence of interior point ys[i] as a peak (sign=1) or a valley (sign=-1)."""
+    y = sign * ys[i]
+    sides = []
+    for step in (-1, 1):
+        j, lowest = i + step, y
+        while 0 <= j < len(ys) and sign * ys[j] <= y:
+            lowest = min(lowest, sign * ys[j])
+            j += step
+        # A side that runs off the curve without meeting higher ground still counts
+        sides.append(y - lowest)
+    return min(sides)
+
+
+def _extrema(points: list[tuple[float, float]], y_span: float) -> tuple[list[int], list[int]]:
+    """Indices of the global and prominent local minima and maxima."""
+    ys = [y for _, y in points]
+    threshold = FEATURE_PROMINENCE * y_span
+    result = []
+    for sign in (-1, 1):
+        best = max(sign * y for y in ys)
+        found = []
+        for i, y in enumerate(ys):
+            v = sign * y
+            prev = sign * ys[i - 1] if i else -math.inf
+            nxt = sign * ys[i + 1] if i + 1 < len(ys) else -math.inf
+            # Curve ends count only as the global extreme; interior points by prominence
+            interior = 0 < i < len(ys) - 1
+            if v > prev and v >= nxt and (v == best or interior and _prominent(ys, i, sign) >= threshold):
+                found.append(i)
+        result.append(found)
+    return result[0], result[1]
+
+
+def _inflections(points: list[tuple[float, float]], x_span: float, y_span: float) -> list[int]:
+    """Vertices where the bend changes direction between two significant runs."""
+    # Slopes in axis-normalized units so thresholds don't depend on the data scale
+    slopes = [
+        ((y1 - y0) / y_span) / ((x1 - x0) / x_span)
+        for (x0, y0), (x1, y1) in zip(points, points[1:])
+    ]
+    runs: list[list] = []  # [sign, total bend, first vertex, last vertex]
+    for k in range(len(slopes) - 1):
+        bend = slopes[k + 1] - slopes[k]
+        if bend == 0:
+            continue
+        sign = 1 if bend > 0 else -1
+        if runs and runs[-1][0] == sign:
+            runs[-1][1] += abs(bend)
+            runs[-1][3] = k + 1
+        else:
+            runs.append([sign, abs(bend), k + 1, k + 1])
+    if not runs:
+        return []
+
+    floor = max(INFLECTION_MIN_BEND, 0.1 * max(r[1] for r in runs))
+    significant: list[list] = []
+    for run in runs:
+        if run[1] < floor:
+            continue
+        if significant and significant[-1][0] == run[0]:
+            significant[-1][1] += run[1]
+            significant[-1][3] = run[3]
+        else:
+            significant.append(list(run))
+    result = [round((a[3] + b[2]) / 2) for a, b in zip(significant, significant[1:])]
+    # Zig-zag data (every few vertices alternating) is noise, not curvature
+    return result if len(result) <= max(2, len(points) // 10) else []
+
+
+def _downsample(count: int, keep: set[int]) -> list[int]:
+    if count <= LINE_GRAPH_MAX_POINTS:
+        return list(range(count))
+    step = (count - 1) / (LINE_GRAPH_MAX_POINTS - 1)
+    return sorted({round(i * step) for i in range(LINE_GRAPH_MAX_POINTS)} | keep)
+
+
+def extract_line_graph(page: fitz.Page, region: VisualRegion) -> dict | None:
+    """VisualModule.data for a vector line graph, or None when the scale can't be read."""
+    if region.kind != "line_graph" or not region.axes or not region.polylines:
+        return None
+
+    labels = _page_labels(page)
+    x_ticks, y_ticks = _axis_ticks(labels, region)
+    x_scale, y_scale = _scale(x_ticks), _scale(y_ticks)
+    if x_scale is None or y_scale is None:
+        return None
+
+    (hx0, hy, hx1, _), (vx, vy0, _, vy1) = region.axes
+    x_min, x_max = sorted((x_scale(hx0), x_scale(hx1)))
+    y_min, y_max = sorted((y_scale(vy0), y_scale(vy1)))
+    x_span, y_span = x_max - x_min, y_max - y_min
+    if x_span <= 0 or y_span <= 0:
+        return None
+
+    # The longest data line is the primary series
+    curve = max(region.polylines, key=len)
+    points: list[tuple[float, float]] = []
+    for x, y in sorted((x_scale(px), y_scale(py)) for px, py in curve):
+        if not points or x - points[-1][0] > 1e-9 * x_span:
+            points.append((x, y))
+    if len(points) < 2:
+        return None
+
+    minima, maxima = _extrema(points, y_span)
+    inflections = _inflections(points, x_span, y_span)
+    kept = _downsample(len(points), set(minima + maxima + inflections))
+
+    def as_point(i: int) -> list[float]:
+        return [_round(points[i][0], x_span), _round(points[i][1], y_span)]
+
+    def as_features(indices: list[int]) -> list[dict]:
+        return [dict(zip(("x", "y"), as_point(i))) for i in indices]
+
+    x_label, y_label = _axis_titles(labels, region)
+    return {
+        "xMin": _round(x_min, x_span),
+        "xMax": _round(x_max, x_span),
+        "yMin": _round(y_min, y_span),
+        "yMax": _round(y_max, y_span),
+        "xLabel": x_label,
+        "yLabel": y_label,
+        "xScale": "log" if x_scale.log else "linear",
+        "yScale": "log" if y_scale.log else "linear",
+        "points": [as_point(i) for i in kept],
+        "features": {
+            "min": as_features(minima),
+            "peak": as_features(maxima),
+            "inflection": as_features(inflections),
+        },
+    }
@@ -0,0 +1,366 @@
+"""
+Local geometric detector for vector figures.
+
+Clusters `page.get_drawings()` paths into regions and scores each region for
+line-graph structure (axes + polyline) and flowchart structure (boxes joined
+by connectors/arrows). Table rules, underlines, slide borders and template
+decorations score low, so only pages likely to hold a real figure are sent
+to the vision model.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+from dataclasses import dataclass, field
+
+import fitz  # PyMuPDF
+
+# A region must score at least this to be dispatched to the vision model
+VISUAL_SCORE_THRESHOLD = float(os.getenv("VISUAL_SCORE_THRESHOLD", "0.6"))
+
+# Paths closer than this (points) belong to the same region
+CLUSTER_GAP = 12.0
+# Endpoint tolerance when matching corners and connectors (points)
+JOIN_TOLERANCE = 6.0
+# Axis-aligned if the off-axis delta is at most this (points)
+AXIS_ALIGN_TOLERANCE = 1.5
+# Paths up to this size (points) are markers/arrowheads, not boxes
+MARKER_MAX_SIZE = 16.0
+# Paths covering more than this share of the page are backgrounds/frames
+BACKGROUND_AREA_RATIO = 0.6
+# Edge rules: within this share of a page edge and spanning this share of it
+EDGE_MARGIN_RATIO = 0.06
+EDGE_SPAN_RATIO = 0.7
+
+
+@dataclass
+class _Segment:
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+    curve: bool = False
+
+    @property
+    def length(self) -> float:
+        return math.hypot(self.x1 - self.x0, self.y1 - self.y0)
+
+    # Relative bound too, so the sub-point steps of a dense data line aren't axis-aligned
+    @property
+    def horizontal(self) -> bool:
+        dx, dy = abs(self.x1 - self.x0), abs(self.y1 - self.y0)
+        return not self.curve and dy <= min(AXIS_ALIGN_TOLERANCE, 0.1 * dx)
+
+    @property
+    def vertical(self) -> bool:
+        dx, dy = abs(self.x1 - self.x0), abs(self.y1 - self.y0)
+        return not self.curve and dx <= min(AXIS_ALIGN_TOLERANCE, 0.1 * dy)
+
+
+@dataclass
+class _Path:
+    rect: fitz.Rect
+    segments: list[_Segment]
+    filled: bool
+    box: bool = False
+    marker: bool = False
+    chain_vertices: int = 0  # vertices in the longest connected open chain
+
+
+@dataclass
+class VisualRegion:
+    """A cluster of drawing paths with its figure scores."""
+
+    bbox: fitz.Rect
+    line_graph_score: float = 0.0
+    flowchart_score: float = 0.0
+    features: dict = field(default_factory=dict)
+    # Geometry kept for local data extraction: (x axis, y axis) as
+    # (x0, y0, x1, y1) tuples, data polylines as page-space vertex lists,
+    # and every straight axis-aligned segment (ticks and gridlines)
+    axes: tuple[tuple, tuple] | None = None
+    polylines: list[list[tuple[float, float]]] = field(default_factory=list, repr=False)
+    rules: list[tuple] = field(default_factory=list, repr=False)
+
+    @property
+    def kind(self) -> str | None:
+        best = max(self.line_graph_score, self.flowchart_score)
+        if best < VISUAL_SCORE_THRESHOLD:
+            return None
+        return "line_graph" if self.line_graph_score >= self.flowchart_score else "flowchart"
+
+    @property
+    def score(self) -> float:
+        return max(self.line_graph_score, self.flowchart_score)
+
+
+def _near(ax: float, ay: float, bx: float, by: float, tol: float = JOIN_TOLERANCE) -> bool:
+    return abs(ax - bx) <= tol and abs(ay - by) <= tol
+
+
+# fitz.Rect treats zero-width/height rects (straight lines) as empty and skips
+# them in intersects() and |=, so bbox math here is done explicitly.
+
+def _overlaps(a: fitz.Rect, b: fitz.Rect, pad: float = 0.0) -> bool:
+    return (
+        a.x0 - pad <= b.x1 and b.x0 - pad <= a.x1
+        and a.y0 - pad <= b.y1 and b.y0 - pad <= a.y1
+    )
+
+
+def union_rect(rects) -> fitz.Rect:
+    rects = list(rects)
+    return fitz.Rect(
+        min(r.x0 for r in rects), min(r.y0 for r in rects),
+        max(r.x1 for r in rects), max(r.y1 for r in rects),
+    )
+
+
+def _to_path(drawing: dict) -> _Path:
+    """Flatten a get_drawings() entry into segments and classify its shape."""
+    segments: list[_Segment] = []
+    boxes = 0
+    for item in drawing.get("items", []):
+        op = item[0]
+        if op == "l":
+            p1, p2 = item[1], item[2]
+            segments.append(_Segment(p1.x, p1.y, p2.x, p2.y))
+        elif op == "c":
+            p1, p2 = item[1], item[4]
+            segments.append(_Segment(p1.x, p1.y, p2.x, p2.y, curve=True))
+        elif op == "re":
+            r = item[1]
+            boxes += 1
+            segments += [
+                _Segment(r.x0, r.y0, r.x1, r.y0), _Segment(r.x1, r.y0, r.x1, r.y1),
+                _Segment(r.x1, r.y1, r.x0, r.y1), _Segment(r.x0, r.y1, r.x0, r.y0),
+            ]
+        elif op == "qu":
+            q = item[1]
+            boxes += 1
+            segments += [
+                _Segment(q.ul.x, q.ul.y, q.ur.x, q.ur.y), _Segment(q.ur.x, q.ur.y, q.lr.x, q.lr.y),
+                _Segment(q.lr.x, q.lr.y, q.ll.x, q.ll.y), _Segment(q.ll.x, q.ll.y, q.ul.x, q.ul.y),
+            ]
+
+    rect = fitz.Rect(drawing["rect"])
+    path = _Path(rect=rect, segments=segments, filled=drawing.get("fill") is not None)
+    size = max(rect.width, rect.height)
+
+    # Longest run of consecutive segments sharing endpoints
+    best = run = 1 if segments else 0
+    for prev, cur in zip(segments, segments[1:]):
+        run = run + 1 if _near(prev.x1, prev.y1, cur.x0, cur.y0, 0.5) else 1
+        best = max(best, run)
+    closed = bool(segments) and (
+        drawing.get("closePath")
+        or _near(segments[0].x0, segments[0].y0, segments[-1].x1, segments[-1].y1, 0.5)
+    )
+
+    if size <= MARKER_MAX_SIZE:
+        path.marker = True
+    elif boxes or (closed and 3 <= len(segments) <= 8):
+        # Rectangles, diamonds, rounded boxes and ellipses act as nodes
+        path.box = True
+    else:
+        path.chain_vertices = best + 1 if best else 0
+    return path
+
+
+def _is_decoration(path: _Path, page_rect: fitz.Rect) -> bool:
+    """Backgrounds, slide frames and edge-to-edge header/footer rules."""
+    page_area = page_rect.width * page_rect.height
+    r = path.rect
+    if r.width * r.height > BACKGROUND_AREA_RATIO * page_area:
+        return True
+    mx = EDGE_MARGIN_RATIO * page_rect.width
+    my = EDGE_MARGIN_RATIO * page_rect.height
+    if r.width >= EDGE_SPAN_RATIO * page_rect.width and (
+        r.y1 <= page_rect.y0 + my or r.y0 >= page_rect.y1 - my
+    ):
+        return True
+    if r.height >= EDGE_SPAN_RATIO * page_rect.height and (
+        r.x1 <= page_rect.x0 + mx or r.x0 >= page_rect.x1 - mx
+    ):
+        return True
+    return False
+
+
+def _cluster(paths: list[_Path]) -> list[list[_Path]]:
+    """Union paths whose padded bboxes touch (sweep over sorted x0)."""
+    parent = list(range(len(paths)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    order = sorted(range(len(paths)), key=lambda i: paths[i].rect.x0)
+    active: list[int] = []
+    for i in order:
+        r = paths[i].rect
+        active = [j for j in active if paths[j].rect.x1 + CLUSTER_GAP >= r.x0]
+        for j in active:
+            if _overlaps(r, paths[j].rect, CLUSTER_GAP):
+                parent[find(i)] = find(j)
+        active.append(i)
+
+    groups: dict[int, list[_Path]] = {}
+    for i in range(len(paths)):
+        groups.setdefault(find(i), []).append(paths[i])
+    return list(groups.values())
+
+
+def _chains(path: _Path) -> list[list[tuple[float, float]]]:
+    """Vertex lists of the connected runs of segments in an open path."""
+    chains: list[list[tuple[float, float]]] = []
+    for seg in path.segments:
+        if chains and _near(chains[-1][-1][0], chains[-1][-1][1], seg.x0, seg.y0, 0.5):
+            chains[-1].append((seg.x1, seg.y1))
+        else:
+            chains.append([(seg.x0, seg.y0), (seg.x1, seg.y1)])
+    return chains
+
+
+def _find_axes(segments: list[_Segment], bbox: fitz.Rect) -> tuple[_Segment, _Segment] | None:
+    """A long horizontal and a long vertical segment meeting at a corner or crossing."""
+    min_h = max(40.0, 0.3 * bbox.width)
+    min_v = max(40.0, 0.3 * bbox.height)
+    hs = [s for s in segments if s.horizontal and s.length >= min_h]
+    vs = [s for s in segments if s.vertical and s.length >= min_v]
+    best = None
+    for h in hs:
+        hx0, hx1 = sorted((h.x0, h.x1))
+        for v in vs:
+            vy0, vy1 = sorted((v.y0, v.y1))
+            crosses = (
+                hx0 - JOIN_TOLERANCE <= v.x0 <= hx1 + JOIN_TOLERANCE
+                and vy0 - JOIN_TOLERANCE <= h.y0 <= vy1 + JOIN_TOLERANCE
+            )
+            if crosses and (best is None or h.length + v.length > best[0].length + best[1].length):
+                best = (h, v)
+    return best
+
+
+def _score_line_graph(
+    paths: list[_Path], segments: list[_Segment], bbox: fitz.Rect
+) -> tuple[float, dict, tuple | None, list[_Path]]:
+    # Box outlines (frames, table cells, callouts) never act as axes
+    axes = _find_axes([s for p in paths if not p.box for s in p.segments], bbox)
+    long_h = sum(1 for s in segments if s.horizontal and s.length >= 0.5 * bbox.width)
+    long_v = sum(1 for s in segments if s.vertical and s.length >= 0.5 * bbox.height)
+
+    span_ref = axes[0].length if axes else bbox.width
+    polylines = [
+        p for p in paths
+        if p.chain_vertices >= 4
+        and p.rect.width >= 0.3 * span_ref
+        and any(not (s.horizontal or s.vertical) for s in p.segments)
+    ]
+    ticks = 0
+    if axes:
+        h, v = axes
+        ticks = sum(
+            1 for s in segments
+            if s.length <= 10 and (
+                (s.vertical and abs(min(s.y0, s.y1) - h.y0) <= 8)
+                or (s.horizontal and abs(min(s.x0, s.x1) - v.x0) <= 8)
+            )
+        )
+
+    score = 0.45 * bool(axes) + 0.45 * bool(polylines) + 0.1 * (ticks >= 3)
+    # Gridded tables have many long rules both ways and no data line
+    if long_h >= 3 and long_v >= 3 and not polylines:
+        score *= 0.3
+    return score, {
+        "axes": bool(axes),
+        "polylines": len(polylines),
+        "ticks": ticks,
+    }, axes, polylines
+
+
+def _score_flowchart(paths: list[_Path], segments: list[_Segment], page_rect: fitz.Rect) -> tuple[float, dict]:
+    page_area = page_rect.width * page_rect.height
+    boxes = [p for p in paths if p.box and p.rect.width * p.rect.height <= 0.25 * page_area]
+    if len(boxes) < 2:
+        return 0.0, {"boxes": len(boxes), "connectors": 0, "arrowheads": 0}
+
+    def touches_box(x: float, y: float) -> int | None:
+        for idx, b in enumerate(boxes):
+            r = b.rect
+            inside_x = r.x0 - JOIN_TOLERANCE <= x <= r.x1 + JOIN_TOLERANCE
+            inside_y = r.y0 - JOIN_TOLERANCE <= y <= r.y1 + JOIN_TOLERANCE
+            if inside_x and inside_y:
+                return idx
+        return None
+
+    markers = [p for p in paths if p.marker and p.filled]
+    connectors = 0
+    arrowheads = 0
+    for p in paths:
+        if p.box or p.marker:
+            continue
+        for s in p.segments:
+            a = touches_box(s.x0, s.y0)
+            b = touches_box(s.x1, s.y1)
+            if a is not None and b is not None and a != b:
+                connectors += 1
+            elif (a is not None) != (b is not None):
+                # Lines that end in an arrowhead next to a box
+                end = (s.x1, s.y1) if b is None else (s.x0, s.y0)
+                if any(m.rect.contains(fitz.Point(*end)) or _near(*end, m.rect.x0, m.rect.y0, MARKER_MAX_SIZE) for m in markers):
+                    connectors += 1
+    for m in markers:
+        c = (m.rect.x0 + m.rect.x1) / 2, (m.rect.y0 + m.rect.y1) / 2
+        if touches_box(*c) is not None and len(m.segments) in (2, 3):
+            arrowheads += 1
+
+    # Table cells share edges with neighbours; flowchart nodes have gaps
+    touching = 0
+    for i, a in enumerate(boxes):
+        ra = a.rect
+        for b in boxes[i + 1:]:
+            rb = b.rect
+            if _overlaps(ra, rb, 2) and not (ra.contains(rb) or rb.contains(ra)):
+                touching += 1
+                break
+
+    links = max(connectors, arrowheads)
+    score = 0.4 * min(1.0, len(boxes) / 3) + 0.6 * min(1.0, links / max(1, len(boxes) - 1))
+    if touching > len(boxes) / 2:
+        score *= 0.2
+    return score, {"boxes": len(boxes), "connectors": connectors, "arrowheads": arrowheads}
+
+
+def detect_visual_regions(drawings: list[dict], page_rect: fitz.Rect) -> list[VisualRegion]:
+    """Cluster drawing paths into regions and score each one."""
+    paths = [_to_path(d) for d in drawings]
+    paths = [p for p in paths if p.segments and not _is_decoration(p, page_rect)]
+    regions = []
+    for group in _cluster(paths):
+        bbox = union_rect(p.rect for p in group)
+        segments = [s for p in group for s in p.segments]
+        lg_score, lg_features, axes, polylines = _score_line_graph(group, segments, bbox)
+        fc_score, fc_features = _score_flowchart(group, segments, page_rect)
+        regions.append(VisualRegion(
+            bbox=bbox,
+            line_graph_score=lg_score,
+            flowchart_score=fc_score,
+            features={**lg_features, **fc_features, "paths": len(group)},
+            axes=tuple((s.x0, s.y0, s.x1, s.y1) for s in axes) if axes else None,
+            polylines=[max(_chains(p), key=len) for p in polylines],
+            rules=[
+                (s.x0, s.y0, s.x1, s.y1)
+                for p in group if not (p.box or (p.marker and p.filled))
+                for s in p.segments if s.horizontal or s.vertical
+            ],
+        ))
+    regions.sort(key=lambda r: r.score, reverse=True)
+    return regions
+
+
+def figure_regions(drawings: list[dict], page_rect: fitz.Rect) -> list[VisualRegion]:
+    """Regions likely to hold a line graph or flowchart."""
+    return [r for r in detect_visual_regions(drawings, page_rect) if r.kind]
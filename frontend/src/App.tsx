@@ -1,5 +1,11 @@
 import { useCallback, useState } from "react";
-import type { Chunk, DocumentManifest, FormulaModule, VisualModule } from "./types";
+import type {
+  Chunk,
+  DocumentManifest,
+  FormulaModule,
+  PageBundle,
+  VisualModule,
+} from "./types";
 import HomePage from "./pages/HomePage";
 import TutorPage from "./pages/TutorPage";
 
@@ -17,8 +23,21 @@ export default function App() {
     setData(loaded);
   }, []);
 
+  const handleMorePages = useCallback((docId: string, pages: PageBundle[]) => {
+    setData((current) =>
+      current && current.manifest.docId === docId
+        ? {
+            ...current,
+            chunks: [...current.chunks, ...pages.flatMap((p) => p.chunks)],
+            formulas: [...current.formulas, ...pages.flatMap((p) => p.formulas)],
+            visuals: [...current.visuals, ...pages.flatMap((p) => p.visuals)],
+          }
+        : current
+    );
+  }, []);
+
   if (!data) {
-    return <HomePage onLoaded={handleLoaded} />;
+    return <HomePage onLoaded={handleLoaded} onMorePages={handleMorePages} />;
   }
 
   return (
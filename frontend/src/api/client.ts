@@ -2,13 +2,33 @@ import type {
   Chunk,
   DocumentManifest,
   FormulaModule,
+  PageBundle,
   VisualModule,
 } from "../types";
 
 const BASE = "/api";
 
+// One id per tab, so the backend can attribute LLM usage to this session
+let sessionId: string | null = null;
+
+function newSessionId(): string {
+  // randomUUID only exists in secure contexts; plain-http LAN dev servers
+  // (e.g. testing from a phone) still have getRandomValues
+  if (typeof crypto.randomUUID === "function") return crypto.randomUUID();
+  const bytes = crypto.getRandomValues(new Uint8Array(16));
+  bytes[6] = (bytes[6]! & 0x0f) | 0x40; // version 4
+  bytes[8] = (bytes[8]! & 0x3f) | 0x80; // RFC 4122 variant
+  const hex = Array.from(bytes, (b) => b.toString(16).padStart(2, "0")).join("");
+  return `${hex.slice(0, 8)}-${hex.slice(8, 12)}-${hex.slice(12, 16)}-${hex.slice(16, 20)}-${hex.slice(20)}`;
+}
+
+function sessionHeaders(): Record<string, string> {
+  sessionId ??= newSessionId();
+  return { "X-Session-ID": sessionId };
+}
+
 async function fetchJSON<T>(url: string): Promise<T> {
-  const res = await fetch(url);
+  const res = await fetch(url, { headers: sessionHeaders() });
   if (!res.ok) {
     throw new Error(`API error ${res.status}: ${res.statusText}`);
   }
@@ -19,10 +39,52 @@ export async function getManifest(docId: string): Promise<DocumentManifest> {
   return fetchJSON(`${BASE}/documents/${docId}/manifest`);
 }
 
+export interface ChunkWindow {
+  fromPage?: number;
+  toPage?: number;
+  cursor?: string;
+  limit?: number;
+}
+
 export async function getChunks(
-  docId: string
-): Promise<{ docId: string; chunks: Chunk[] }> {
-  return fetchJSON(`${BASE}/documents/${docId}/chunks`);
+  docId: string,
+  window: ChunkWindow = {}
+): Promise<{ docId: string; chunks: Chunk[]; nextCursor?: string | null }> {
+  const params = new URLSearchParams();
+  for (const [key, value] of Object.entries(window)) {
+    if (value !== undefined) params.set(key, String(value));
+  }
+  const query = params.toString();
+  return fetchJSON(`${BASE}/documents/${docId}/chunks${query ? `?${query}` : ""}`);
+}
+
+export async function getPageBundles(
+  docId: string,
+  pageNo: number,
+  prefetch = 0
+): Promise<{ docId: string; pages: PageBundle[] }> {
+  return fetchJSON(`${BASE}/documents/${docId}/pages/${pageNo}?prefetch=${prefetch}`);
+}
+
+// Pages per request when loading the rest of a document in the background
+const PAGE_BATCH = 10;
+
+/** Fetch the bundles of `pageNos`, in order, a batch at a time. */
+export async function streamPageBundles(
+  docId: string,
+  pageNos: number[],
+  onBatch: (pages: PageBundle[]) => void
+): Promise<void> {
+  let i = 0;
+  while (i < pageNos.length) {
+    const first = pageNos[i]!;
+    const res = await getPageBundles(docId, first, PAGE_BATCH - 1);
+    onBatch(res.pages);
+    // The server may cap the prefetch below PAGE_BATCH, so resume after the
+    // last page it actually sent (and always move past the requested one)
+    const last = Math.max(first, ...res.pages.map((p) => p.pageNo));
+    while (i < pageNos.length && pageNos[i]! <= last) i++;
+  }
 }
 
 export async function getFormulas(
@@ -51,7 +113,7 @@ export async function askQuestion(
 ): Promise<{ answer: string; citations: { pageNo: number; chunkId: string }[] }> {
   const res = await fetch(`${BASE}/qa`, {
     method: "POST",
-    headers: { "Content-Type": "application/json" },
+    headers: { ...sessionHeaders(), "Content-Type": "application/json" },
     body: JSON.stringify({ docId, pageNo, chunkId, question }),
   });
   if (!res.ok) throw new Error(`QA error ${res.status}`);
@@ -65,6 +127,7 @@ export async function uploadPDF(
   form.append("file", file);
   const res = await fetch(`${BASE}/documents/upload`, {
     method: "POST",
+    headers: sessionHeaders(),
     body: form,
   });
   if (!res.ok) {
@@ -81,7 +144,7 @@ export async function explainFormula(
 ): Promise<{ text: string }> {
   const res = await fetch(`${BASE}/modules/formulas/explain`, {
     method: "POST",
-    headers: { "Content-Type": "application/json" },
+    headers: { ...sessionHeaders(), "Content-Type": "application/json" },
     body: JSON.stringify({ docId, formulaId, section }),
   });
   if (!res.ok) throw new Error(`Explain error ${res.status}`);
@@ -95,7 +158,7 @@ export async function chat(
 ): Promise<{ reply: string; aiGenerated: boolean }> {
   const res = await fetch(`${BASE}/chat`, {
     method: "POST",
-    headers: { "Content-Type": "application/json" },
+    headers: { ...sessionHeaders(), "Content-Type": "application/json" },
     body: JSON.stringify({ docId, message, context: context ?? "" }),
   });
   if (!res.ok) throw new Error(`Chat error ${res.status}`);
@@ -125,6 +188,7 @@ export async function sendVoice(
   form.append("state", JSON.stringify(state));
   const res = await fetch(`${BASE}/voice`, {
     method: "POST",
+    headers: sessionHeaders(),
     body: form,
   });
   if (!res.ok) throw new Error(`Voice error ${res.status}`);
@@ -138,7 +202,7 @@ export async function postReflection(
 ): Promise<{ reflection: string; takeaway: string; nextSuggestion: string }> {
   const res = await fetch(`${BASE}/explore/reflect`, {
     method: "POST",
-    headers: { "Content-Type": "application/json" },
+    headers: { ...sessionHeaders(), "Content-Type": "application/json" },
     body: JSON.stringify({ docId, visualId, trace }),
   });
   if (!res.ok) throw new Error(`Reflect error ${res.status}`);
@@ -1,7 +1,18 @@
 import { useRef, useState } from "react";
 import { motion, AnimatePresence } from "framer-motion";
-import { getManifest, getChunks, getFormulas, getVisuals, uploadPDF } from "../api/client";
-import type { Chunk, DocumentManifest, FormulaModule, VisualModule } from "../types";
+import {
+  getManifest,
+  getPageBundles,
+  streamPageBundles,
+  uploadPDF,
+} from "../api/client";
+import type {
+  Chunk,
+  DocumentManifest,
+  FormulaModule,
+  PageBundle,
+  VisualModule,
+} from "../types";
 import { colors, radius, shadows, spacing, typography } from "../theme";
 
 interface LoadedData {
@@ -13,8 +24,12 @@ interface LoadedData {
 
 interface Props {
   onLoaded: (data: LoadedData) => void;
+  onMorePages: (docId: string, pages: PageBundle[]) => void;
 }
 
+// Pages after the first fetched before the tutor opens, so early page turns are instant
+const INITIAL_PREFETCH = 2;
+
 const LOADING_STEPS = [
   { label: "Uploading PDF...", icon: "📄" },
   { label: "Extracting text from pages...", icon: "📝" },
@@ -23,7 +38,7 @@ const LOADING_STEPS = [
   { label: "Preparing lecture...", icon: "✨" },
 ];
 
-export default function HomePage({ onLoaded }: Props) {
+export default function HomePage({ onLoaded, onMorePages }: Props) {
   const [loading, setLoading] = useState(false);
   const [loadingStep, setLoadingStep] = useState(0);
   const [error, setError] = useState<string | null>(null);
@@ -50,22 +65,26 @@ export default function HomePage({ onLoaded }: Props) {
       await stepDelay(1);
       await stepDelay(2);
 
-      const [manifest, chunksRes, formulasRes, visualsRes] = await Promise.all([
-        getManifest(docId),
-        getChunks(docId),
-        getFormulas(docId),
-        getVisuals(docId),
-      ]);
+      // Only the first few pages are needed to start reading;
+      // the rest stream in once the tutor is open
+      const manifest = await getManifest(docId);
+      const pageNos = manifest.pages.map((p) => p.pageNo);
+      const first = pageNos[0] ?? 1;
+      const { pages } = await getPageBundles(docId, first, INITIAL_PREFETCH);
 
       await stepDelay(3);
       await stepDelay(4);
 
       onLoaded({
         manifest,
-        chunks: chunksRes.chunks,
-        formulas: formulasRes.formulas,
-        visuals: visualsRes.visuals,
+        chunks: pages.flatMap((p) => p.chunks),
+        formulas: pages.flatMap((p) => p.formulas),
+        visuals: pages.flatMap((p) => p.visuals),
       });
+      const rest = pageNos.filter((n) => n > first + INITIAL_PREFETCH);
+      streamPageBundles(docId, rest, (more) => onMorePages(docId, more)).catch((err) =>
+        console.error("Failed to load remaining pages:", err)
+      );
     } catch (err) {
       setError(err instanceof Error ? err.message : "Upload failed");
     } finally {
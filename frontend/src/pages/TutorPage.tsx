@@ -84,8 +84,13 @@ function TutorContent({ onExit }: { onExit?: () => void }) {
         } else if (action === "START_GUIDANCE" && payload) {
           dispatch({ type: "START_GUIDANCE", target: String(payload) });
         } else if (action === "SUMMARIZE") {
-          const pageText = pageChunks.map((c) => c.text).join(" ");
-          doSpeak(`Summary of this page: ${pageText}`);
+          // Backend serves the precomputed page summary; read the page if none exists
+          if (speech) {
+            doSpeak(speech);
+          } else {
+            const pageText = pageChunks.map((c) => c.text).join(" ");
+            doSpeak(`Summary of this page: ${pageText}`);
+          }
           return;
         } else if (action === "END_LECTURE") {
           if (speech) doSpeak(speech);
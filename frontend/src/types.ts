@@ -96,6 +96,14 @@ export interface VisualModule {
   data: LineGraphData | FlowchartData;
 }
 
+export interface PageBundle {
+  pageNo: number;
+  summary: string | null;
+  chunks: Chunk[];
+  formulas: FormulaModule[];
+  visuals: VisualModule[];
+}
+
 // --- Tutor state ---
 
 export type TutorMode = "READING" | "FORMULA" | "VISUAL";